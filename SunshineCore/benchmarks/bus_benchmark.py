@@ -0,0 +1,325 @@
+import sys
+import os
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+import threading
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # Windows: broker CPU time is not reported
+    resource = None
+
+# Add src directory to path for imports
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+sys.path.append(SRC_DIR)
+
+import zmq
+import subprocesses.base_subprocess as base_subprocess
+from subprocesses.base_subprocess import BaseSubProcess
+from utils.endpoints import (FRONTEND, BACKEND, CONTROL, connect_endpoint, connect_endpoints, endpoint_environment,
+                             endpoint_ready, resolve_transport, shard_count)
+from utils.broker_control import send_broker_command, CMD_TERMINATE
+from config.settings import BROKER_MODE, BROKER_SOCKET_MODE, MESSAGE_CODEC, ZEROMQ_TRANSPORT, BROKER_SHARDS
+
+# Starts zeromq/broker.py and synthetic comets (BaseSubProcess children of this script) on the
+# configured ports, so Sunshine itself must not be running. Fan-out patterns:
+#   fanout      - every subscriber receives every message
+#   directed    - each message is addressed to one subscriber (round robin)
+#   partitioned - each subscriber subscribes to its own message type (round robin)
+PATTERNS = ('fanout', 'directed', 'partitioned')
+START_DELAY = 2  # Seconds for subscriptions to propagate before publishers start
+DRAIN_TIME = 2  # Seconds subscribers keep listening after the publishers stop
+
+def subscriber_name(index):
+    return f"BenchSub{index}"
+
+def message_type_for(pattern, index):
+    return f"BENCH_{index}" if pattern == 'partitioned' else "BENCH_DATA"
+
+class BenchComet(BaseSubProcess):
+    """Synthetic comet: either publishes load or measures what it receives."""
+    
+    def __init__(self, name, subscribe_to):
+        self.subscribe_to = subscribe_to
+        super().__init__(name)
+        self.latencies_us = []
+        self.received = 0
+    
+    def record_received(self, frames, messages):
+        """Measure one-way latency of benchmark messages from their monotonic send time."""
+        now = time.monotonic_ns()
+        for message in messages:
+            if message.get('message_type', '').startswith('BENCH_'):
+                self.received += 1
+                self.latencies_us.append((now - message['mono_ns']) // 1000)
+
+def run_publisher(args):
+    """Send messages at the configured rate until the run ends; report counts per target."""
+    comet = BenchComet(f"BenchPub{args.index}", [])
+    comet.setup_zmq()
+    payload = {'pad': 'x' * args.size}
+    sent_to = {}
+    
+    wait_until(args.start_at)
+    interval = 1 / args.rate if args.rate else 0
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    sent = 0
+    while time.perf_counter() - start < args.duration:
+        subscriber = (sent + args.index) % args.subscribers
+        target = subscriber_name(subscriber) if args.pattern == 'directed' else None
+        if comet.send_message(message_type_for(args.pattern, subscriber), payload, target=target):
+            sent += 1
+            sent_to[subscriber] = sent_to.get(subscriber, 0) + 1
+        if interval:
+            # Pace against the schedule, not the previous send, so the average rate holds
+            delay = start + sent * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+    
+    result = {'name': comet.process_name, 'sent': sent, 'sent_to': sent_to,
+              'cpu_seconds': time.process_time() - cpu_start}
+    if comet.batcher:
+        comet.batcher.close()
+    time.sleep(0.5)  # Let ZeroMQ flush before the sockets close
+    return result
+
+def run_subscriber(args):
+    """Receive until the publishers are done and drained; report counts and latencies."""
+    name = subscriber_name(args.index)
+    if args.pattern == 'fanout':
+        subscribe_to = ['BENCH_DATA']
+    elif args.pattern == 'partitioned':
+        subscribe_to = [message_type_for(args.pattern, args.index)]
+    else:
+        subscribe_to = []  # Directed messages arrive on the comet's own @name topic
+    
+    comet = BenchComet(name, subscribe_to)
+    comet.setup_zmq()
+    cpu_start = time.process_time()
+    threading.Thread(target=comet.message_loop, daemon=True).start()
+    wait_until(args.start_at + args.duration + DRAIN_TIME)
+    comet.shutdown_flag.set()
+    comet.wake_message_loop()
+    return {'name': name, 'received': comet.received, 'latencies_us': comet.latencies_us,
+            'cpu_seconds': time.process_time() - cpu_start}
+
+def wait_until(timestamp):
+    delay = timestamp - time.time()
+    if delay > 0:
+        time.sleep(delay)
+
+def percentile(samples, q):
+    if not samples:
+        return None
+    return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+def child_command(args, role, index, start_at, result_file):
+    return [sys.executable, os.path.abspath(__file__), '--role', role, '--index', str(index),
+            '--start-at', str(start_at), '--result-file', result_file,
+            '--pattern', args.pattern, '--subscribers', str(args.subscribers), '--size', str(args.size),
+            '--rate', str(args.rate), '--duration', str(args.duration), '--codec', args.codec]
+
+def run_benchmark(args):
+    """Start the broker and comets, collect their reports and summarize the run."""
+    transport = resolve_transport(args.transport)
+    env = dict(os.environ, **endpoint_environment(transport))
+    broker = subprocess.Popen([sys.executable, os.path.join(SRC_DIR, 'zeromq', 'broker.py'), '--mode', args.mode,
+                               '--socket-mode', args.socket_mode, '--transport', transport],
+                              cwd=SRC_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+    
+    endpoints = connect_endpoints(FRONTEND, transport) + connect_endpoints(BACKEND, transport)
+    deadline = time.time() + 10
+    while not all(endpoint_ready(endpoint) for endpoint in endpoints):
+        if time.time() > deadline or broker.poll() is not None:
+            broker.kill()
+            raise RuntimeError("Broker did not start (is Sunshine already running on these ports?)")
+        time.sleep(0.1)
+    
+    workdir = tempfile.mkdtemp(prefix='sunshine-bench-')
+    start_at = time.time() + START_DELAY
+    children = []
+    for role, count in (('subscriber', args.subscribers), ('publisher', args.publishers)):
+        for index in range(count):
+            result_file = os.path.join(workdir, f"{role}-{index}.json")
+            process = subprocess.Popen(child_command(args, role, index, start_at, result_file), cwd=SRC_DIR, env=env,
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.STDOUT)
+            children.append((role, result_file, process))
+    
+    for _, _, process in children:
+        process.wait()
+    
+    # Only the broker is still running, so the children rusage delta is the broker's own CPU time
+    cpu_before = resource.getrusage(resource.RUSAGE_CHILDREN) if resource else None
+    for shard in range(shard_count(transport)):
+        send_broker_command(CMD_TERMINATE, endpoint=connect_endpoint(CONTROL, transport, shard))
+    try:
+        broker.wait(10)
+    except subprocess.TimeoutExpired:
+        broker.kill()
+        broker.wait()
+    broker_cpu = None
+    if cpu_before:
+        cpu_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        broker_cpu = (cpu_after.ru_utime + cpu_after.ru_stime) - (cpu_before.ru_utime + cpu_before.ru_stime)
+    
+    reports = {'publisher': [], 'subscriber': []}
+    for role, result_file, process in children:
+        try:
+            with open(result_file) as f:
+                reports[role].append(json.load(f))
+        except (OSError, ValueError):
+            raise RuntimeError(f"A {role} failed (exit code {process.returncode})")
+    
+    return summarize(args, reports, broker_cpu)
+
+def summarize(args, reports, broker_cpu):
+    sent = sum(report['sent'] for report in reports['publisher'])
+    expected = {}
+    for report in reports['publisher']:
+        for subscriber, count in report['sent_to'].items():
+            expected[int(subscriber)] = expected.get(int(subscriber), 0) + count
+    
+    received = 0
+    dropped = 0
+    latencies = []
+    for report in reports['subscriber']:
+        index = int(report['name'][len(subscriber_name('')):])
+        should_receive = sent if args.pattern == 'fanout' else expected.get(index, 0)
+        received += report['received']
+        dropped += max(should_receive - report['received'], 0)
+        latencies.extend(report['latencies_us'])
+    latencies.sort()
+    
+    return {
+        'benchmark': 'bus',
+        'started': datetime.now().isoformat(),
+        'config': {
+            'publishers': args.publishers,
+            'subscribers': args.subscribers,
+            'pattern': args.pattern,
+            'size': args.size,
+            'rate_per_publisher': args.rate,
+            'duration': args.duration,
+            'codec': args.codec,
+            'transport': resolve_transport(args.transport),
+            'broker_mode': args.mode,
+            'socket_mode': args.socket_mode,
+            'broker_shards': BROKER_SHARDS
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'pyzmq': zmq.pyzmq_version(),
+            'libzmq': zmq.zmq_version(),
+            'platform': platform.platform()
+        },
+        'results': {
+            'sent': sent,
+            'received': received,
+            'dropped': dropped,
+            'drop_rate': dropped / (received + dropped) if received + dropped else 0,
+            'throughput_msgs_per_sec': received / args.duration,
+            'latency_us': {
+                'p50': percentile(latencies, 0.5),
+                'p99': percentile(latencies, 0.99),
+                'p999': percentile(latencies, 0.999),
+                'max': latencies[-1] if latencies else None
+            },
+            'cpu_seconds': {
+                'broker': broker_cpu,
+                'publishers': [report['cpu_seconds'] for report in reports['publisher']],
+                'subscribers': [report['cpu_seconds'] for report in reports['subscriber']]
+            }
+        }
+    }
+
+# Regression check against a stored result: relative change beyond the tolerance fails
+COMPARED = [
+    ('throughput_msgs_per_sec', lambda results: results['throughput_msgs_per_sec'], 'higher'),
+    ('latency p50 (us)', lambda results: results['latency_us']['p50'], 'lower'),
+    ('latency p99 (us)', lambda results: results['latency_us']['p99'], 'lower'),
+    ('drop_rate', lambda results: results['drop_rate'], 'lower'),
+]
+
+def compare(result, baseline, tolerance):
+    """Print the change against a baseline result; returns False if anything regressed."""
+    ok = True
+    print(f"\nCompared with baseline ({baseline['started']}):")
+    for label, value_of, better in COMPARED:
+        old, new = value_of(baseline['results']), value_of(result['results'])
+        if old is None or new is None:
+            continue
+        change = (new - old) / old if old else (0 if new == old else float('inf'))
+        regressed = change < -tolerance if better == 'higher' else change > tolerance
+        ok = ok and not regressed
+        print(f"  {label:<26} {old:>12.1f} -> {new:>12.1f} ({change:+.1%}){'  ❌ REGRESSION' if regressed else ''}")
+    return ok
+
+def print_summary(result):
+    config, results = result['config'], result['results']
+    latency = results['latency_us']
+    print(f"\nBus benchmark: {config['publishers']} publishers -> {config['subscribers']} subscribers, "
+          f"{config['pattern']}, {config['size']} B payload, {config['codec']}, {config['transport']}, "
+          f"{config['broker_mode']}/{config['socket_mode']}")
+    print(f"  sent {results['sent']}, received {results['received']}, dropped {results['dropped']} "
+          f"({results['drop_rate']:.2%})")
+    print(f"  throughput {results['throughput_msgs_per_sec']:,.0f} msgs/s delivered")
+    print(f"  latency p50 {latency['p50']}us, p99 {latency['p99']}us, p999 {latency['p999']}us, max {latency['max']}us")
+    cpu = results['cpu_seconds']
+    broker_cpu = f"{cpu['broker']:.2f}s" if cpu['broker'] is not None else 'n/a'
+    print(f"  cpu broker {broker_cpu}, publishers {sum(cpu['publishers']):.2f}s, "
+          f"subscribers {sum(cpu['subscribers']):.2f}s")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Sunshine bus with synthetic comets")
+    parser.add_argument('--publishers', type=int, default=2)
+    parser.add_argument('--subscribers', type=int, default=2)
+    parser.add_argument('--pattern', choices=PATTERNS, default='fanout')
+    parser.add_argument('--size', type=int, default=256, help="Payload padding in bytes")
+    parser.add_argument('--rate', type=int, default=2000, help="Messages/s per publisher (0 = as fast as possible)")
+    parser.add_argument('--duration', type=float, default=5, help="Seconds of load")
+    parser.add_argument('--codec', choices=('json', 'msgpack'), default=MESSAGE_CODEC)
+    parser.add_argument('--transport', choices=('tcp', 'ipc'), default=ZEROMQ_TRANSPORT)
+    parser.add_argument('--mode', choices=('proxy', 'relay'), default=BROKER_MODE)
+    parser.add_argument('--socket-mode', choices=('xpub', 'sub'), default=BROKER_SOCKET_MODE)
+    parser.add_argument('--output', help="Write the result JSON here (default: benchmarks/results/bus_<time>.json)")
+    parser.add_argument('--baseline', help="Result JSON of an earlier run to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="Allowed relative regression (0.1 = 10%%)")
+    # Internal: how the harness starts its synthetic comets
+    parser.add_argument('--role', choices=('publisher', 'subscriber'), help=argparse.SUPPRESS)
+    parser.add_argument('--index', type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument('--start-at', type=float, default=0, help=argparse.SUPPRESS)
+    parser.add_argument('--result-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    
+    if args.role:
+        # Synthetic comets encode with the codec under test instead of the configured one
+        base_subprocess.MESSAGE_CODEC = args.codec
+        report = run_publisher(args) if args.role == 'publisher' else run_subscriber(args)
+        with open(args.result_file, 'w') as f:
+            json.dump(report, f)
+        os._exit(0)  # Skip socket teardown; the run is over
+    
+    result = run_benchmark(args)
+    print_summary(result)
+    
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results',
+                                         f"bus_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResults written to {output}")
+    
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if not compare(result, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
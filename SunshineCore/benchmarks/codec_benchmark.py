@@ -0,0 +1,89 @@
+import sys
+import os
+import json
+import time
+from datetime import datetime
+
+# Add src directory to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from utils.codec import encode_body, decode_body, now_ns, msgpack, CODEC_JSON, CODEC_MSGPACK
+
+ITERATIONS = 20000
+
+# Typical payloads seen on the bus
+PAYLOADS = {
+    'small (LOG)': {'level': 'INFO', 'message': 'CometExample iteration #42'},
+    'medium (status)': {
+        'iteration': 1234,
+        'status': 'running',
+        'timestamp': time.time(),
+        'readings': [{'sensor': f's{i}', 'value': i * 0.5, 'unit': 'C'} for i in range(16)],
+    },
+    'large (report)': {
+        'rows': [{'id': i, 'name': f'item-{i}', 'values': list(range(10)), 'ok': i % 2 == 0} for i in range(100)],
+    },
+}
+
+def make_message(payload):
+    return {
+        'timestamp_ns': now_ns(),
+        'message_type': 'STATUS_UPDATE',
+        'sender': 'BenchmarkComet',
+        'payload': payload
+    }
+
+def bench_legacy(payload):
+    """Original path: ISO datetime + json.dumps on send, json.loads + fromisoformat on receive."""
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        body = json.dumps({
+            'datetime': datetime.now().isoformat(),
+            'message_type': 'STATUS_UPDATE',
+            'sender': 'BenchmarkComet',
+            'payload': payload
+        }).encode('utf-8')
+    encode_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        message = json.loads(body.decode('utf-8'))
+        datetime.fromisoformat(message['datetime'])
+    decode_time = time.perf_counter() - start
+    return encode_time, decode_time, len(body)
+
+def bench_codec(payload, codec):
+    """Codec layer path: epoch-nanosecond timestamp, encode_body / decode_body."""
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        body = encode_body(make_message(payload), codec)
+    encode_time = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    for _ in range(ITERATIONS):
+        message = decode_body(body)
+        message['timestamp_ns']
+    decode_time = time.perf_counter() - start
+    return encode_time, decode_time, len(body)
+
+def main():
+    print(f"Codec benchmark ({ITERATIONS} messages per case)")
+    print(f"{'payload':<18} {'codec':<10} {'bytes':>7} {'encode µs':>10} {'decode µs':>10}")
+    print("-" * 60)
+    
+    for name, payload in PAYLOADS.items():
+        cases = [('legacy', lambda: bench_legacy(payload)),
+                 (CODEC_JSON, lambda: bench_codec(payload, CODEC_JSON))]
+        if msgpack is not None:
+            cases.append((CODEC_MSGPACK, lambda: bench_codec(payload, CODEC_MSGPACK)))
+        
+        for codec_name, run in cases:
+            encode_time, decode_time, size = run()
+            print(f"{name:<18} {codec_name:<10} {size:>7} "
+                  f"{encode_time / ITERATIONS * 1e6:>10.2f} {decode_time / ITERATIONS * 1e6:>10.2f}")
+    
+    if msgpack is None:
+        print("\nmsgpack is not installed; binary codec results skipped")
+
+if __name__ == "__main__":
+    main()
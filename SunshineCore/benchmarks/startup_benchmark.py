@@ -0,0 +1,165 @@
+import sys
+import os
+import json
+import time
+import argparse
+import platform
+import statistics
+from datetime import datetime
+
+# Add src directory to path for imports
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+sys.path.append(SRC_DIR)
+
+import main as sunshine
+from utils.launcher import RoleLauncher, LAUNCH_SPAWN, LAUNCH_FORK, fork_available
+from utils.broker_control import send_broker_command, CMD_TERMINATE
+from utils.endpoints import shard_count, endpoint_environment
+from config.settings import ROLE_PRELOAD_MODULES, BROKER_READY_TIMEOUT, CONTROL_PANEL_READY_TIMEOUT
+
+# Starts the broker and the ControlPanel the way main.py does, once per launch mode, and
+# restarts each --runs times, timing launch -> ready (broker: READY on its control socket,
+# ControlPanel: READY on the bus). The first launch of a mode is reported on its own: in
+# fork mode it includes warming up the fork server. Uses the configured ports, so Sunshine
+# itself must not be running. --executable times a PyInstaller build (spawn only), e.g. to
+# compare the onefile and onedir layouts of build_prod.sh.
+ROLES = ('broker', 'control_panel')
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def start_broker(launcher):
+    """Start the broker role(s) and wait until every shard is ready; returns (roles, ms)."""
+    started = time.perf_counter()
+    brokers = sunshine.start_zeromq_broker_subprocess(launcher, dev_mode=False)
+    if not sunshine.wait_for_broker_ready(BROKER_READY_TIMEOUT):
+        raise RuntimeError("Broker did not become ready (is Sunshine already running on these ports?)")
+    return brokers, (time.perf_counter() - started) * 1000
+
+def stop_broker(brokers):
+    for shard in range(shard_count()):
+        send_broker_command(CMD_TERMINATE, shard=shard)
+    for broker in brokers:
+        if broker.wait(10) is None:
+            broker.kill()
+            broker.wait()
+
+def start_control_panel(launcher):
+    """Start the ControlPanel role and wait for its READY; returns (role, ms)."""
+    listener = sunshine.open_ready_listener()
+    try:
+        started = time.perf_counter()
+        control_panel = launcher.start(['--registry', 'ControlPanel'])
+        ready = sunshine.wait_for_ready(listener, ['ControlPanel'], CONTROL_PANEL_READY_TIMEOUT)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+    finally:
+        listener.close()
+    if 'ControlPanel' not in ready:
+        control_panel.kill()
+        raise RuntimeError("ControlPanel did not become ready")
+    return control_panel, elapsed_ms
+
+def stop_role(role):
+    role.terminate()
+    if role.wait(10) is None:
+        role.kill()
+        role.wait()
+
+def summarize(samples):
+    """First launch, then the restarts (which is what the fork server speeds up)."""
+    restarts = samples[1:] or samples
+    return {
+        'first_ms': round(samples[0], 1),
+        'restart_median_ms': round(statistics.median(restarts), 1),
+        'restart_p90_ms': round(percentile(restarts, 0.9), 1),
+        'restart_min_ms': round(min(restarts), 1),
+        'samples_ms': [round(sample, 1) for sample in samples]
+    }
+
+def benchmark_mode(mode, roles, runs, executable):
+    """Launch and restart each role `runs` times in one launch mode; returns {role: summary}."""
+    launcher = RoleLauncher(sunshine.run_role, mode, ['main', *ROLE_PRELOAD_MODULES], executable)
+    launcher.prepare()
+    timings = {role: [] for role in roles}
+    
+    if 'broker' in roles:
+        for _ in range(runs):
+            brokers, elapsed_ms = start_broker(launcher)
+            timings['broker'].append(elapsed_ms)
+            stop_broker(brokers)
+    
+    if 'control_panel' in roles:
+        brokers, _ = start_broker(launcher)
+        try:
+            for _ in range(runs):
+                control_panel, elapsed_ms = start_control_panel(launcher)
+                timings['control_panel'].append(elapsed_ms)
+                stop_role(control_panel)
+        finally:
+            stop_broker(brokers)
+    
+    return {role: summarize(samples) for role, samples in timings.items()}
+
+def quiet_roles():
+    """Send the roles' console output to devnull; returns a stream for our own output."""
+    console = os.fdopen(os.dup(sys.stdout.fileno()), 'w', buffering=1)
+    sys.stdout.flush()
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+    os.close(devnull)
+    return console
+
+def main():
+    parser = argparse.ArgumentParser(description="Time broker and ControlPanel (re)starts in each role launch mode")
+    parser.add_argument('--modes', nargs='+', choices=(LAUNCH_SPAWN, LAUNCH_FORK), default=[LAUNCH_SPAWN, LAUNCH_FORK])
+    parser.add_argument('--roles', nargs='+', choices=ROLES, default=list(ROLES))
+    parser.add_argument('--runs', type=int, default=10, help="Launches per role and mode (the first one is cold)")
+    parser.add_argument('--executable', help="Spawn this PyInstaller build instead of main.py (spawn mode only)")
+    parser.add_argument('--verbose', action='store_true', help="Show the roles' console output")
+    parser.add_argument('--output', help="Write the result JSON here (default: benchmarks/results/startup_<time>.json)")
+    args = parser.parse_args()
+    
+    if args.output:
+        args.output = os.path.abspath(args.output)
+    modes = args.modes
+    if args.executable:
+        args.executable = os.path.abspath(args.executable)
+        modes = [LAUNCH_SPAWN]
+    elif LAUNCH_FORK in modes and not fork_available():
+        print("⚠️  Fork launches are not available on this platform; timing spawn only")
+        modes = [mode for mode in modes if mode != LAUNCH_FORK]
+    
+    # Roles are started from src like main.py starts them, with the endpoints in their environment
+    os.chdir(SRC_DIR)
+    os.environ.update(endpoint_environment())
+    console = sys.stdout if args.verbose else quiet_roles()
+    
+    results = {}
+    for mode in modes:
+        print(f"⏱️  {mode}: {args.runs} launches of {', '.join(args.roles)}...", file=console)
+        results[mode] = benchmark_mode(mode, args.roles, args.runs, args.executable)
+    
+    print(f"\n{'Mode':<7} {'Role':<14} {'First ms':>9} {'Restart p50':>12} {'p90':>8} {'min':>8}", file=console)
+    for mode, roles in results.items():
+        for role, summary in roles.items():
+            print(f"{mode:<7} {role:<14} {summary['first_ms']:>9.1f} {summary['restart_median_ms']:>12.1f} "
+                  f"{summary['restart_p90_ms']:>8.1f} {summary['restart_min_ms']:>8.1f}", file=console)
+    
+    result = {
+        'timestamp': datetime.now().isoformat(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'executable': args.executable,
+        'runs': args.runs,
+        'results': results
+    }
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results',
+                                         f"startup_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResults written to {output}", file=console)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import sys
+import os
+import time
+import threading
+import statistics
+import zmq
+
+# Add src directory to path for imports
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from zeromq.broker import MessageBroker
+from utils.endpoints import (FRONTEND, BACKEND, TRANSPORT_TCP, TRANSPORT_IPC, TRANSPORT_INPROC, context_for,
+                             connect_endpoint, resolve_transport, owns_context)
+from utils.wire import encode_message, type_subscription
+from utils.codec import now_ns
+
+ROUND_TRIPS = 2000
+THROUGHPUT_MESSAGES = 50000
+
+# The broker runs in this process on each transport in turn; it must not already be running
+TRANSPORTS = [TRANSPORT_TCP, TRANSPORT_IPC, TRANSPORT_INPROC]
+
+def make_frames(message_type, sender):
+    return encode_message({
+        'timestamp_ns': now_ns(),
+        'message_type': message_type,
+        'sender': sender,
+        'payload': {'level': 'INFO', 'message': 'benchmark'}
+    })
+
+def connect_client(context, transport, message_type):
+    """PUB/SUB pair connected to the broker, subscribed to one message type."""
+    publisher = context.socket(zmq.PUB)
+    publisher.setsockopt(zmq.SNDHWM, 0)
+    publisher.setsockopt(zmq.LINGER, 0)
+    publisher.connect(connect_endpoint(FRONTEND, transport))
+    
+    subscriber = context.socket(zmq.SUB)
+    subscriber.setsockopt(zmq.RCVHWM, 0)
+    subscriber.setsockopt(zmq.LINGER, 0)
+    subscriber.connect(connect_endpoint(BACKEND, transport))
+    subscriber.setsockopt(zmq.SUBSCRIBE, type_subscription(message_type))
+    return publisher, subscriber
+
+def wait_until_connected(publisher, subscriber, message_type):
+    """Publish probes until the subscription has propagated through the broker."""
+    frames = make_frames(message_type, 'probe')
+    while True:
+        publisher.send_multipart(frames)
+        if subscriber.poll(100):
+            while subscriber.poll(50):
+                subscriber.recv_multipart()
+            return
+
+def echo_loop(context, transport, stop):
+    """Answer every BENCH_PING with a BENCH_PONG."""
+    publisher, subscriber = connect_client(context, transport, 'BENCH_PING')
+    pong = make_frames('BENCH_PONG', 'echo')
+    while not stop.is_set():
+        if subscriber.poll(100):
+            subscriber.recv_multipart()
+            publisher.send_multipart(pong)
+    publisher.close()
+    subscriber.close()
+
+def bench_latency(context, transport):
+    """Round trips client -> broker -> echo -> broker -> client, in microseconds."""
+    stop = threading.Event()
+    echo = threading.Thread(target=echo_loop, args=(context, transport, stop), daemon=True)
+    echo.start()
+    
+    publisher, subscriber = connect_client(context, transport, 'BENCH_PONG')
+    ping = make_frames('BENCH_PING', 'client')
+    
+    # Wait until the echo answers, i.e. both paths are connected
+    while True:
+        publisher.send_multipart(ping)
+        if subscriber.poll(100):
+            break
+    while subscriber.poll(50):
+        subscriber.recv_multipart()
+    
+    samples = []
+    for _ in range(ROUND_TRIPS):
+        start = time.perf_counter()
+        publisher.send_multipart(ping)
+        subscriber.recv_multipart()
+        samples.append((time.perf_counter() - start) * 1e6)
+    
+    stop.set()
+    echo.join()
+    publisher.close()
+    subscriber.close()
+    
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99)]
+
+def bench_throughput(context, transport):
+    """One-way messages per second through the broker."""
+    receiver_pub, receiver = connect_client(context, transport, 'BENCH_DATA')
+    sender, sender_sub = connect_client(context, transport, 'BENCH_UNUSED')
+    wait_until_connected(sender, receiver, 'BENCH_DATA')
+    
+    frames = make_frames('BENCH_DATA', 'sender')
+    received = 0
+    start = time.perf_counter()
+    for _ in range(THROUGHPUT_MESSAGES):
+        sender.send_multipart(frames)
+    while received < THROUGHPUT_MESSAGES and receiver.poll(1000):
+        receiver.recv_multipart()
+        received += 1
+    elapsed = time.perf_counter() - start
+    
+    for sock in (receiver_pub, receiver, sender, sender_sub):
+        sock.close()
+    return received / elapsed, received
+
+def run_transport(transport):
+    broker = MessageBroker(transport=transport)
+    broker_thread = threading.Thread(target=broker.start, daemon=True)
+    broker_thread.start()
+    time.sleep(1)
+    
+    context = context_for(transport)
+    try:
+        median_us, p99_us = bench_latency(context, transport)
+        rate, received = bench_throughput(context, transport)
+    finally:
+        broker.stop_relay()
+        broker_thread.join(timeout=5)
+        if owns_context(transport):
+            context.term()
+    return median_us, p99_us, rate, received
+
+def main():
+    results = {}
+    for transport in TRANSPORTS:
+        if resolve_transport(transport) != transport:
+            print(f"Skipping {transport}: not supported on this platform")
+            continue
+        results[transport] = run_transport(transport)
+    
+    print(f"\nBroker round trip ({ROUND_TRIPS} pings) and one-way throughput ({THROUGHPUT_MESSAGES} messages)")
+    print(f"{'transport':<10} {'median RTT':>12} {'p99 RTT':>12} {'msgs/s':>12} {'delivered':>10}")
+    for transport, (median_us, p99_us, rate, received) in results.items():
+        print(f"{transport:<10} {median_us:>10.1f}us {p99_us:>10.1f}us {rate:>12,.0f} {received:>10}")
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,47 @@
 #!/bin/bash
-echo "Building Sunshine System for Production"
+# Usage: ./build_prod.sh [--onefile | --onedir]
+#   --onefile  one executable; it unpacks itself to a temp dir on every launch, which every
+#              role (broker, ControlPanel, restarts) pays for again (default)
+#   --onedir   a sunshine_system folder with the executable and its libraries; nothing is
+#              unpacked at launch, so roles start much faster, especially on slow disks
+LAYOUT="onefile"
+case "$1" in
+    --onedir) LAYOUT="onedir" ;;
+    --onefile|"") LAYOUT="onefile" ;;
+    *) echo "Unknown option: $1 (use --onefile or --onedir)"; exit 1 ;;
+esac
+
+echo "Building Sunshine System for Production ($LAYOUT)"
 echo "======================================"
 
-# Change to the sunshine_systems directory
-cd sunshine_systems
+# Change to the source directory
+cd src
 
 # Install dependencies
 echo "Installing dependencies..."
 pipenv install
 
+# Registry subprocesses are imported by name in a frozen build, so PyInstaller has to be told about them
+HIDDEN_IMPORTS=$(pipenv run python -c "from subprocesses.registry import SUBPROCESS_REGISTRY; print(' '.join('--hidden-import subprocesses.%s.main' % config['folder'] for config in SUBPROCESS_REGISTRY))")
+
 # Build executable with PyInstaller
 echo "Building executable..."
-pipenv run pyinstaller --onefile --noconsole --add-data "templates:templates" main.py
+rm -rf dist/sunshine_system dist/sunshine_system.exe
+pipenv run pyinstaller --$LAYOUT --noconsole --name sunshine_system $HIDDEN_IMPORTS --add-data "templates:templates" main.py
 
 # Return to root directory
 cd ..
 
-# Move the built executable to the root sunshine folder
-echo "Moving executable to root folder..."
-if [ -f "sunshine_systems/dist/main" ]; then
-    mv sunshine_systems/dist/main sunshine_system
-elif [ -f "sunshine_systems/dist/main.exe" ]; then
-    mv sunshine_systems/dist/main.exe sunshine_system.exe
+# Move the build to the root sunshine folder
+echo "Moving build to root folder..."
+rm -rf sunshine_system sunshine_system.exe
+if [ -d "src/dist/sunshine_system" ]; then
+    mv src/dist/sunshine_system sunshine_system
+    echo "Build complete! Run sunshine_system/sunshine_system (keep the folder together)"
+elif [ -f "src/dist/sunshine_system" ]; then
+    mv src/dist/sunshine_system sunshine_system
+    echo "Build complete! Executable created in root folder"
+elif [ -f "src/dist/sunshine_system.exe" ]; then
+    mv src/dist/sunshine_system.exe sunshine_system.exe
+    echo "Build complete! Executable created in root folder"
 fi
-
-echo "Build complete! Executable created in root folder"
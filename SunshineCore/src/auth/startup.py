@@ -1,8 +1,8 @@
 from flask import Flask, render_template, request, jsonify
 import threading
-import time
 import webbrowser
 import os
+from werkzeug.serving import make_server
 from utils.process_manager import kill_process_on_port
 from config.settings import AUTH_PORT
 
@@ -12,20 +12,28 @@ app = Flask(__name__, template_folder='../templates')
 auth_completed = threading.Event()
 flask_server = None
 
+# make_server() binds the port before returning, so the browser can be opened right away;
+# auth_completed is set only once the /auth response has been sent, so the server can then
+# be closed at once and the ControlPanel can take over the same port.
 def start_auth_server():
     """Start authentication server and wait for user authentication."""
+    global flask_server
+    
     # Kill any existing process on the port
     kill_process_on_port(AUTH_PORT)
     
     print("Starting authentication server...")
     
+    try:
+        flask_server = make_server('127.0.0.1', AUTH_PORT, app, threaded=True)
+    except OSError as e:
+        print(f"❌ Could not start authentication server on port {AUTH_PORT}: {e}")
+        return False
+    
     # Start Flask server in thread
-    server_thread = threading.Thread(target=run_server, daemon=True)
+    server_thread = threading.Thread(target=run_server, args=(flask_server,), daemon=True)
     server_thread.start()
     
-    # Wait a moment for server to start
-    time.sleep(2)
-    
     # Open browser automatically
     auth_url = f'http://127.0.0.1:{AUTH_PORT}/'
     print(f"Opening browser to: {auth_url}")
@@ -39,25 +47,30 @@ def start_auth_server():
     print("Waiting for user authentication...")
     success = auth_completed.wait(timeout=300)  # 5 minute timeout
     
+    stop_server()
     if success:
         print("✅ Authentication successful!")
-        # Give a moment for the shutdown response to be sent
-        time.sleep(2)
         return True
     else:
         print("❌ Authentication timeout!")
         return False
 
-def run_server():
+def run_server(server):
     """Run Flask server."""
-    global flask_server
     try:
-        # Store server reference for shutdown
-        flask_server = app
-        app.run(host='127.0.0.1', port=AUTH_PORT, debug=False, use_reloader=False, threaded=True)
+        # Short poll interval so stop_server() returns promptly
+        server.serve_forever(poll_interval=0.05)
     except Exception as e:
         print(f"Server error: {e}")
 
+def stop_server():
+    """Stop serving and release the port."""
+    global flask_server
+    server, flask_server = flask_server, None
+    if server:
+        server.shutdown()
+        server.server_close()
+
 @app.route('/')
 def index():
     return render_template('auth/index.html')
@@ -69,10 +82,10 @@ def authenticate():
         # Mock authentication - always accept
         print("User authentication received")
         
-        # Set the authentication completed flag
-        auth_completed.set()
-        
-        return jsonify({'status': 'success', 'message': 'Authentication successful'})
+        # Set the authentication completed flag once the response has gone out
+        response = jsonify({'status': 'success', 'message': 'Authentication successful'})
+        response.call_on_close(auth_completed.set)
+        return response
     except Exception as e:
         print(f"Authentication error: {e}")
         return jsonify({'status': 'error', 'message': str(e)}), 500
@@ -83,13 +96,8 @@ def shutdown():
     try:
         print("Shutting down auth server...")
         
-        # Shutdown Flask server gracefully
-        def shutdown_server():
-            time.sleep(1)
-            # Kill the process on this port to force shutdown
-            kill_process_on_port(AUTH_PORT)
-        
-        threading.Thread(target=shutdown_server, daemon=True).start()
+        # Normally already closed after /auth; shut down from another thread (this one is serving)
+        threading.Thread(target=stop_server, daemon=True).start()
         return jsonify({'status': 'shutting_down'})
     except Exception as e:
         print(f"Shutdown error: {e}")
@@ -2,13 +2,99 @@
 AUTH_PORT = 2828
 CONTROL_PANEL_PORT = 2828  # Same as auth since they run sequentially
 ZEROMQ_PORT = 5555
+ZEROMQ_CONTROL_PORT = ZEROMQ_PORT + 2  # Broker control socket (PAUSE/RESUME/TERMINATE/STATISTICS)
+ZEROMQ_CAPTURE_PORT = ZEROMQ_PORT + 3  # Broker capture socket (copy of all traffic)
+
+# ZeroMQ Transport ('tcp' = localhost ports above, 'ipc' = Unix domain sockets in ZEROMQ_IPC_DIR,
+# 'inproc' = only for components hosted in the broker's own process; see utils/endpoints.py)
+ZEROMQ_TRANSPORT = 'tcp'
+ZEROMQ_IPC_DIR = None  # None = <temp dir>/sunshine-zmq
+
+# ZeroMQ Wire Format ('multipart' = topic frame + JSON body, 'legacy' = single JSON frame)
+ZEROMQ_WIRE_FORMAT = 'multipart'
+
+# Message Body Codec ('json' or 'msgpack'; receivers detect the format per message)
+MESSAGE_CODEC = 'json'
+
+# Publisher Batching (opt-in; consecutive messages with the same topic share one multipart send)
+BATCHING_ENABLED = False
+BATCH_MAX_MESSAGES = 64  # Flush once a batch holds this many messages
+BATCH_MAX_DELAY_US = 1000  # Flush a batch this many microseconds after its first message
+
+# Request/Reply (see utils/rpc.py)
+REQUEST_HANDLER_THREADS = 4  # Request handlers run on this many worker threads per process, never on the message loop
+
+# Broker Settings
+BROKER_MODE = 'proxy'  # 'proxy' = native zmq steerable proxy, 'relay' = Python poll loop
+BROKER_SOCKET_MODE = 'xpub'  # 'xpub' = XSUB/XPUB, subscriptions forwarded to publishers; 'sub' = SUB/PUB, publishers send everything
+BROKER_CAPTURE_ENABLED = False  # Publish a copy of all traffic on ZEROMQ_CAPTURE_PORT
+BROKER_SUBSCRIPTIONS_INTERVAL = 1  # Seconds between BROKER_SUBSCRIPTIONS updates (only sent on change)
+BROKER_RELAY_DRAIN_MAX = 1024  # Relay mode: most messages relayed per wake-up before control commands are checked again
+
+# Broker Scaling
+ZEROMQ_IO_THREADS = 1  # libzmq I/O threads in the broker's context
+BROKER_SHARDS = 1  # Number of broker shards; publishers pick a shard by crc32(message type)
+BROKER_SHARD_MODE = 'process'  # 'process' = one broker process per shard, 'thread' = all shards in one process
+BROKER_SHARD_PORT_STRIDE = 10  # Shard i uses the ZeroMQ ports above + i * stride
+
+# Control Panel Stream (bus messages reach the browsers in coalesced frames, see subprocesses/control_panel/stream.py)
+UI_PUSH_INTERVAL_MS = 100  # Cadence of message frames sent to each browser
+UI_PUSH_MAX_BUFFER = 500  # Messages held per browser between frames; beyond that the oldest are dropped and reported as skipped
+UI_PUSH_ACK_TIMEOUT = 5  # Seconds to wait for a browser to ack a frame before sending it the next one anyway
+
+# Metrics (Prometheus text on GET /metrics and the live panel of the ControlPanel)
+METRICS_INTERVAL = 1  # Seconds between broker polls and UI metrics updates
+
+# History Query API (GET /api/history and the 'history_query' Socket.IO event on the ControlPanel)
+HISTORY_QUERY_DEFAULT_LIMIT = 100  # Messages per page when the client does not ask for a size
+HISTORY_QUERY_MAX_LIMIT = 1000  # Largest page a client may request
+HISTORY_QUERY_MAX_SCAN = 200000  # Messages examined per page before returning a cursor to continue from
+
+# Message Journal (ControlPanel writes every bus message to disk, see utils/journal.py)
+JOURNAL_ENABLED = False  # Opt-in: when enabled it keeps up to JOURNAL_RETENTION_BYTES on disk (Documents/Sunshine/journal by default)
+JOURNAL_DIR = None  # None = Documents/Sunshine/journal
+JOURNAL_SEGMENT_MAX_BYTES = 64 * 1024 * 1024  # Start a new segment file past this size
+JOURNAL_SEGMENT_MAX_SECONDS = 3600  # Start a new segment file after this many seconds
+JOURNAL_INDEX_INTERVAL = 64  # Index every Nth record (time + seq -> offset)
+JOURNAL_RETENTION_BYTES = 2 * 1024 * 1024 * 1024  # Delete the oldest segments beyond this total size
+JOURNAL_RETENTION_HOURS = 72  # Delete segments last written longer ago than this
+JOURNAL_QUEUE_MAX = 100000  # Messages waiting for the disk; beyond that new messages are dropped and counted
+
+# Startup Readiness (each phase waits for an explicit signal instead of a fixed sleep)
+BROKER_READY_TIMEOUT = 10  # Seconds main.py waits for every broker shard to answer READY on its control socket
+BUS_READY_TIMEOUT = 10  # Seconds a subprocess waits for its bus probe to come back through every shard
+BUS_PROBE_INTERVAL_MS = 20  # Bus probes are resent this often until they come back
+CONTROL_PANEL_READY_TIMEOUT = 30  # Seconds main.py waits for the ControlPanel's READY before launching plugins
+
+# Plugin Launch (see utils/plugin_launcher.py)
+PLUGIN_LAUNCH_CONCURRENCY = 8  # Plugins spawned (and, with admission, starting up) at the same time
+PLUGIN_ADMIT_ON_REGISTER = True  # Keep a launch slot until the plugin's REGISTER is seen, staggering registrations
+PLUGIN_REGISTER_TIMEOUT = 15  # Seconds after spawning before a plugin is reported as not registered
+
+# Role Launch (how main.py starts the broker and subprocesses, see utils/launcher.py)
+ROLE_LAUNCH_MODE = 'fork'  # 'fork' = fork each role from a preloaded fork server (Linux/macOS), 'spawn' = new process per role (always on Windows)
+ROLE_PRELOAD_MODULES = [  # Imported once by the fork server, so forked roles start without importing them
+    'zmq',
+    'zeromq.broker',
+    'subprocesses.base_subprocess',
+    'subprocesses.control_panel.main',
+]
+
+# Supervisor (main.py stays up after startup and restarts processes that exit, see utils/supervisor.py)
+# SUBPROCESS_REGISTRY entries can override the restart policy with 'restart', 'max_restarts' and 'restart_backoff'
+SUPERVISOR_RESTART = 'on-failure'  # 'always', 'on-failure' (non-zero exit; a SHUTDOWN exits with 0) or 'never'
+SUPERVISOR_MAX_RESTARTS = 5  # Consecutive restarts before giving up on a process (a critical one stops the system)
+SUPERVISOR_RESTART_BACKOFF = 0.25  # Seconds before the first restart, doubled for each consecutive restart
+SUPERVISOR_BACKOFF_MAX = 30  # Longest delay between restarts in seconds
+SUPERVISOR_STABLE_SECONDS = 60  # A process that ran this long has its restart count reset
+SUPERVISOR_SHUTDOWN_TIMEOUT = 10  # Seconds processes get to exit on SHUTDOWN or Ctrl+C before they are terminated/killed
 
 # Application Settings
 MAX_REGISTRATION_ATTEMPTS = 30
 REGISTRATION_RETRY_INTERVAL = 2
 PING_INTERVAL = 5
 PING_TIMEOUT = 15
-MAX_MESSAGE_HISTORY = 1000
+MAX_MESSAGE_HISTORY = 100000  # ControlPanel ring buffer (messages are stored encoded, a few hundred bytes each)
 
 # Logging Settings
 LOG_TO_DESKTOP_ON_CRASH = True
@@ -1,14 +1,41 @@
+# Every role (system startup, broker, registry subprocess) starts from this file, and the
+# production binary re-executes it for each one, so it imports only the standard library and
+# the settings. Each role imports what it needs after dispatch; the orchestrator's web server
+# (auth) and the Control Panel are the only roles that load Flask.
+# tools/import_budget.py checks this.
 import sys
 import os
-import subprocess
 import time
-import socket
-from pathlib import Path
-from auth.startup import start_auth_server
-from subprocesses.registry import SUBPROCESS_REGISTRY, get_subprocess_folder_by_name
-from utils.logger import crash_logger
 from config.settings import *
 
+class StartupTimer:
+    """Duration of each startup phase, for the report at the end of startup."""
+    
+    def __init__(self):
+        self.started = time.monotonic()
+        self.phases = []  # (name, seconds)
+        self.current = None  # (name, start time)
+    
+    def phase(self, name):
+        """End the running phase and start the next one."""
+        self.finish()
+        self.current = (name, time.monotonic())
+    
+    def finish(self):
+        """End the running phase."""
+        if self.current:
+            name, started = self.current
+            self.phases.append((name, time.monotonic() - started))
+            self.current = None
+    
+    def report(self):
+        """Print the time spent in each phase."""
+        self.finish()
+        print("\n⏱️  Startup timing:")
+        for name, seconds in self.phases:
+            print(f"   {name:<32} {seconds * 1000:>8.0f} ms")
+        print(f"   {'Total':<32} {(time.monotonic() - self.started) * 1000:>8.0f} ms")
+
 def main():
     # Check if this is a subprocess call
     if '--registry' in sys.argv:
@@ -16,20 +43,46 @@ def main():
         print(f"Starting subprocess: {registry_name}")
         run_subprocess(registry_name)
         return
-
+    
+    # Broker process: main.py --broker [--shard N] [--mode ...]
+    if '--broker' in sys.argv:
+        run_broker()
+        return
+    
     # Main startup process
+    from auth.startup import start_auth_server
+    from subprocesses.registry import SUBPROCESS_REGISTRY
+    from utils.logger import crash_logger
+    from utils.endpoints import TRANSPORT_INPROC, resolve_transport, endpoint_environment, describe_endpoints
+    from utils.launcher import RoleLauncher
+    
     try:
         # Check for dev mode
         dev_mode = '--devmode' in sys.argv
+        timer = StartupTimer()
         
         print("="*50)
         print("SUNSHINE SYSTEM STARTUP")
         print(f"Main Process PID: {os.getpid()}")
         print("="*50)
         
+        # Every process we launch (broker, subprocesses, plugin Comets) inherits the endpoints
+        if resolve_transport() == TRANSPORT_INPROC:
+            print("\n❌ ZEROMQ_TRANSPORT = 'inproc' only works for components inside one process. "
+                  "Use 'tcp' or 'ipc' to run the system.")
+            return
+        os.environ.update(endpoint_environment())
+        print(f"ZeroMQ transport: {resolve_transport()}")
+        
+        # The fork server does its imports while the user authenticates
+        launcher = RoleLauncher(run_role, ROLE_LAUNCH_MODE, ROLE_PRELOAD_MODULES)
+        launcher.prepare()
+        print(f"Role launch mode: {launcher.mode}")
+        
         # Phase 1: Authentication (BLOCKING)
         print("\nPhase 1: Authentication")
         print("-" * 25)
+        timer.phase("Authentication (waits for user)")
         auth_success = start_auth_server()
         
         if not auth_success:
@@ -41,11 +94,13 @@ def main():
         print("\nPhase 2: Starting ZeroMQ Broker")
         print("-" * 35)
         try:
-            start_zeromq_broker_subprocess(dev_mode)
+            timer.phase("Broker launch")
+            brokers = start_zeromq_broker_subprocess(launcher, dev_mode)
             print("✅ ZeroMQ Broker subprocess started")
             
             # Wait for broker to be ready
             print("   Waiting for broker to initialize...")
+            timer.phase("Broker ready")
             if wait_for_broker_ready():
                 print("✅ ZeroMQ Broker is ready")
             else:
@@ -61,26 +116,43 @@ def main():
         print("\nPhase 3: Starting Control Panel")
         print("-" * 30)
         
-        launched_count = launch_all_subprocesses(dev_mode)
+        # Listen for READY before launching, so no announcement can be missed
+        ready_listener = open_ready_listener()
+        timer.phase("Control Panel launch")
+        started_subprocesses = launch_all_subprocesses(launcher, dev_mode)
+        
+        # Plugins register with the Control Panel, so they start once it is on the bus
+        timer.phase("Control Panel ready")
+        expected = [config['name'] for config in SUBPROCESS_REGISTRY]
+        ready = wait_for_ready(ready_listener, expected, CONTROL_PANEL_READY_TIMEOUT)
+        ready_listener.close()
+        for name in expected:
+            if name in ready:
+                print(f"✅ {name} ready ({ready[name]:.2f}s after its start)")
+            else:
+                print(f"⚠️  {name} not ready after {CONTROL_PANEL_READY_TIMEOUT}s, continuing")
         
         # Phase 4: Start plugin Comets
         print("\nPhase 4: Starting Plugin Comets")
         print("-" * 30)
         
-        plugin_count = launch_plugin_comets(dev_mode)
+        timer.phase("Plugin launch")
+        plugin_launches = launch_plugin_comets(dev_mode)
+        plugin_count = sum(1 for launch in plugin_launches if launch.process)
+        timer.report()
         
         print(f"\n🚀 System startup complete:")
-        print(f"   - ZeroMQ Broker (ports 5555/5556)")
+        print(f"   - ZeroMQ Broker ({describe_endpoints()}"
+              f"{f', {BROKER_SHARDS} shards' if BROKER_SHARDS > 1 else ''})")
         print(f"   - Control Panel (http://127.0.0.1:2828)")
-        print(f"   - {launched_count} internal subprocess(es)")
+        print(f"   - {len(started_subprocesses)} internal subprocess(es)")
         print(f"   - {plugin_count} plugin Comet(s)")
-        print("\nMain process exiting in 3 seconds...")
         
-        # Brief pause then exit - all processes continue running
-        for i in range(3, 0, -1):
-            print(f"   Exiting in {i}...")
-            time.sleep(1)
-        print("Main process terminated. All processes continue running. ✅")
+        # Phase 5: Stay up as the supervisor until the system is shut down
+        print("\nPhase 5: Supervising")
+        print("-" * 22)
+        supervise(launcher, brokers, started_subprocesses, plugin_launches, dev_mode)
+        print("Main process terminated. ✅")
         
     except Exception as e:
         crash_logger("main_application", e)
@@ -91,7 +163,10 @@ def main():
         return
 
 def launch_plugin_comets(dev_mode):
-    """Launch all Comets found in the user's Documents/Sunshine/plugins directory."""
+    """Launch all Comets found in the user's Documents/Sunshine/plugins directory; returns their PluginLaunch records."""
+    from pathlib import Path
+    from utils.plugin_launcher import PluginLauncher, print_launch_report
+    
     # Get user's Documents folder
     if os.name == 'nt':  # Windows
         documents_path = os.path.join(os.environ['USERPROFILE'], 'Documents')
@@ -107,7 +182,7 @@ def launch_plugin_comets(dev_mode):
             print(f"   Created plugins directory: {plugins_dir}")
         except Exception as e:
             print(f"   Failed to create plugins directory: {e}")
-            return 0
+            return []
     
     # Look for executables (with or without .exe extension)
     plugin_files = []
@@ -121,49 +196,24 @@ def launch_plugin_comets(dev_mode):
     
     if not plugin_files:
         print(f"   No plugin Comets found in: {plugins_dir}")
-        return 0
+        return []
     
     print(f"   Found {len(plugin_files)} Comet(s) in: {plugins_dir}")
+    print(f"\n🌟 Launching Comets ({PLUGIN_LAUNCH_CONCURRENCY} at a time"
+          f"{', each slot held until the Comet registers' if PLUGIN_ADMIT_ON_REGISTER else ''})")
     
-    launched = 0
-    for plugin_file in plugin_files:
-        try:
-            print(f"\n🌟 Launching Comet: {plugin_file.name}")
-            
-            cmd = [str(plugin_file)]
-            if dev_mode:
-                cmd.append('--dev')
-            
-            if os.name == 'nt':  # Windows
-                if dev_mode:
-                    proc = subprocess.Popen(
-                        cmd,
-                        creationflags=subprocess.CREATE_NEW_CONSOLE,
-                        cwd=plugins_dir
-                    )
-                else:
-                    proc = subprocess.Popen(
-                        cmd,
-                        creationflags=subprocess.CREATE_NO_WINDOW,
-                        cwd=plugins_dir
-                    )
-            else:  # Linux/Mac
-                proc = subprocess.Popen(cmd, cwd=plugins_dir)
-            
-            print(f"   ✅ Launched {plugin_file.name} (PID: {proc.pid})")
-            launched += 1
-            
-            # Small delay between launches
-            time.sleep(0.5)
-            
-        except Exception as e:
-            print(f"   ❌ Failed to launch {plugin_file.name}: {e}")
+    launcher = PluginLauncher(plugin_files, plugins_dir, dev_mode, PLUGIN_LAUNCH_CONCURRENCY,
+                              PLUGIN_ADMIT_ON_REGISTER, PLUGIN_REGISTER_TIMEOUT)
+    report = launcher.launch()
+    print_launch_report(report)
     
-    return launched
+    return launcher.launches
 
-def launch_all_subprocesses(dev_mode):
-    """Launch all internal subprocesses."""
-    launched_count = 0
+def launch_all_subprocesses(launcher, dev_mode):
+    """Launch all internal subprocesses; returns (registry entry, RoleProcess) of each one started."""
+    from subprocesses.registry import SUBPROCESS_REGISTRY
+    
+    started = []
     
     for i, config in enumerate(SUBPROCESS_REGISTRY):
         process_num = i + 1
@@ -173,42 +223,50 @@ def launch_all_subprocesses(dev_mode):
         print(f"{'='*60}")
         
         try:
-            cmd = [sys.executable, 'main.py', '--registry', config['name']]
-            
-            if dev_mode and config.get('show_console', True):
-                if os.name == 'nt':  # Windows
-                    proc = subprocess.Popen(
-                        cmd,
-                        creationflags=subprocess.CREATE_NEW_CONSOLE,
-                        cwd=os.getcwd()
-                    )
-                    print(f"   ✅ {config['name']} launched with PID: {proc.pid}")
-                else:  # Linux/Mac
-                    proc = subprocess.Popen(cmd, cwd=os.getcwd())
-                    print(f"   ✅ {config['name']} launched")
-            else:
-                if os.name == 'nt':  # Windows
-                    proc = subprocess.Popen(
-                        cmd,
-                        cwd=os.getcwd(),
-                        creationflags=subprocess.CREATE_NO_WINDOW
-                    )
-                else:  # Linux/Mac
-                    proc = subprocess.Popen(cmd, cwd=os.getcwd())
-                print(f"   ✅ {config['name']} background launched")
+            role = launcher.start(['--registry', config['name']], dev_mode, config.get('show_console', True))
+            print(f"   ✅ {config['name']} {launcher.mode} launched with PID: {role.pid}")
             
-            launched_count += 1
+            started.append((config, role))
             
         except Exception as e:
             print(f"❌ Failed to launch {config['name']}: {e}")
     
-    return launched_count
+    return started
+
+def supervise(launcher, brokers, started_subprocesses, plugin_launches, dev_mode):
+    """Run the supervisor over everything started above until the system stops."""
+    from functools import partial
+    from utils.supervisor import Supervisor, restart_policy
+    from utils.plugin_launcher import spawn_plugin
+    
+    supervisor = Supervisor()
+    for shard, broker in enumerate(brokers):
+        name = "ZeroMQBroker" if len(brokers) == 1 else f"ZeroMQBroker[{shard}]"
+        supervisor.add(name, partial(launcher.start, broker.args, dev_mode), broker, restart_policy(critical=True))
+    for config, role in started_subprocesses:
+        start = partial(launcher.start, role.args, dev_mode, config.get('show_console', True))
+        supervisor.add(config['name'], start, role, restart_policy(config))
+    for launch in plugin_launches:
+        if launch.process:
+            start = partial(spawn_plugin, launch.plugin_file, os.path.dirname(str(launch.plugin_file)), dev_mode)
+            supervisor.add(launch.name, start, launch.process)
+    supervisor.run()
 
 def run_subprocess(registry_name):
     """Run a specific subprocess by executing its main.py file directly."""
+    from subprocesses.registry import get_subprocess_folder_by_name
+    from utils.logger import crash_logger
+    from utils.launcher import pause_before_closing
+    
     try:
         subprocess_folder = get_subprocess_folder_by_name(registry_name)
-        if subprocess_folder:
+        if subprocess_folder and getattr(sys, 'frozen', False):
+            # A frozen build has no source files; build_prod.sh bundles the subprocesses as modules
+            import importlib
+            module = importlib.import_module(f"subprocesses.{subprocess_folder}.main")
+            module.main()
+        
+        elif subprocess_folder:
             subprocess_path = os.path.join('subprocesses', subprocess_folder, 'main.py')
             
             if not os.path.exists(subprocess_path):
@@ -252,65 +310,77 @@ def run_subprocess(registry_name):
         print(f"❌ Fatal error in {registry_name}: {e}")
         import traceback
         traceback.print_exc()
-        print("Press Enter to close this window...")
-        try:
-            input()
-        except:
-            time.sleep(30)
+        pause_before_closing()
         sys.exit(1)
 
-def start_zeromq_broker_subprocess(dev_mode):
-    """Start ZeroMQ broker as an independent subprocess."""
-    broker_path = os.path.join('zeromq', 'broker.py')
-    
-    if not os.path.exists(broker_path):
-        raise FileNotFoundError(f"ZeroMQ broker not found: {broker_path}")
-    
-    cmd = [sys.executable, broker_path]
+def run_role(args):
+    """Entry point of a role forked by the launcher: dispatch as if started with these arguments."""
+    sys.argv = [sys.argv[0], *args]
+    main()
+
+def run_broker():
+    """Run the ZeroMQ broker in this process (it reads its own options from sys.argv)."""
+    from zeromq.broker import main as broker_main
+    broker_main()
+
+def start_zeromq_broker_subprocess(launcher, dev_mode):
+    """Start the ZeroMQ broker as independent subprocess(es): one per shard, or one hosting all shards."""
+    if BROKER_SHARDS > 1 and BROKER_SHARD_MODE == 'process':
+        brokers = []
+        for shard in range(BROKER_SHARDS):
+            brokers.append(launcher.start(['--broker', '--shard', str(shard)], dev_mode))
+            print(f"   Broker shard {shard + 1}/{BROKER_SHARDS} launched")
+        return brokers
+    return [launcher.start(['--broker'], dev_mode)]
+
+def wait_for_broker_ready(timeout=BROKER_READY_TIMEOUT):
+    """Wait for every broker shard to answer READY on its control socket."""
+    from utils.broker_control import wait_for_broker
+    from utils.endpoints import shard_count
     
-    if dev_mode:
-        if os.name == 'nt':  # Windows
-            subprocess.Popen(
-                cmd,
-                creationflags=subprocess.CREATE_NEW_CONSOLE,
-                cwd=os.getcwd()
-            )
-        else:  # Linux/Mac
-            subprocess.Popen(cmd, cwd=os.getcwd())
-    else:
-        if os.name == 'nt':  # Windows
-            subprocess.Popen(
-                cmd,
-                cwd=os.getcwd(),
-                creationflags=subprocess.CREATE_NO_WINDOW
-            )
-        else:  # Linux/Mac
-            subprocess.Popen(cmd, cwd=os.getcwd())
+    deadline = time.monotonic() + timeout
+    for shard in range(shard_count()):
+        if not wait_for_broker(max(deadline - time.monotonic(), 0), shard=shard):
+            return False
+    return True
 
-def wait_for_broker_ready(timeout=10):
-    """Wait for ZeroMQ broker to be ready by checking if ports are listening."""
-    start_time = time.time()
+def open_ready_listener():
+    """SUB socket receiving the READY broadcasts of starting processes."""
+    import zmq
+    from utils.message_types import MSG_READY
+    from utils.wire import type_subscription, LEGACY_PREFIX
+    from utils.endpoints import BACKEND, connect_endpoints
     
-    while time.time() - start_time < timeout:
-        try:
-            sock1 = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock2 = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            
-            result1 = sock1.connect_ex(('127.0.0.1', ZEROMQ_PORT))
-            result2 = sock2.connect_ex(('127.0.0.1', ZEROMQ_PORT + 1))
-            
-            sock1.close()
-            sock2.close()
-            
-            if result1 == 0 and result2 == 0:
-                return True
-                
-        except Exception:
-            pass
-        
-        time.sleep(0.5)
+    listener = zmq.Context.instance().socket(zmq.SUB)
+    listener.setsockopt(zmq.LINGER, 0)
+    for endpoint in connect_endpoints(BACKEND):
+        listener.connect(endpoint)
+    listener.setsockopt(zmq.SUBSCRIBE, type_subscription(MSG_READY))
+    listener.setsockopt(zmq.SUBSCRIBE, LEGACY_PREFIX)  # Legacy wire format has no topic frame
+    return listener
+
+def wait_for_ready(listener, process_names, timeout):
+    """Wait for READY from each named process; returns {name: its startup seconds} for those that sent it."""
+    from utils.message_types import MSG_READY
+    from utils.wire import decode_frames
     
-    return False
+    pending = set(process_names)
+    ready = {}
+    deadline = time.monotonic() + timeout
+    while pending:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or not listener.poll(remaining * 1000):
+            break
+        for message in decode_frames(listener.recv_multipart()):
+            payload = message.get('payload') or {}
+            if message.get('message_type') == MSG_READY and payload.get('process_name') in pending:
+                pending.discard(payload['process_name'])
+                ready[payload['process_name']] = payload.get('startup_seconds', 0)
+    return ready
 
 if __name__ == "__main__":
+    if getattr(sys, 'frozen', False):
+        # Lets a frozen build act as the fork server (see utils/launcher.py)
+        import multiprocessing
+        multiprocessing.freeze_support()
     main()
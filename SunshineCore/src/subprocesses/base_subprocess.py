@@ -1,28 +1,62 @@
 import zmq
-import json
 import threading
 import time
 import sys
 import os
-from datetime import datetime
+import itertools
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from utils.message_types import *
 from utils.logger import crash_logger
-from config.settings import ZEROMQ_PORT
+from utils.codec import now_ns
+from utils.batching import MessageBatcher, IMMEDIATE_TYPES
+from utils.rpc import PendingRequests, response_type
+from utils.sequence_tracker import SequenceTracker
+from utils.endpoints import FRONTEND, BACKEND, connect_endpoints, context_for, owns_context, shard_for_type
+from utils.wire import (encode_message, decode_frames, is_legacy, parse_topic, type_subscription, target_subscription,
+                        describe_subscription, LEGACY_PREFIX, WIRE_FORMAT_LEGACY)
+from config.settings import (ZEROMQ_WIRE_FORMAT, MESSAGE_CODEC, BATCHING_ENABLED,
+                             BATCH_MAX_MESSAGES, BATCH_MAX_DELAY_US, BUS_READY_TIMEOUT, BUS_PROBE_INTERVAL_MS,
+                             REQUEST_HANDLER_THREADS)
+
+# System broadcasts every subprocess must receive. REGISTER_ACK and single-process
+# SHUTDOWN are directed messages and arrive on the process's own @name topic.
+SYSTEM_SUBSCRIPTIONS = [MSG_PING, MSG_SHUTDOWN]
 
 class BaseSubProcess:
+    # Message types handled by handle_custom_message; None subscribes to everything
+    subscribe_to = None
+    
     def __init__(self, process_name):
         self.process_name = process_name
         self.process_id = os.getpid()
-        self.context = zmq.Context()
-        self.publisher = None
+        self.started_at = time.monotonic()
+        self.context = context_for()
+        self.publishers = []  # One per broker shard
+        self.publisher_lock = threading.Lock()  # send_message is called from several threads
+        self.batcher = None
         self.subscriber = None
+        self.wake_sender = None
+        self.wake_receiver = None
         self.registered = False
         self.registration_complete = threading.Event()
+        self.bus_ready = threading.Event()
+        self.bus_probe_acks = set()  # Shards our own BUS_PROBE came back through
         self.last_ping_time = time.time()
         self.shutdown_flag = threading.Event()
+        self.exit_code = 0  # Non-zero once shutdown() was called because something failed
         self.message_thread = None
         self.main_thread = None
         self.on_message_sent = None  # Callback for sent messages
+        self.pending_requests = PendingRequests(process_name)
+        self.request_handlers = {}  # message_type -> handler(message) returning the reply payload
+        self.request_executor = None  # Worker threads running request handlers, started with the first request
+        # Every sent message carries session + seq + mono_ns (see utils/sequence_tracker.py)
+        self.session = uuid.uuid4().hex[:12]
+        self.sequence = itertools.count()
+        self.send_lock = threading.Lock()  # Keeps seq order identical to send order
+        # Gaps can only be judged by a process that receives everything
+        self.sequence_tracker = SequenceTracker() if self.subscribe_to is None else None
         
     def start(self):
         """Start the subprocess with proper registration flow."""
@@ -33,26 +67,29 @@ class BaseSubProcess:
             # Start message handling thread first
             print(f"{self.process_name}: Starting message handler...")
             self.message_thread = threading.Thread(target=self.message_loop, daemon=True)
+            self.pending_requests.reply_thread = self.message_thread
             self.message_thread.start()
             
-            # Give message handler time to start
-            time.sleep(0.5)
+            # Registration is only sent once the bus is known to carry our messages both ways
+            if not self.wait_for_bus():
+                print(f"{self.process_name}: ⚠️  Bus probe not answered within {BUS_READY_TIMEOUT}s, registering anyway")
             
             # Perform registration (BLOCKING)
             print(f"{self.process_name}: Starting registration process...")
             if not self.register_with_control_panel():
                 print(f"{self.process_name}: Registration failed. Shutting down.")
-                self.shutdown()
+                self.shutdown(exit_code=1)
                 return
             
             print(f"{self.process_name}: Registration successful! Starting main loop...")
+            self.send_message(MSG_READY, {
+                'process_name': self.process_name,
+                'process_id': self.process_id,
+                'startup_seconds': time.monotonic() - self.started_at
+            })
             
-            # Start main process thread
-            self.main_thread = threading.Thread(target=self.main_loop_wrapper, daemon=True)
-            self.main_thread.start()
-            
-            # Monitor health in main thread
-            self.monitor_health()
+            # Main loop on its own thread, health monitor on this one
+            self.run_main_loop()
             
         except Exception as e:
             crash_logger(f"{self.process_name}_startup", e)
@@ -60,16 +97,76 @@ class BaseSubProcess:
     
     def setup_zmq(self):
         """Initialize ZeroMQ connections."""
-        self.publisher = self.context.socket(zmq.PUB)
-        self.publisher.connect(f"tcp://localhost:{ZEROMQ_PORT}")
+        # One publisher per broker shard; each message type always uses the same shard
+        for endpoint in connect_endpoints(FRONTEND):
+            publisher = self.context.socket(zmq.PUB)
+            publisher.connect(endpoint)
+            self.publishers.append(publisher)
+        
+        # Legacy single-frame senders cannot batch
+        if BATCHING_ENABLED and ZEROMQ_WIRE_FORMAT != WIRE_FORMAT_LEGACY:
+            self.batcher = MessageBatcher(self.send_frames, BATCH_MAX_MESSAGES, BATCH_MAX_DELAY_US)
         
         self.subscriber = self.context.socket(zmq.SUB)
-        self.subscriber.connect(f"tcp://localhost:{ZEROMQ_PORT + 1}")
-        self.subscriber.setsockopt(zmq.SUBSCRIBE, b"")
-        self.subscriber.setsockopt(zmq.RCVTIMEO, 100)  # 100ms timeout for non-blocking
+        # Subscribing on every shard delivers all traffic whichever shard carried it
+        for endpoint in connect_endpoints(BACKEND):
+            self.subscriber.connect(endpoint)
+        for prefix in self.get_subscription_prefixes():
+            self.subscriber.setsockopt(zmq.SUBSCRIBE, prefix)
         
-        # Give sockets time to connect
-        time.sleep(0.5)
+        # Wake-up pair so the message loop can block in poll() and still exit promptly on shutdown
+        wake_endpoint = f"inproc://{self.process_name}-wake-{id(self)}"
+        self.wake_receiver = self.context.socket(zmq.PAIR)
+        self.wake_receiver.bind(wake_endpoint)
+        self.wake_sender = self.context.socket(zmq.PAIR)
+        self.wake_sender.connect(wake_endpoint)
+    
+    # A PUB socket silently drops what it sends before its connection (and, in XPUB mode, the
+    # subscriptions) are in place, so instead of sleeping we send a directed BUS_PROBE to
+    # ourselves through every shard until each one comes back on our subscriber.
+    def wait_for_bus(self, timeout=BUS_READY_TIMEOUT):
+        """Block until our publishers and subscriber work through every broker shard; True if they do."""
+        deadline = time.monotonic() + timeout
+        while not self.bus_ready.is_set() and time.monotonic() < deadline:
+            for shard, publisher in enumerate(self.publishers):
+                if shard in self.bus_probe_acks:
+                    continue
+                frames = encode_message({
+                    'timestamp_ns': now_ns(),
+                    'message_type': MSG_BUS_PROBE,
+                    'sender': self.process_name,
+                    'target': self.process_name,
+                    'payload': {'shard': shard}
+                }, ZEROMQ_WIRE_FORMAT, MESSAGE_CODEC)
+                with self.publisher_lock:
+                    publisher.send_multipart(frames)
+            self.bus_ready.wait(BUS_PROBE_INTERVAL_MS / 1000)
+        
+        if self.bus_ready.is_set():
+            print(f"{self.process_name}: ✅ Bus ready in {(time.monotonic() - self.started_at) * 1000:.0f} ms")
+        return self.bus_ready.is_set()
+    
+    def get_subscription_prefixes(self):
+        """Topic prefixes to subscribe to, so libzmq drops unwanted messages before decoding."""
+        if self.subscribe_to is None:
+            return [b""]
+        
+        message_types = sorted(set(self.subscribe_to) | set(SYSTEM_SUBSCRIPTIONS))
+        prefixes = [type_subscription(message_type) for message_type in message_types]
+        prefixes.append(target_subscription(self.process_name))
+        
+        # Old single-frame JSON senders have no topic frame; filtered in accepts_message()
+        prefixes.append(LEGACY_PREFIX)
+        return prefixes
+    
+    def accepts_message(self, message):
+        """Check a decoded message against our subscriptions (needed for legacy frames only)."""
+        if self.subscribe_to is None:
+            return True
+        msg_type = message.get('message_type')
+        return (msg_type in SYSTEM_SUBSCRIPTIONS
+                or msg_type in self.subscribe_to
+                or message.get('target') == self.process_name)
     
     def register_with_control_panel(self):
         """Register with ControlPanel and wait for acknowledgment."""
@@ -81,7 +178,9 @@ class BaseSubProcess:
                 # Send registration message
                 self.send_message(MSG_REGISTER, {
                     'process_name': self.process_name,
-                    'process_id': self.process_id
+                    'process_id': self.process_id,
+                    'parent_process_id': os.getppid(),  # Lets main.py match Comets started through a launcher
+                    'subscriptions': [describe_subscription(prefix) for prefix in self.get_subscription_prefixes()]
                 })
                 
                 print(f"{self.process_name}: Registration attempt {attempt + 1}/{max_attempts}")
@@ -99,19 +198,43 @@ class BaseSubProcess:
         """Handle incoming ZeroMQ messages."""
         print(f"{self.process_name}: Message handler started")
         
+        poller = zmq.Poller()
+        poller.register(self.subscriber, zmq.POLLIN)
+        poller.register(self.wake_receiver, zmq.POLLIN)
+        
         while not self.shutdown_flag.is_set():
             try:
-                raw_message = self.subscriber.recv(zmq.NOBLOCK)
-                message = json.loads(raw_message.decode('utf-8'))
-                self.handle_message(message)
+                # Block until a message arrives or shutdown wakes us (no idle spinning)
+                socks = dict(poller.poll())
+                if self.wake_receiver in socks:
+                    self.wake_receiver.recv()
+                    continue
                 
-            except zmq.Again:
-                # No message available
-                time.sleep(0.01)
+                # Drain everything already queued before polling again
+                while True:
+                    try:
+                        frames = self.subscriber.recv_multipart(zmq.NOBLOCK)
+                    except zmq.Again:
+                        break
+                    messages = decode_frames(frames)
+                    self.record_received(frames, messages)
+                    for message in messages:
+                        if is_legacy(frames) and not self.accepts_message(message):
+                            continue
+                        self.handle_message(message)
+                
+            except zmq.ContextTerminated:
+                break
             except Exception as e:
                 if not self.shutdown_flag.is_set():
                     print(f"{self.process_name}: Message handling error: {e}")
     
+    def record_received(self, frames, messages):
+        """Account for received traffic (raw frames and the messages decoded from them); subclasses extend it."""
+        if self.sequence_tracker:
+            for message in messages:
+                self.sequence_tracker.observe(message)
+    
     def handle_message(self, message):
         """Process incoming messages."""
         try:
@@ -119,8 +242,25 @@ class BaseSubProcess:
             payload = message.get('payload', {})
             sender = message.get('sender')
             
+            # Replies to our own requests complete their futures
+            if message.get('in_reply_to') and self.pending_requests.resolve(message):
+                return
+            
+            # Requests for us with a registered handler are answered directly to the caller
+            if (message.get('correlation_id') and msg_type in self.request_handlers
+                    and message.get('target') in (None, self.process_name)):
+                self.handle_request(message)
+                return
+            
             # Handle system messages
-            if msg_type == MSG_REGISTER_ACK:
+            if msg_type == MSG_BUS_PROBE:
+                # Other processes' probes are only seen by subscribe-all listeners; ignore them
+                if sender == self.process_name and message.get('target') == self.process_name:
+                    self.bus_probe_acks.add(payload.get('shard', 0))
+                    if len(self.bus_probe_acks) >= len(self.publishers):
+                        self.bus_ready.set()
+            
+            elif msg_type == MSG_REGISTER_ACK:
                 # Check if this ACK is for us
                 if payload.get('process_name') == self.process_name:
                     self.registered = True
@@ -135,7 +275,7 @@ class BaseSubProcess:
                         'process_name': self.process_name,
                         'process_id': self.process_id,
                         'timestamp': time.time()
-                    })
+                    }, target=sender)
                     print(f"{self.process_name}: 🏓 PONG sent to {sender}")
             
             elif msg_type == MSG_SHUTDOWN:
@@ -149,7 +289,7 @@ class BaseSubProcess:
                         'process_id': self.process_id,
                         'shutdown_target': target,
                         'timestamp': time.time()
-                    })
+                    }, target=sender)
                     print(f"{self.process_name}: 📤 Sent SHUTDOWN_ACK")
                     
                     # Give time for the ACK to be sent
@@ -170,6 +310,58 @@ class BaseSubProcess:
         """Override this method in subclasses to handle custom messages."""
         pass
     
+    def register_request_handler(self, message_type, handler):
+        """Answer requests of a type with handler(message) on a worker thread; its return value is the reply payload."""
+        self.request_handlers[message_type] = handler
+    
+    def handle_request(self, message):
+        """Hand a request to a worker thread, so slow handlers and nested requests never stall the message loop."""
+        if self.request_executor is None:
+            self.request_executor = ThreadPoolExecutor(max_workers=REQUEST_HANDLER_THREADS,
+                                                       thread_name_prefix=f"{self.process_name}-request")
+        self.request_executor.submit(self.run_request_handler, message)
+    
+    def run_request_handler(self, message):
+        """Run the handler for a request and send its reply (or the error) back to the caller."""
+        handler = self.request_handlers[message.get('message_type')]
+        try:
+            self.reply(message, handler(message))
+        except Exception as e:
+            print(f"{self.process_name}: Request handler for {message.get('message_type')} failed: {e}")
+            self.reply(message, {}, error=str(e) or type(e).__name__)
+    
+    def request(self, target, message_type, payload, timeout=5):
+        """Send a request to one process and return a Future for its reply (TimeoutError after timeout seconds)."""
+        correlation_id, future = self.pending_requests.create(timeout)
+        if not self.send_message(message_type, payload, target=target, headers={
+            'correlation_id': correlation_id,
+            'reply_to': self.process_name
+        }):
+            self.pending_requests.discard(correlation_id)
+            future.set_exception(ConnectionError(f"{self.process_name}: failed to send {message_type} to {target}"))
+        return future
+    
+    def reply(self, request_message, payload, error=None):
+        """Send the reply to a request message, addressed only to the process that asked."""
+        headers = {'in_reply_to': request_message.get('correlation_id')}
+        if error:
+            headers['error'] = error
+        return self.send_message(response_type(request_message.get('message_type')), payload,
+                                 target=request_message.get('reply_to') or request_message.get('sender'),
+                                 headers=headers)
+    
+    def run_main_loop(self):
+        """Run main_loop on its own thread and monitor health until shutdown; exits non-zero after a failure."""
+        self.main_thread = threading.Thread(target=self.main_loop_wrapper, daemon=True)
+        self.main_thread.start()
+        
+        # Monitor health in main thread
+        self.monitor_health()
+        
+        # shutdown() usually runs on another thread, where sys.exit() only ends that thread
+        if self.exit_code:
+            sys.exit(self.exit_code)
+    
     def main_loop_wrapper(self):
         """Wrapper for main loop with crash protection."""
         try:
@@ -177,14 +369,14 @@ class BaseSubProcess:
         except Exception as e:
             crash_logger(f"{self.process_name}_main_loop", e)
             print(f"{self.process_name}: Main loop crashed: {e}")
-            self.shutdown()
+            self.shutdown(exit_code=1)
     
     def main_loop(self):
         """Override this method in subclasses for custom main loop logic."""
         while not self.shutdown_flag.is_set():
             # Default behavior: log heartbeat every 10 seconds
             self.log_info(f"{self.process_name} heartbeat - running main loop")
-            time.sleep(10)
+            self.shutdown_flag.wait(10)
     
     def monitor_health(self):
         """Monitor ping/pong health and shutdown if unhealthy."""
@@ -195,23 +387,34 @@ class BaseSubProcess:
                 time_since_ping = time.time() - self.last_ping_time
                 if time_since_ping > 15:  # 15 seconds without ping
                     print(f"{self.process_name}: ⚠️  No ping received for {int(time_since_ping)} seconds. Shutting down.")
-                    self.shutdown()
+                    self.shutdown(exit_code=1)
                     break
             
-            time.sleep(1)
+            self.shutdown_flag.wait(1)
     
-    def send_message(self, message_type, payload):
-        """Send a message via ZeroMQ."""
+    def send_message(self, message_type, payload, target=None, headers=None):
+        """Send a message via ZeroMQ, optionally addressed to a single process. Returns True if sent."""
         message = {
-            'datetime': datetime.now().isoformat(),
+            'timestamp_ns': now_ns(),
             'message_type': message_type,
             'sender': self.process_name,
             'payload': payload
         }
+        if target:
+            message['target'] = target
+        if headers:
+            message.update(headers)
         
         try:
-            msg_json = json.dumps(message)
-            self.publisher.send_string(msg_json)
+            with self.send_lock:
+                message['session'] = self.session
+                message['seq'] = next(self.sequence)
+                message['mono_ns'] = time.monotonic_ns()
+                frames = encode_message(message, ZEROMQ_WIRE_FORMAT, MESSAGE_CODEC)
+                if self.batcher:
+                    self.batcher.add(frames, immediate=message_type in IMMEDIATE_TYPES)
+                else:
+                    self.send_frames(frames)
             
             # Log outgoing messages (except routine ping/pong)
             if message_type not in [MSG_PING, MSG_PONG]:
@@ -220,9 +423,19 @@ class BaseSubProcess:
             # Notify callback if set (for ControlPanel to capture its own messages)
             if self.on_message_sent:
                 self.on_message_sent(message)
+            return True
             
         except Exception as e:
             print(f"{self.process_name}: Failed to send message: {e}")
+            return False
+    
+    def send_frames(self, frames):
+        """Send encoded frames on the publisher of the shard that carries their message type."""
+        publisher = self.publishers[0]
+        if len(self.publishers) > 1 and not is_legacy(frames):
+            publisher = self.publishers[shard_for_type(parse_topic(frames[0])[0], len(self.publishers))]
+        with self.publisher_lock:
+            publisher.send_multipart(frames)
     
     # Convenience logging methods
     def log_info(self, message):
@@ -253,24 +466,48 @@ class BaseSubProcess:
             'message': message
         })
     
-    def shutdown(self):
-        """Gracefully shutdown the subprocess."""
+    def wake_message_loop(self):
+        """Interrupt the message loop's blocking poll."""
+        try:
+            if self.wake_sender:
+                self.wake_sender.send(b"", zmq.NOBLOCK)
+        except zmq.ZMQError:
+            pass
+    
+    def shutdown(self, exit_code=0):
+        """Gracefully shutdown the subprocess; a non-zero exit_code tells main.py's supervisor it failed."""
         print(f"{self.process_name}: 🛑 Initiating shutdown...")
+        self.exit_code = max(self.exit_code, exit_code)
         self.shutdown_flag.set()
+        self.wake_message_loop()
+        self.pending_requests.cancel_all()
+        if self.request_executor:
+            self.request_executor.shutdown(wait=False, cancel_futures=True)
+        
+        # Send anything still waiting in a batch
+        if self.batcher:
+            try:
+                self.batcher.close()
+            except Exception as e:
+                print(f"{self.process_name}: Failed to flush pending messages: {e}")
         
         # Give threads time to finish
         time.sleep(0.5)
         
         # Close ZeroMQ connections
-        if self.publisher:
-            self.publisher.close()
+        for publisher in self.publishers:
+            publisher.close()
         if self.subscriber:
             self.subscriber.close()
-        if self.context:
+        if self.wake_sender:
+            self.wake_sender.close()
+        if self.wake_receiver:
+            self.wake_receiver.close()
+        if self.context and owns_context():
             self.context.term()
         
         print(f"{self.process_name}: 🛑 Shutdown complete")
-        sys.exit(0)
+        sys.exit(self.exit_code)
 
 def main():
     """Entry point for subprocess execution."""
@@ -0,0 +1,172 @@
+import time
+from utils.codec import now_ns
+from utils.metrics import MetricsRegistry, LATENCY_BUCKETS, DEPTH_BUCKETS, quantile
+from utils.broker_control import get_broker_metrics, STATISTICS_FIELDS
+from utils.endpoints import shard_count
+
+def message_sizes(frames, messages):
+    """Bytes on the wire attributed to each message of a received multipart message."""
+    if not messages:
+        return []
+    if len(frames) == len(messages) + 1:
+        # [topic, body1, body2, ...]: each message gets its body plus a share of the topic
+        topic_share = len(frames[0]) // len(messages)
+        return [len(body) + topic_share for body in frames[1:]]
+    total = sum(len(frame) for frame in frames)
+    return [total // len(messages)] * len(messages)
+
+# The message loop records every received message (counters per sender and type, latency
+# from the sender's timestamp_ns to arrival); a background thread polls the broker shards
+# and turns the deltas since its last poll into the rates shown in the UI.
+class BusMetrics:
+    """Traffic metrics of the bus as seen by the ControlPanel, plus the broker's own counters."""
+    
+    def __init__(self):
+        self.registry = MetricsRegistry()
+        self.messages = self.registry.counter('sunshine_bus_messages_total', 'Messages received from the bus',
+                                              ('sender', 'type'))
+        self.bytes = self.registry.counter('sunshine_bus_bytes_total', 'Bytes received from the bus',
+                                           ('sender', 'type'))
+        self.sender_latency = self.registry.histogram('sunshine_bus_sender_latency_seconds',
+                                                      'Send to receive latency by sender', LATENCY_BUCKETS,
+                                                      ('sender',))
+        self.type_latency = self.registry.histogram('sunshine_bus_type_latency_seconds',
+                                                    'Send to receive latency by message type', LATENCY_BUCKETS,
+                                                    ('type',))
+        self.broker_up = self.registry.gauge('sunshine_broker_up', 'Broker shard answered the last poll', ('shard',))
+        self.broker_counters = {
+            field: self.registry.counter(f'sunshine_broker_{field}_total', f'Broker {field.replace("_", " ")}',
+                                         ('shard',))
+            for field in STATISTICS_FIELDS
+        }
+        self.relay_depth = self.registry.histogram('sunshine_broker_relay_depth',
+                                                   'Messages waiting per relay wake-up (relay mode)', DEPTH_BUCKETS,
+                                                   ('shard',))
+        # Counters only grow; lost shrinks when a late message turns up, so it is a gauge
+        self.sequence_lost = self.registry.gauge('sunshine_bus_lost',
+                                                 'Messages currently missing from a sender\'s sequence', ('sender',))
+        self.sequence_counters = {
+            field: self.registry.counter(f'sunshine_bus_{name}_total', help_text, ('sender',))
+            for field, name, help_text in (
+                ('gaps', 'gaps', 'Messages skipped in a sender\'s sequence, including those that arrived late'),
+                ('reordered', 'reordered', 'Messages that arrived after a later seq from the same sender'),
+                ('duplicates', 'duplicate', 'Messages received twice'),
+                ('restarts', 'sender_restarts', 'New sender sessions after the first')
+            )
+        }
+        self.previous = None  # Snapshot at the last summary
+    
+    def record(self, message, size):
+        """Account for one received message (message loop thread only)."""
+        sender = message.get('sender') or 'unknown'
+        message_type = message.get('message_type') or 'unknown'
+        self.messages.labels(sender, message_type).inc()
+        self.bytes.labels(sender, message_type).inc(size)
+        
+        # The monotonic send time is immune to wall-clock steps; older senders only have timestamp_ns
+        if message.get('mono_ns'):
+            latency = max(time.monotonic_ns() - message['mono_ns'], 0) / 1e9
+        elif message.get('timestamp_ns'):
+            latency = max(now_ns() - message['timestamp_ns'], 0) / 1e9
+        else:
+            latency = None
+        if latency is not None:
+            self.sender_latency.labels(sender).observe(latency)
+            self.type_latency.labels(message_type).observe(latency)
+    
+    def poll_broker(self):
+        """Mirror every broker shard's METRICS into the registry."""
+        for shard in range(shard_count()):
+            try:
+                metrics = get_broker_metrics(timeout=500, shard=shard)
+            except Exception:
+                metrics = None
+            self.broker_up.labels(shard).set(1 if metrics else 0)
+            if not metrics:
+                continue
+            for field, counter in self.broker_counters.items():
+                counter.labels(shard).set_total(metrics['stats'].get(field, 0))
+            if 'relay_depth' in metrics:
+                depth = metrics['relay_depth']
+                self.relay_depth.labels(shard).set_counts(depth['counts'], depth['sum'])
+    
+    def update_sequences(self, sequences):
+        """Mirror SequenceTracker.stats() into the registry."""
+        for sender, stats in sequences.items():
+            self.sequence_lost.labels(sender).set(stats['lost'])
+            for field, counter in self.sequence_counters.items():
+                counter.labels(sender).set_total(stats[field])
+    
+    def snapshot(self):
+        """Current counter values and latency buckets, for computing deltas."""
+        return {
+            'time': time.monotonic(),
+            'traffic': {labels: (self.messages.labels(*labels).value, self.bytes.labels(*labels).value)
+                        for labels, _ in self.messages.items()},
+            'sender_latency': {labels[0]: child.snapshot() for labels, child in self.sender_latency.items()},
+            'type_latency': {labels[0]: child.snapshot() for labels, child in self.type_latency.items()},
+            'broker_frames': sum(child.value for _, child in self.broker_counters['frontend_messages_in'].items()),
+            'broker_bytes': sum(child.value for _, child in self.broker_counters['frontend_bytes_in'].items()),
+            'relay_depth': [child.snapshot() for _, child in self.relay_depth.items()]
+        }
+    
+    def summary(self, sequences=None):
+        """Rates and latency percentiles since the previous call, for the UI panel."""
+        current = self.snapshot()
+        previous = self.previous or current
+        self.previous = current
+        elapsed = max(current['time'] - previous['time'], 1e-9)
+        
+        def rates(key_index):
+            totals = {}
+            for labels, (messages, size) in current['traffic'].items():
+                old_messages, old_size = previous['traffic'].get(labels, (0, 0))
+                entry = totals.setdefault(labels[key_index], [0, 0])
+                entry[0] += messages - old_messages
+                entry[1] += size - old_size
+            return totals
+        
+        def latency(key, name):
+            old = previous[key].get(name)
+            counts = current[key].get(name, [])
+            delta = [count - (old[position] if old else 0) for position, count in enumerate(counts)]
+            p50 = quantile(LATENCY_BUCKETS, delta, 0.5)
+            p99 = quantile(LATENCY_BUCKETS, delta, 0.99)
+            return (p50 * 1000 if p50 is not None else None), (p99 * 1000 if p99 is not None else None)
+        
+        def rows(key_index, latency_key, label):
+            result = []
+            for name, (messages, size) in rates(key_index).items():
+                p50_ms, p99_ms = latency(latency_key, name)
+                result.append({
+                    label: name,
+                    'messages_per_sec': messages / elapsed,
+                    'bytes_per_sec': size / elapsed,
+                    'latency_p50_ms': p50_ms,
+                    'latency_p99_ms': p99_ms
+                })
+            return sorted(result, key=lambda row: row['messages_per_sec'], reverse=True)
+        
+        senders = rows(0, 'sender_latency', 'sender')
+        sequences = sequences or {}
+        for row in senders:
+            stats = sequences.get(row['sender'], {})
+            row['lost'] = stats.get('lost', 0)
+            row['reordered'] = stats.get('reordered', 0)
+            row['duplicates'] = stats.get('duplicates', 0)
+        depth = [0] * (len(DEPTH_BUCKETS) + 1)
+        for shard_counts in current['relay_depth']:
+            depth = [total + count for total, count in zip(depth, shard_counts)]
+        # Relay depth is over the broker's lifetime, not just the last interval
+        return {
+            'messages_per_sec': sum(row['messages_per_sec'] for row in senders),
+            'bytes_per_sec': sum(row['bytes_per_sec'] for row in senders),
+            # The broker counts frames (a message is a topic and a body frame)
+            'broker_frames_per_sec': (current['broker_frames'] - previous['broker_frames']) / elapsed,
+            'broker_bytes_per_sec': (current['broker_bytes'] - previous['broker_bytes']) / elapsed,
+            'relay_depth_p99': quantile(DEPTH_BUCKETS, depth, 0.99),
+            'lost': sum(stats['lost'] for stats in sequences.values()),
+            'reordered': sum(stats['reordered'] for stats in sequences.values()),
+            'senders': senders,
+            'types': rows(1, 'type_latency', 'type')
+        }
@@ -0,0 +1,94 @@
+import json
+
+# A filter spec as sent by a browser's 'subscribe' event; every part is optional:
+#   types          - only these message types
+#   exclude_types  - never these message types
+#   senders        - only messages from these processes
+#   fields         - payload predicates, {"path.in.payload": value or [allowed values]}
+# An empty spec matches everything.
+FILTER_KEYS = ('types', 'exclude_types', 'senders', 'fields')
+
+def string_list(spec, key):
+    """A list-of-strings part of a spec (empty if absent); a bare string is rejected, not split into letters."""
+    values = spec.get(key) or []
+    if not isinstance(values, list) or not all(isinstance(value, str) for value in values):
+        raise ValueError(f"Filter '{key}' must be a list of strings")
+    return values
+
+class MessageFilter:
+    """Compiled subscription filter of one or more Control Panel clients."""
+    
+    def __init__(self, spec=None):
+        spec = spec or {}
+        if not isinstance(spec, dict):
+            raise ValueError("A filter must be an object")
+        unknown = set(spec) - set(FILTER_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown filter keys: {', '.join(sorted(unknown))}")
+        fields = spec.get('fields') or {}
+        if not isinstance(fields, dict):
+            raise ValueError("Filter 'fields' must be an object")
+        
+        self.types = set(string_list(spec, 'types')) if spec.get('types') else None
+        self.exclude_types = set(string_list(spec, 'exclude_types'))
+        self.senders = set(string_list(spec, 'senders')) if spec.get('senders') else None
+        self.fields = []  # (path parts, allowed values)
+        for path, allowed in fields.items():
+            values = allowed if isinstance(allowed, list) else [allowed]
+            self.fields.append((path.split('.'), values))
+        
+        # Canonical form, so clients asking for the same thing share one filter
+        self.key = json.dumps(self.spec(), sort_keys=True)
+    
+    def spec(self):
+        """Normalized spec (sorted lists, no empty parts)."""
+        spec = {}
+        if self.types is not None:
+            spec['types'] = sorted(self.types)
+        if self.exclude_types:
+            spec['exclude_types'] = sorted(self.exclude_types)
+        if self.senders is not None:
+            spec['senders'] = sorted(self.senders)
+        if self.fields:
+            spec['fields'] = {'.'.join(parts): values for parts, values in self.fields}
+        return spec
+    
+    def matches(self, message):
+        """True if a message passes the filter."""
+        message_type = message.get('message_type')
+        if self.types is not None and message_type not in self.types:
+            return False
+        if message_type in self.exclude_types:
+            return False
+        if self.senders is not None and message.get('sender') not in self.senders:
+            return False
+        for parts, values in self.fields:
+            if self.payload_value(message, parts) not in values:
+                return False
+        return True
+    
+    def payload_value(self, message, parts):
+        """Value at a dotted path in the payload, or None."""
+        value = message.get('payload')
+        for part in parts:
+            if not isinstance(value, dict):
+                return None
+            value = value.get(part)
+        return value
+    
+    def history(self, message_history, limit=200):
+        """Latest matching messages from a MessageHistory (oldest first), using its type and sender indexes."""
+        if self.types is None and self.senders is None:
+            # No index applies; scan a wider window so exclusions still leave about limit messages
+            candidates = message_history.latest(limit * 10 if self.exclude_types or self.fields else limit)
+        else:
+            candidates = []
+            if self.types is not None:
+                for message_type in self.types:
+                    candidates.extend(message_history.latest(limit, message_type=message_type))
+            else:
+                for sender in self.senders:
+                    candidates.extend(message_history.latest(limit, sender=sender))
+            candidates.sort(key=lambda message: message['history_seq'])
+        
+        return [message for message in candidates if self.matches(message)][-limit:]
@@ -0,0 +1,77 @@
+import math
+from datetime import datetime
+from config.settings import HISTORY_QUERY_DEFAULT_LIMIT, HISTORY_QUERY_MAX_LIMIT, HISTORY_QUERY_MAX_SCAN
+
+SOURCE_MEMORY = "memory"  # MessageHistory ring buffer, newest first, cursor = history_seq
+SOURCE_JOURNAL = "journal"  # On-disk journal, oldest first, cursor = journal_seq
+
+# Query parameters, shared by GET /api/history and the 'history_query' Socket.IO event:
+#   type, sender  - exact match
+#   since, until  - epoch seconds or ISO-8601
+#   q             - case-insensitive text search in the payload values
+#   cursor        - next_cursor of the previous page
+#   limit         - page size, capped at HISTORY_QUERY_MAX_LIMIT
+#   source        - 'memory' (default) or 'journal'
+class HistoryQueryError(ValueError):
+    """Invalid history query parameters."""
+    pass
+
+# Times outside what datetime can represent (years 1 to 9999) are rejected, not overflowed
+MIN_TIME_SECONDS = -62135596800
+MAX_TIME_SECONDS = 253402300799
+
+def parse_time_ns(value):
+    """Epoch seconds or an ISO-8601 string as epoch nanoseconds."""
+    if value in (None, ''):
+        return None
+    try:
+        seconds = float(value)
+    except (TypeError, ValueError):
+        try:
+            seconds = datetime.fromisoformat(str(value)).timestamp()
+        except (ValueError, OverflowError, OSError):
+            raise HistoryQueryError(f"Invalid time: {value}")
+    if not math.isfinite(seconds) or not MIN_TIME_SECONDS <= seconds <= MAX_TIME_SECONDS:
+        raise HistoryQueryError(f"Invalid time: {value}")
+    return int(seconds * 1e9)
+
+def parse_int(value, name):
+    """Optional integer parameter."""
+    if value in (None, ''):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise HistoryQueryError(f"Invalid {name}: {value}")
+
+def run_history_query(params, message_history, journal_reader=None):
+    """Run a history query and return the JSON-ready page."""
+    source = params.get('source') or SOURCE_MEMORY
+    limit = parse_int(params.get('limit'), 'limit') or HISTORY_QUERY_DEFAULT_LIMIT
+    limit = max(1, min(limit, HISTORY_QUERY_MAX_LIMIT))
+    options = {
+        'limit': limit,
+        'message_type': params.get('type') or None,
+        'sender': params.get('sender') or None,
+        'start_ns': parse_time_ns(params.get('since')),
+        'end_ns': parse_time_ns(params.get('until')),
+        'text': params.get('q') or None,
+        'max_scan': HISTORY_QUERY_MAX_SCAN
+    }
+    cursor = parse_int(params.get('cursor'), 'cursor')
+    
+    if source == SOURCE_MEMORY:
+        messages, next_cursor = message_history.query(before=cursor, **options)
+    elif source == SOURCE_JOURNAL:
+        if journal_reader is None:
+            raise HistoryQueryError("The message journal is disabled")
+        messages, next_cursor = journal_reader.query(start_seq=cursor, **options)
+    else:
+        raise HistoryQueryError(f"Unknown source: {source}")
+    
+    return {
+        'source': source,
+        'messages': messages,
+        'next_cursor': next_cursor,
+        'limit': limit
+    }
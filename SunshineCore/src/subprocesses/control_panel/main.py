@@ -8,8 +8,9 @@ parent_dir = os.path.abspath(parent_dir)
 if parent_dir not in sys.path:
     sys.path.insert(0, parent_dir)
 
-from flask import Flask, render_template
+from flask import Flask, render_template, request, jsonify, Response
 from flask_socketio import SocketIO, emit
+from werkzeug.serving import make_server
 import threading
 import json
 import time
@@ -17,15 +18,33 @@ from datetime import datetime
 from subprocesses.base_subprocess import BaseSubProcess
 from utils.message_types import *
 from utils.logger import crash_logger
-from config.settings import CONTROL_PANEL_PORT
+from utils.launcher import pause_before_closing
+from utils.codec import ensure_datetime
+from utils.message_history import MessageHistory
+from utils.journal import JournalWriter, JournalReader, default_journal_directory
+from utils.supervisor import LIFECYCLE_EXITED
+from subprocesses.control_panel.history_query import run_history_query, HistoryQueryError
+from subprocesses.control_panel.bus_metrics import BusMetrics, message_sizes
+from subprocesses.control_panel.stream import MessageStream
+from config.settings import (CONTROL_PANEL_PORT, MAX_MESSAGE_HISTORY, UI_PUSH_INTERVAL_MS, UI_PUSH_MAX_BUFFER,
+                             UI_PUSH_ACK_TIMEOUT, JOURNAL_ENABLED, JOURNAL_DIR, JOURNAL_SEGMENT_MAX_BYTES,
+                             JOURNAL_SEGMENT_MAX_SECONDS, JOURNAL_INDEX_INTERVAL, JOURNAL_RETENTION_BYTES,
+                             JOURNAL_RETENTION_HOURS, JOURNAL_QUEUE_MAX, METRICS_INTERVAL)
 
 class ControlPanel(BaseSubProcess):
     def __init__(self):
         super().__init__("ControlPanel")
         self.registered_processes = {}
-        self.message_history = []
+        self.broker_subscriptions = {}
+        self.launch_report = None  # Latest PLUGIN_LAUNCH_REPORT from main.py
+        self.message_history = MessageHistory(MAX_MESSAGE_HISTORY)
+        self.journal = self.open_journal() if JOURNAL_ENABLED else None
+        self.journal_reader = JournalReader(self.journal.directory) if self.journal else None
+        self.metrics = BusMetrics()
         self.flask_app = None
+        self.flask_server = None
         self.socketio = None
+        self.message_stream = None
         self.flask_thread = None
         
         # Set callback to capture our own sent messages
@@ -33,11 +52,25 @@ class ControlPanel(BaseSubProcess):
         
         print(f"ControlPanel: Initialized with PID {os.getpid()}")
         
+    def open_journal(self):
+        """Start the on-disk message journal; the panel keeps running without one."""
+        directory = JOURNAL_DIR or default_journal_directory()
+        try:
+            journal = JournalWriter(directory, JOURNAL_SEGMENT_MAX_BYTES, JOURNAL_SEGMENT_MAX_SECONDS,
+                                    JOURNAL_INDEX_INTERVAL, JOURNAL_RETENTION_BYTES, JOURNAL_RETENTION_HOURS * 3600,
+                                    JOURNAL_QUEUE_MAX)
+            print(f"ControlPanel: 📼 Journaling messages to {directory}")
+            return journal
+        except Exception as e:
+            print(f"ControlPanel: ⚠️  Message journal disabled: {e}")
+            return None
+    
     def start(self):
         """Override start to include Flask server."""
         try:
             # Start Flask server WITHOUT killing port (auth server already shut down)
             self.start_flask_server()
+            threading.Thread(target=self.metrics_loop, daemon=True).start()
             
             # Start base subprocess functionality
             super().start()
@@ -56,44 +89,93 @@ class ControlPanel(BaseSubProcess):
         
         self.flask_app = Flask(__name__, template_folder=templates_path)
         self.flask_app.config['SECRET_KEY'] = 'control_panel_secret'
-        self.socketio = SocketIO(self.flask_app, cors_allowed_origins="*", logger=False, engineio_logger=False)
+        # Threading mode runs on a plain werkzeug server, which we create ourselves to know when it listens
+        self.socketio = SocketIO(self.flask_app, async_mode='threading', cors_allowed_origins="*", logger=False,
+                                 engineio_logger=False)
+        self.message_stream = MessageStream(self.socketio, UI_PUSH_INTERVAL_MS, UI_PUSH_MAX_BUFFER, UI_PUSH_ACK_TIMEOUT)
+        self.message_stream.start()
         
         @self.flask_app.route('/')
         def index():
             return render_template('control_panel/index.html')
         
+        @self.flask_app.route('/metrics')
+        def metrics():
+            return Response(self.metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+        
+        @self.flask_app.route('/api/launch-report')
+        def launch_report():
+            return jsonify(self.launch_report or {})
+        
+        @self.flask_app.route('/api/history')
+        def history():
+            try:
+                return jsonify(self.query_history(request.args))
+            except HistoryQueryError as e:
+                return jsonify({'error': str(e)}), 400
+        
         @self.socketio.on('connect')
         def handle_connect():
             print("ControlPanel: Client connected to SocketIO")
             emit('processes_update', list(self.registered_processes.values()))
-            emit('messages_update', self.message_history[-200:])  # Send last 200 messages
+            emit('subscriptions_update', self.broker_subscriptions)
+            if self.launch_report:
+                emit('launch_report', self.launch_report)
+            emit('messages_update', self.message_history.latest(200))  # Send last 200 messages
+            # New messages follow as coalesced 'messages_batch' frames
+            self.message_stream.add_client(request.sid)
         
         @self.socketio.on('disconnect')
         def handle_disconnect():
             print("ControlPanel: Client disconnected from SocketIO")
+            self.message_stream.remove_client(request.sid)
+        
+        @self.socketio.on('subscribe')
+        def handle_subscribe(spec):
+            # Server-side filter for this client's stream; answered with the matching history
+            try:
+                message_filter = self.message_stream.subscribe(request.sid, spec)
+            except (ValueError, TypeError, AttributeError) as e:
+                return {'status': 'error', 'error': str(e)}
+            emit('messages_update', message_filter.history(self.message_history, 200))
+            return {'status': 'subscribed', 'filter': message_filter.spec()}
+        
+        @self.socketio.on('history_query')
+        def handle_history_query(params):
+            # Answered through the Socket.IO ack, so each page goes only to the client that asked
+            try:
+                return self.query_history(params or {})
+            except HistoryQueryError as e:
+                return {'error': str(e)}
         
         @self.socketio.on('send_shutdown')
         def handle_shutdown_request(data):
             target = data.get('target', '*')
             print(f"ControlPanel: Shutdown request received for: {target}")
-            self.send_message(MSG_SHUTDOWN, {'target': target})
+            # A single process gets a directed message; '*' stays a broadcast (the broker listens for it)
+            self.send_message(MSG_SHUTDOWN, {'target': target}, target=None if target == '*' else target)
             return {'status': 'sent'}
         
-        # Start Flask server in separate thread
-        self.flask_thread = threading.Thread(
-            target=lambda: self.socketio.run(
-                self.flask_app, 
-                host='127.0.0.1', 
-                port=CONTROL_PANEL_PORT, 
-                debug=False,
-                allow_unsafe_werkzeug=True
-            ),
-            daemon=True
-        )
+        # make_server() binds before returning, so the server accepts connections from here on
+        self.flask_server = make_server('127.0.0.1', CONTROL_PANEL_PORT, self.flask_app, threaded=True)
+        self.flask_thread = threading.Thread(target=self.serve_web, daemon=True)
         self.flask_thread.start()
-        time.sleep(2)
         print(f"ControlPanel: Flask server started on port {CONTROL_PANEL_PORT}")
     
+    def serve_web(self):
+        """Run the web server; the panel is no use without it, so if it stops the process fails."""
+        try:
+            self.flask_server.serve_forever()
+        except Exception as e:
+            crash_logger("control_panel_web_server", e)
+            print(f"ControlPanel: Web server crashed: {e}")
+        if not self.shutdown_flag.is_set():
+            self.shutdown(exit_code=1)
+    
+    def query_history(self, params):
+        """One page of a history query (runs on the request thread, never on the message loop)."""
+        return run_history_query(params, self.message_history, self.journal_reader)
+    
     def emit_to_clients(self, event, data):
         """Safely emit to all connected clients."""
         try:
@@ -102,14 +184,34 @@ class ControlPanel(BaseSubProcess):
         except Exception as e:
             print(f"ControlPanel: Error emitting {event}: {e}")
     
+    def record_received(self, frames, messages):
+        """Count every received message in the bus metrics."""
+        super().record_received(frames, messages)
+        for message, size in zip(messages, message_sizes(frames, messages)):
+            self.metrics.record(message, size)
+    
+    def metrics_loop(self):
+        """Poll the broker and push a metrics summary to the UI every METRICS_INTERVAL."""
+        while not self.shutdown_flag.wait(METRICS_INTERVAL):
+            try:
+                self.metrics.poll_broker()
+                sequences = self.sequence_tracker.stats()
+                self.metrics.update_sequences(sequences)
+                self.emit_to_clients('metrics_update', self.metrics.summary(sequences))
+            except Exception as e:
+                print(f"ControlPanel: Metrics update failed: {e}")
+    
     def add_message_to_history(self, message):
-        """Add a message to history and emit to UI."""
-        self.message_history.append(message)
-        if len(self.message_history) > 1000:
-            self.message_history = self.message_history[-1000:]
+        """Add a message to history and queue it for the UI."""
+        # Binary-encoded messages only carry timestamp_ns; the UI expects an ISO datetime
+        ensure_datetime(message)
+        message['history_seq'] = self.message_history.append(message)
+        if self.journal:
+            self.journal.append(message)
         
-        # Emit to UI
-        self.emit_to_clients('message_received', message)
+        # Queue for the UI; the stream sends it with the next frame
+        if self.message_stream:
+            self.message_stream.push(message)
     
     def handle_custom_message(self, message):
         """Handle ControlPanel-specific messages."""
@@ -129,14 +231,16 @@ class ControlPanel(BaseSubProcess):
                         'pid': process_id,
                         'status': 'active',
                         'last_seen': time.time(),
-                        'registered_at': message.get('datetime')
+                        'registered_at': ensure_datetime(message).get('datetime'),
+                        'subscriptions': payload.get('subscriptions', ['*']),
+                        'parent_pid': payload.get('parent_process_id')
                     }
                     
-                    # Send acknowledgment specifically to this process
+                    # Send acknowledgment only to this process (delivered on its @name topic)
                     self.send_message(MSG_REGISTER_ACK, {
                         'process_name': process_name,
                         'status': 'registered'
-                    })
+                    }, target=process_name)
                     
                     print(f"ControlPanel: ✅ Registered process {process_name} (PID: {process_id})")
                     
@@ -151,6 +255,34 @@ class ControlPanel(BaseSubProcess):
                     self.registered_processes[process_name]['status'] = 'active'
                     print(f"ControlPanel: 🏓 PONG received from {process_name}")
             
+            elif msg_type == MSG_BROKER_SUBSCRIPTIONS:
+                # Broker subscription table (XPUB mode): prefix -> subscriber count
+                self.broker_subscriptions = payload.get('subscriptions', {})
+                self.emit_to_clients('subscriptions_update', self.broker_subscriptions)
+            
+            elif msg_type == MSG_PLUGIN_LAUNCH_REPORT:
+                # main.py may resend the report until it sees it on the bus; the launch_id dedupes it
+                if (self.launch_report or {}).get('launch_id') != payload.get('launch_id'):
+                    self.launch_report = payload
+                    launched = sum(1 for row in payload.get('plugins', []) if row.get('status') == 'registered')
+                    print(f"ControlPanel: 🚀 Plugin launch report: {launched}/{len(payload.get('plugins', []))} registered")
+                    self.emit_to_clients('launch_report', payload)
+                else:
+                    return
+            
+            elif msg_type == MSG_PROCESS_LIFECYCLE:
+                # main.py's supervisor sees an exit the moment it happens, so the process is dropped
+                # now instead of after 15 s without a PONG (its restart registers again)
+                if payload.get('event') == LIFECYCLE_EXITED:
+                    pid = payload.get('pid')
+                    exited = [name for name, info in self.registered_processes.items()
+                              if name != "ControlPanel" and pid in (info['pid'], info.get('parent_pid'))]
+                    for process_name in exited:
+                        del self.registered_processes[process_name]
+                        print(f"ControlPanel: 💀 {process_name} exited (code {payload.get('returncode')}), removed")
+                    if exited:
+                        self.emit_to_clients('processes_update', list(self.registered_processes.values()))
+            
             elif msg_type == MSG_SHUTDOWN_ACK:
                 # Handle shutdown acknowledgment
                 process_name = payload.get('process_name')
@@ -179,6 +311,12 @@ class ControlPanel(BaseSubProcess):
             crash_logger("control_panel_message_handling", e)
             print(f"ControlPanel: Error in handle_custom_message: {e}")
     
+    def shutdown(self, exit_code=0):
+        """Close the journal (writing what is still queued), then shut down."""
+        if self.journal:
+            self.journal.close()
+        super().shutdown(exit_code)
+    
     def main_loop(self):
         """ControlPanel main loop with ping/pong monitoring."""
         try:
@@ -191,7 +329,8 @@ class ControlPanel(BaseSubProcess):
                 'pid': self.process_id,
                 'status': 'active',
                 'last_seen': time.time(),
-                'registered_at': datetime.now().isoformat()
+                'registered_at': datetime.now().isoformat(),
+                'subscriptions': ['*']
             }
             
             ping_count = 0
@@ -230,13 +369,13 @@ class ControlPanel(BaseSubProcess):
                 active_count = len([p for p in self.registered_processes.values() if p['status'] == 'active'])
                 print(f"ControlPanel: 📊 Active processes: {active_count}")
                 
-                # Sleep for 5 seconds before next ping
-                time.sleep(5)
+                # Wait 5 seconds before next ping (returns early on shutdown)
+                self.shutdown_flag.wait(5)
                 
         except Exception as e:
             crash_logger("control_panel_main_loop", e)
             print(f"ControlPanel: Error in main_loop: {e}")
-            self.shutdown()
+            self.shutdown(exit_code=1)
 
 def main():
     try:
@@ -253,11 +392,7 @@ def main():
         print(f"ControlPanel: Fatal error: {e}")
         import traceback
         traceback.print_exc()
-        print("Press Enter to close this window...")
-        try:
-            input()
-        except:
-            time.sleep(30)
+        pause_before_closing()
         sys.exit(1)
 
 if __name__ == "__main__":
@@ -0,0 +1,153 @@
+import threading
+import time
+from collections import deque
+from subprocesses.control_panel.filters import MessageFilter
+
+# Messages are not emitted one by one: each browser has its own bounded buffer that a
+# flush thread drains every interval_ms into one 'messages_batch' frame holding only the
+# messages new since its last frame. A client gets its next frame only after acking the
+# previous one (or after ack_timeout), so a slow browser just accumulates; once its buffer
+# is full the oldest messages are dropped and the next frame reports how many were skipped.
+# Each client also has a subscription filter; clients with the same filter share it, so a
+# message is matched once per distinct filter and only copied into the matching buffers.
+class ClientStream:
+    """Send buffer and flow-control state of one connected browser."""
+    
+    def __init__(self, sid, max_buffer, message_filter):
+        self.sid = sid
+        self.filter = message_filter
+        self.buffer = deque(maxlen=max_buffer)
+        self.skipped = 0  # Messages dropped since the last frame
+        self.frame = 0  # Number of the last frame sent
+        self.awaiting_ack = False
+        self.sent_at = 0
+    
+    def push(self, message):
+        """Buffer a message, counting the oldest one as skipped if the buffer is full."""
+        if len(self.buffer) == self.buffer.maxlen:
+            self.skipped += 1
+        self.buffer.append(message)
+    
+    def ready(self, now, ack_timeout):
+        """True if there is something to send and the client has caught up."""
+        if not self.buffer and not self.skipped:
+            return False
+        return not self.awaiting_ack or now - self.sent_at > ack_timeout
+    
+    def take_frame(self, now):
+        """Drain the buffer into the next frame."""
+        self.frame += 1
+        frame = {
+            'frame': self.frame,
+            'messages': list(self.buffer),
+            'skipped': self.skipped
+        }
+        self.buffer.clear()
+        self.skipped = 0
+        self.awaiting_ack = True
+        self.sent_at = now
+        return frame
+
+class MessageStream:
+    """Coalesced, per-client push of bus messages to Socket.IO clients."""
+    
+    def __init__(self, socketio, interval_ms, max_buffer, ack_timeout):
+        self.socketio = socketio
+        self.interval = interval_ms / 1000
+        self.max_buffer = max_buffer
+        self.ack_timeout = ack_timeout
+        self.clients = {}  # sid -> ClientStream
+        self.filters = {}  # filter key -> MessageFilter
+        self.subscribers = {}  # filter key -> list of ClientStreams using that filter
+        self.lock = threading.Lock()
+        self.running = False
+        self.flush_thread = None
+    
+    def start(self):
+        """Start the flush thread."""
+        self.running = True
+        self.flush_thread = threading.Thread(target=self.flush_loop, daemon=True)
+        self.flush_thread.start()
+    
+    def stop(self):
+        """Stop the flush thread."""
+        self.running = False
+        if self.flush_thread:
+            self.flush_thread.join(timeout=1)
+    
+    def add_client(self, sid):
+        """Start streaming to a newly connected client."""
+        with self.lock:
+            client = ClientStream(sid, self.max_buffer, self._attach(MessageFilter()))
+            self.clients[sid] = client
+            self.subscribers[client.filter.key].append(client)
+    
+    def remove_client(self, sid):
+        """Stop streaming to a disconnected client."""
+        with self.lock:
+            client = self.clients.pop(sid, None)
+            if client:
+                self._detach(client)
+    
+    def subscribe(self, sid, spec):
+        """Replace a client's filter; pending messages of the old filter are discarded. Returns the filter."""
+        message_filter = MessageFilter(spec)
+        with self.lock:
+            client = self.clients.get(sid)
+            if client is None:
+                return message_filter
+            self._detach(client)
+            client.filter = self._attach(message_filter)
+            self.subscribers[client.filter.key].append(client)
+            client.buffer.clear()
+            client.skipped = 0
+            return client.filter
+    
+    def _attach(self, message_filter):
+        """Shared instance of a filter (caller holds the lock)."""
+        if message_filter.key not in self.filters:
+            self.filters[message_filter.key] = message_filter
+            self.subscribers[message_filter.key] = []
+        return self.filters[message_filter.key]
+    
+    def _detach(self, client):
+        """Remove a client from its filter's subscribers, dropping unused filters (caller holds the lock)."""
+        key = client.filter.key
+        self.subscribers[key].remove(client)
+        if not self.subscribers[key]:
+            del self.subscribers[key]
+            del self.filters[key]
+    
+    def push(self, message):
+        """Queue a message for every client whose filter matches it."""
+        with self.lock:
+            for key, message_filter in self.filters.items():
+                if message_filter.matches(message):
+                    for client in self.subscribers[key]:
+                        client.push(message)
+    
+    def ack(self, sid):
+        """A client finished applying its last frame."""
+        with self.lock:
+            client = self.clients.get(sid)
+            if client:
+                client.awaiting_ack = False
+    
+    def flush(self):
+        """Send a frame to every client that is ready for one."""
+        now = time.monotonic()
+        with self.lock:
+            frames = [(client.sid, client.take_frame(now)) for client in self.clients.values()
+                      if client.ready(now, self.ack_timeout)]
+        
+        for sid, frame in frames:
+            try:
+                self.socketio.emit('messages_batch', frame, to=sid, callback=lambda *args, sid=sid: self.ack(sid))
+            except Exception as e:
+                print(f"ControlPanel: Error streaming to client {sid}: {e}")
+    
+    def flush_loop(self):
+        """Flush frames every interval."""
+        while self.running:
+            time.sleep(self.interval)
+            self.flush()
@@ -2,8 +2,11 @@ SUBPROCESS_REGISTRY = [
     {
         'name': 'ControlPanel',
         'folder': 'control_panel',
-        'critical': True,
+        'critical': True,  # The system stops if it cannot be restarted
         'show_console': True,
+        'restart': 'on-failure',  # 'always', 'on-failure' or 'never' (default SUPERVISOR_RESTART)
+        'max_restarts': 5,  # Consecutive restarts before giving up (default SUPERVISOR_MAX_RESTARTS)
+        'restart_backoff': 0.25,  # Seconds before the first restart, doubled each time (default SUPERVISOR_RESTART_BACKOFF)
     },
 ]
 
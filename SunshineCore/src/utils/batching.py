@@ -0,0 +1,81 @@
+import threading
+import time
+from utils.message_types import *
+
+# System messages are never held back: they go out at once, after anything already pending
+IMMEDIATE_TYPES = {MSG_REGISTER, MSG_REGISTER_ACK, MSG_PING, MSG_PONG, MSG_SHUTDOWN, MSG_SHUTDOWN_ACK}
+
+# A batch is [topic, body1, body2, ...]. It is flushed when it reaches max_messages, when
+# max_delay_us has passed since its first message, when a message with a different topic
+# arrives (which keeps per-sender ordering) or when an immediate message is added.
+class MessageBatcher:
+    """Collect consecutive messages with the same topic and send them as one multipart message."""
+    
+    def __init__(self, send_frames, max_messages, max_delay_us):
+        self.send_frames = send_frames
+        self.max_messages = max_messages
+        self.max_delay = max_delay_us / 1e6
+        self.lock = threading.Condition()
+        self.topic = None
+        self.bodies = []
+        self.deadline = None
+        self.running = True
+        self.flush_thread = threading.Thread(target=self.flush_loop, daemon=True)
+        self.flush_thread.start()
+    
+    def add(self, frames, immediate=False):
+        """Queue the [topic, body] frames of one message."""
+        topic, body = frames
+        with self.lock:
+            if self.bodies and topic != self.topic:
+                self._flush_locked()
+            
+            if not self.bodies:
+                self.topic = topic
+                self.deadline = time.monotonic() + self.max_delay
+                self.lock.notify()
+            self.bodies.append(body)
+            
+            if immediate or len(self.bodies) >= self.max_messages:
+                self._flush_locked()
+    
+    def flush(self):
+        """Send whatever is pending now."""
+        with self.lock:
+            self._flush_locked()
+    
+    def _flush_locked(self):
+        """Send the pending batch (caller holds the lock)."""
+        if not self.bodies:
+            return
+        frames = [self.topic] + self.bodies
+        self.topic = None
+        self.bodies = []
+        self.deadline = None
+        self.send_frames(frames)
+    
+    def flush_loop(self):
+        """Flush batches whose delay has expired."""
+        with self.lock:
+            while self.running:
+                if self.deadline is None:
+                    self.lock.wait()
+                    continue
+                
+                remaining = self.deadline - time.monotonic()
+                if remaining > 0:
+                    self.lock.wait(remaining)
+                    continue
+                
+                try:
+                    self._flush_locked()
+                except Exception as e:
+                    print(f"MessageBatcher: Failed to flush batch: {e}")
+    
+    def close(self):
+        """Flush pending messages and stop the flush thread."""
+        with self.lock:
+            self.running = False
+            self._flush_locked()
+            self.lock.notify()
+        self.flush_thread.join(timeout=1)
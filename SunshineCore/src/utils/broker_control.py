@@ -0,0 +1,91 @@
+import json
+import struct
+import zmq
+from utils.endpoints import CONTROL, connect_endpoint, inproc_endpoint, shard_count
+
+# Commands understood by the broker control socket (same as zmq_proxy_steerable)
+CMD_PAUSE = b"PAUSE"
+CMD_RESUME = b"RESUME"
+CMD_TERMINATE = b"TERMINATE"
+CMD_STATISTICS = b"STATISTICS"
+CMD_METRICS = b"METRICS"  # SunshineCore extension: JSON with the statistics plus relay queue depth
+CMD_READY = b"READY"  # SunshineCore extension: answered with READY once the shard relays traffic
+
+BROKER_CONTROL_INPROC = inproc_endpoint(CONTROL)
+
+# Order of the eight uint64 frames in a STATISTICS reply
+STATISTICS_FIELDS = [
+    'frontend_messages_in',
+    'frontend_bytes_in',
+    'frontend_messages_out',
+    'frontend_bytes_out',
+    'backend_messages_in',
+    'backend_bytes_in',
+    'backend_messages_out',
+    'backend_bytes_out',
+]
+
+def send_broker_command(command, timeout=1000, endpoint=None, context=None, shard=0):
+    """Send a command to a broker shard's control socket and return the reply frames (None on timeout)."""
+    context = context or zmq.Context.instance()
+    sock = context.socket(zmq.REQ)
+    sock.setsockopt(zmq.LINGER, 0)
+    sock.setsockopt(zmq.RCVTIMEO, timeout)
+    sock.setsockopt(zmq.SNDTIMEO, timeout)
+    try:
+        sock.connect(endpoint or connect_endpoint(CONTROL, shard=shard))
+        sock.send(command)
+        return sock.recv_multipart()
+    except zmq.Again:
+        return None
+    finally:
+        sock.close()
+
+def wait_for_broker(timeout=10, endpoint=None, context=None, shard=0):
+    """Block until a broker shard answers READY (the request is queued until the shard binds); True if it did."""
+    context = context or zmq.Context.instance()
+    sock = context.socket(zmq.REQ)
+    sock.setsockopt(zmq.LINGER, 0)
+    sock.setsockopt(zmq.RECONNECT_IVL, 10)  # Retry the connection every 10 ms while the broker starts
+    sock.setsockopt(zmq.RCVTIMEO, max(int(timeout * 1000), 1))
+    try:
+        sock.connect(endpoint or connect_endpoint(CONTROL, shard=shard))
+        sock.send(CMD_READY)
+        return sock.recv() == CMD_READY
+    except zmq.Again:
+        return False
+    finally:
+        sock.close()
+
+def pack_statistics(values):
+    """Pack statistics counters into reply frames."""
+    return [struct.pack('=Q', values[field]) for field in STATISTICS_FIELDS]
+
+def parse_statistics(frames):
+    """Turn a STATISTICS reply into a dict of counters."""
+    return {field: struct.unpack('=Q', frame)[0] for field, frame in zip(STATISTICS_FIELDS, frames)}
+
+def get_broker_statistics(timeout=1000, endpoint=None, context=None, shard=0):
+    """Fetch a broker shard's traffic counters, or None if it did not answer."""
+    frames = send_broker_command(CMD_STATISTICS, timeout, endpoint, context, shard)
+    if not frames or len(frames) != len(STATISTICS_FIELDS):
+        return None
+    return parse_statistics(frames)
+
+def get_broker_metrics(timeout=1000, endpoint=None, context=None, shard=0):
+    """Fetch a broker shard's METRICS snapshot as a dict, or None if it did not answer."""
+    frames = send_broker_command(CMD_METRICS, timeout, endpoint, context, shard)
+    if not frames or not frames[0]:
+        return None
+    return json.loads(frames[0])
+
+def get_total_broker_statistics(timeout=1000, context=None):
+    """Traffic counters summed over all broker shards, or None if any shard did not answer."""
+    totals = {field: 0 for field in STATISTICS_FIELDS}
+    for shard in range(shard_count()):
+        stats = get_broker_statistics(timeout, context=context, shard=shard)
+        if stats is None:
+            return None
+        for field in STATISTICS_FIELDS:
+            totals[field] += stats[field]
+    return totals
@@ -0,0 +1,74 @@
+import json
+import time
+from datetime import datetime
+
+try:
+    import msgpack
+except ImportError:  # Optional dependency; the binary codec falls back to JSON without it
+    msgpack = None
+
+CODEC_JSON = "json"
+CODEC_MSGPACK = "msgpack"
+
+# Binary bodies start with 0xC1, a byte msgpack never emits, while JSON bodies
+# always start with '{'. The format is therefore detectable per message and
+# JSON and binary senders can share the bus.
+BINARY_MARKER = b"\xc1"
+
+_warned_missing_msgpack = False
+
+def now_ns():
+    """Current wall-clock time as integer epoch nanoseconds."""
+    return time.time_ns()
+
+def timestamp_to_iso(timestamp_ns):
+    """Render epoch nanoseconds as the ISO-8601 string used by the 'datetime' field."""
+    return datetime.fromtimestamp(timestamp_ns / 1e9).isoformat()
+
+def message_timestamp_ns(message):
+    """Epoch nanoseconds of a message, whichever format it arrived in."""
+    timestamp_ns = message.get('timestamp_ns')
+    if timestamp_ns is None and message.get('datetime'):
+        timestamp_ns = int(datetime.fromisoformat(message['datetime']).timestamp() * 1e9)
+        message['timestamp_ns'] = timestamp_ns
+    return timestamp_ns
+
+def ensure_datetime(message):
+    """Fill in the ISO 'datetime' field lazily (binary messages only carry timestamp_ns)."""
+    if 'datetime' not in message and message.get('timestamp_ns') is not None:
+        message['datetime'] = timestamp_to_iso(message['timestamp_ns'])
+    return message
+
+def resolve_codec(codec):
+    """Return the codec that will actually be used (msgpack needs the optional package)."""
+    global _warned_missing_msgpack
+    if codec == CODEC_MSGPACK and msgpack is None:
+        if not _warned_missing_msgpack:
+            print("⚠️  msgpack is not installed, falling back to JSON message encoding")
+            _warned_missing_msgpack = True
+        return CODEC_JSON
+    return codec
+
+def encode_body(message, codec=CODEC_JSON):
+    """Encode a message dict into a body frame."""
+    if resolve_codec(codec) == CODEC_MSGPACK:
+        if 'datetime' in message and 'timestamp_ns' in message:
+            message = {key: value for key, value in message.items() if key != 'datetime'}
+        return BINARY_MARKER + msgpack.packb(message, use_bin_type=True)
+
+    # JSON keeps the ISO 'datetime' field for older receivers (added to a copy, the caller's dict stays as it is)
+    if 'datetime' not in message and message.get('timestamp_ns') is not None:
+        message = ensure_datetime(dict(message))
+    return json.dumps(message).encode('utf-8')
+
+def decode_body(body):
+    """Decode a body frame, detecting JSON or binary from its first byte."""
+    if body[:1] == BINARY_MARKER:
+        if msgpack is None:
+            raise ValueError("Received a binary message but msgpack is not installed")
+        return msgpack.unpackb(body[1:], raw=False)
+    return json.loads(body)
+
+def body_codec(body):
+    """Name of the codec a body frame was encoded with."""
+    return CODEC_MSGPACK if body[:1] == BINARY_MARKER else CODEC_JSON
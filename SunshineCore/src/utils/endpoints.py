@@ -0,0 +1,139 @@
+import os
+import socket
+import tempfile
+import zlib
+import zmq
+from config.settings import (ZEROMQ_PORT, ZEROMQ_CONTROL_PORT, ZEROMQ_CAPTURE_PORT, ZEROMQ_TRANSPORT,
+                             ZEROMQ_IPC_DIR, BROKER_SHARDS, BROKER_SHARD_PORT_STRIDE)
+
+TRANSPORT_TCP = "tcp"
+TRANSPORT_IPC = "ipc"
+TRANSPORT_INPROC = "inproc"
+
+# Broker sockets
+FRONTEND = "frontend"  # Publishers connect here
+BACKEND = "backend"  # Subscribers connect here
+CONTROL = "control"  # PAUSE/RESUME/TERMINATE/STATISTICS
+CAPTURE = "capture"  # Copy of all traffic
+PROXY_CONTROL = "proxy-control"  # Private control socket of the native proxy (inproc only)
+
+PORTS = {
+    FRONTEND: ZEROMQ_PORT,
+    BACKEND: ZEROMQ_PORT + 1,
+    CONTROL: ZEROMQ_CONTROL_PORT,
+    CAPTURE: ZEROMQ_CAPTURE_PORT,
+}
+
+# Environment variables that override connect endpoints; main.py sets them for every
+# process it launches so Comets built without SunshineCore's settings use the same transport.
+# With several broker shards each variable holds a comma-separated list, one endpoint per shard.
+ENDPOINT_ENV = {
+    FRONTEND: "SUNSHINE_ZMQ_FRONTEND",
+    BACKEND: "SUNSHINE_ZMQ_BACKEND",
+    CONTROL: "SUNSHINE_ZMQ_CONTROL",
+    CAPTURE: "SUNSHINE_ZMQ_CAPTURE",
+}
+
+_warned_missing_ipc = False
+
+def resolve_transport(transport=None):
+    """Return the transport that will actually be used (ipc needs libzmq support for it)."""
+    global _warned_missing_ipc
+    transport = transport or ZEROMQ_TRANSPORT
+    if transport == TRANSPORT_IPC and not zmq.has('ipc'):
+        if not _warned_missing_ipc:
+            print("⚠️  ipc:// is not supported on this platform, falling back to tcp://")
+            _warned_missing_ipc = True
+        return TRANSPORT_TCP
+    return transport
+
+def context_for(transport=None, io_threads=1):
+    """ZeroMQ context for a component; inproc endpoints only work within one shared context."""
+    if resolve_transport(transport) == TRANSPORT_INPROC:
+        return zmq.Context.instance(io_threads=io_threads)
+    return zmq.Context(io_threads=io_threads)
+
+def owns_context(transport=None):
+    """False when components share the process-wide context (inproc), which only the host may terminate."""
+    return resolve_transport(transport) != TRANSPORT_INPROC
+
+def ipc_directory():
+    """Directory holding the broker's Unix domain sockets."""
+    return ZEROMQ_IPC_DIR or os.path.join(tempfile.gettempdir(), "sunshine-zmq")
+
+def shard_name(name, shard=0):
+    """Per-shard name of a broker socket (shard 0 keeps the plain name)."""
+    return name if shard == 0 else f"{name}-{shard}"
+
+def shard_port(name, shard=0):
+    """TCP port of a broker socket on a shard."""
+    return PORTS[name] + shard * BROKER_SHARD_PORT_STRIDE
+
+def inproc_endpoint(name, shard=0):
+    """In-process endpoint of a broker socket."""
+    return f"inproc://broker-{shard_name(name, shard)}"
+
+def bind_endpoint(name, transport=None, shard=0):
+    """Endpoint the broker binds for one of its sockets."""
+    transport = resolve_transport(transport)
+    if transport == TRANSPORT_INPROC:
+        return inproc_endpoint(name, shard)
+    if transport == TRANSPORT_IPC:
+        os.makedirs(ipc_directory(), exist_ok=True)
+        return f"ipc://{os.path.join(ipc_directory(), shard_name(name, shard))}"
+    host = "*" if name in (FRONTEND, BACKEND) else "127.0.0.1"
+    return f"tcp://{host}:{shard_port(name, shard)}"
+
+def connect_endpoint(name, transport=None, shard=0):
+    """Endpoint a client connects to for one of the broker's sockets."""
+    if transport is None and os.environ.get(ENDPOINT_ENV[name]):
+        return os.environ[ENDPOINT_ENV[name]].split(',')[shard]
+    
+    transport = resolve_transport(transport)
+    if transport == TRANSPORT_TCP:
+        return f"tcp://localhost:{shard_port(name, shard)}"
+    return bind_endpoint(name, transport, shard)
+
+def shard_count(transport=None):
+    """Number of broker shards clients connect to."""
+    if transport is None and os.environ.get(ENDPOINT_ENV[FRONTEND]):
+        return len(os.environ[ENDPOINT_ENV[FRONTEND]].split(','))
+    return BROKER_SHARDS
+
+def connect_endpoints(name, transport=None):
+    """Endpoints of a broker socket on every shard, in shard order."""
+    return [connect_endpoint(name, transport, shard) for shard in range(shard_count(transport))]
+
+def shard_for_type(message_type, shards):
+    """Shard that carries a message type; stable across processes so each type stays ordered."""
+    if shards <= 1:
+        return 0
+    return zlib.crc32(message_type.encode('utf-8')) % shards
+
+def endpoint_environment(transport=None):
+    """Environment variables pointing child processes at the broker."""
+    transport = resolve_transport(transport)
+    return {ENDPOINT_ENV[name]: ','.join(connect_endpoints(name, transport)) for name in ENDPOINT_ENV}
+
+def endpoint_ready(endpoint, timeout=0.5):
+    """True if something is listening on a tcp:// or ipc:// endpoint (inproc cannot be probed from outside)."""
+    if endpoint.startswith("tcp://"):
+        host, _, port = endpoint[len("tcp://"):].rpartition(":")
+        host = "127.0.0.1" if host in ("*", "localhost") else host
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            return sock.connect_ex((host, int(port))) == 0
+    
+    if endpoint.startswith("ipc://"):
+        path = endpoint[len("ipc://"):]
+        if not os.path.exists(path):
+            return False
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            return sock.connect_ex(path) == 0
+    
+    return False
+
+def describe_endpoints(transport=None, shard=0):
+    """Short summary of the frontend/backend endpoints for startup logs."""
+    return f"{bind_endpoint(FRONTEND, transport, shard)} / {bind_endpoint(BACKEND, transport, shard)}"
@@ -0,0 +1,377 @@
+import bisect
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+from utils.codec import encode_body, decode_body, ensure_datetime, now_ns
+from utils.message_history import HISTORY_CODEC, text_matches
+
+# On-disk layout of a journal directory:
+#   <first_seq>.seg - records: header (body length, seq, journal time ns) followed by the encoded message
+#   <first_seq>.idx - sparse index: (seq, journal time ns, offset in .seg) for every index_interval-th record
+# The journal time is when append() was called, clamped so it never goes backwards; sequence
+# numbers and journal times therefore only grow and both can be binary searched through the index.
+# A new segment starts when the current one exceeds its size or age limit, and on every restart.
+RECORD_HEADER = struct.Struct('<IQQ')
+INDEX_ENTRY = struct.Struct('<QQQ')
+SEGMENT_SUFFIX = '.seg'
+INDEX_SUFFIX = '.idx'
+
+def default_journal_directory():
+    """Journal location when JOURNAL_DIR is not set: Documents/Sunshine/journal."""
+    if os.name == 'nt':
+        documents_path = os.path.join(os.environ['USERPROFILE'], 'Documents')
+    else:
+        documents_path = os.path.join(os.path.expanduser('~'), 'Documents')
+    return os.path.join(documents_path, 'Sunshine', 'journal')
+
+def segment_path(directory, first_seq, suffix=SEGMENT_SUFFIX):
+    """Path of a segment (or its index) by the seq of its first record."""
+    return os.path.join(directory, f"{first_seq:016d}{suffix}")
+
+def list_segments(directory):
+    """First seqs of all segments in a directory, oldest first."""
+    if not os.path.isdir(directory):
+        return []
+    return sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in os.listdir(directory)
+                  if name.endswith(SEGMENT_SUFFIX) and name[:-len(SEGMENT_SUFFIX)].isdigit())
+
+def read_index(directory, first_seq):
+    """Index entries of a segment as a list of (seq, journal time ns, offset)."""
+    try:
+        with open(segment_path(directory, first_seq, INDEX_SUFFIX), 'rb') as f:
+            data = f.read()
+    except FileNotFoundError:
+        return []
+    usable = len(data) - len(data) % INDEX_ENTRY.size
+    return list(INDEX_ENTRY.iter_unpack(data[:usable]))
+
+def scan_records(view, offset=0):
+    """Yield (offset, seq, journal time ns, body) from a mapped segment, stopping at a torn tail."""
+    end = len(view)
+    while offset + RECORD_HEADER.size <= end:
+        length, seq, journal_ns = RECORD_HEADER.unpack_from(view, offset)
+        body_start = offset + RECORD_HEADER.size
+        if body_start + length > end:
+            return
+        yield offset, seq, journal_ns, view[body_start:body_start + length]
+        offset = body_start + length
+
+class JournalWriter:
+    """Append-only segmented message journal, written by a background thread."""
+    
+    def __init__(self, directory, segment_max_bytes, segment_max_seconds, index_interval,
+                 retention_bytes, retention_seconds, queue_max=100000, codec=HISTORY_CODEC):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.segment_max_seconds = segment_max_seconds
+        self.index_interval = index_interval
+        self.retention_bytes = retention_bytes
+        self.retention_seconds = retention_seconds
+        self.codec = codec
+        self.queue = queue.Queue(maxsize=queue_max)  # Bounded: if the disk falls behind, new messages are dropped
+        self.dropped = 0  # Messages dropped because the queue was full
+        self.failed = 0  # Messages that could not be encoded or written
+        self.reported = (0, 0)  # (dropped, failed) at the last report
+        self.retention_pending = False  # A segment could not be deleted; retried while idle and on each rotation
+        self.segment = None  # Open .seg file
+        self.index = None  # Open .idx file
+        self.segment_first_seq = None
+        self.segment_opened = 0
+        self.last_ns = 0  # Journal time of the last record written
+        os.makedirs(directory, exist_ok=True)
+        self.next_seq = self.recover_next_seq()
+        self.writer_thread = threading.Thread(target=self.writer_loop, daemon=True)
+        self.writer_thread.start()
+    
+    def recover_next_seq(self):
+        """Continue numbering after the last complete record on disk."""
+        segments = list_segments(self.directory)
+        if not segments:
+            return 0
+        
+        last = segments[-1]
+        entries = read_index(self.directory, last)
+        offset = entries[-1][2] if entries else 0
+        next_seq = entries[-1][0] if entries else last
+        with open(segment_path(self.directory, last), 'rb') as f:
+            f.seek(offset)
+            data = f.read()
+        for _, seq, _, _ in scan_records(data):
+            next_seq = seq + 1
+        return next_seq
+    
+    def append(self, message):
+        """Queue a message for the journal; never blocks the caller on disk I/O."""
+        try:
+            self.queue.put_nowait((now_ns(), message))
+        except queue.Full:
+            self.dropped += 1
+    
+    def writer_loop(self):
+        """Write queued messages in batches, rotating and pruning segments as needed."""
+        while True:
+            try:
+                item = self.queue.get(timeout=1)
+            except queue.Empty:
+                try:
+                    self.rotate_if_needed()
+                    if self.retention_pending:
+                        self.apply_retention()
+                except Exception as e:
+                    print(f"Journal: Failed to rotate segments: {e}")
+                self.report_losses()
+                continue
+            
+            batch = [item]
+            while len(batch) < 1000:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            
+            for item in batch:
+                if item is None:
+                    continue
+                try:
+                    self.write(*item)
+                except Exception as e:
+                    self.failed += 1
+                    if self.failed == 1:
+                        print(f"Journal: Failed to write a message: {e}")
+            try:
+                if self.segment:
+                    self.segment.flush()
+                    self.index.flush()
+            except Exception as e:
+                print(f"Journal: Failed to flush segment: {e}")
+                self.close_segment()
+            self.report_losses()
+            
+            if None in batch:
+                self.close_segment()
+                return
+    
+    def report_losses(self):
+        """Print how many messages were dropped or failed since the last report."""
+        dropped, failed = self.dropped, self.failed
+        if (dropped, failed) == self.reported:
+            return
+        print(f"Journal: ⚠️  {dropped - self.reported[0]} message(s) dropped (queue full), "
+              f"{failed - self.reported[1]} failed to write ({dropped} / {failed} in total)")
+        self.reported = (dropped, failed)
+    
+    def write(self, appended_ns, message):
+        """Append one record to the current segment (writer thread only)."""
+        self.rotate_if_needed()
+        if self.segment is None:
+            self.open_segment()
+        
+        body = encode_body(message, self.codec)
+        seq = self.next_seq
+        journal_ns = max(appended_ns, self.last_ns)
+        self.last_ns = journal_ns
+        try:
+            offset = self.segment.tell()
+            if (seq - self.segment_first_seq) % self.index_interval == 0:
+                self.index.write(INDEX_ENTRY.pack(seq, journal_ns, offset))
+            self.segment.write(RECORD_HEADER.pack(len(body), seq, journal_ns))
+            self.segment.write(body)
+        except OSError:
+            # A partly written record would hide every later record of this segment from
+            # readers: give up its seq and continue in a new segment
+            self.next_seq += 1
+            self.close_segment()
+            raise
+        self.next_seq += 1
+    
+    def rotate_if_needed(self):
+        """Close the current segment when it is too large or too old."""
+        if self.segment is None:
+            return
+        too_big = self.segment.tell() >= self.segment_max_bytes
+        too_old = time.monotonic() - self.segment_opened >= self.segment_max_seconds
+        if too_big or too_old:
+            self.close_segment()
+            self.apply_retention()
+    
+    def open_segment(self):
+        """Start a new segment at the next seq."""
+        self.segment_first_seq = self.next_seq
+        self.segment = open(segment_path(self.directory, self.next_seq), 'ab')
+        self.index = open(segment_path(self.directory, self.next_seq, INDEX_SUFFIX), 'ab')
+        self.segment_opened = time.monotonic()
+    
+    def close_segment(self):
+        """Close the current segment; the next write starts a new one."""
+        if self.segment is None:
+            return
+        segment, index = self.segment, self.index
+        self.segment = None
+        self.index = None
+        try:
+            segment.close()
+        finally:
+            index.close()
+    
+    def apply_retention(self):
+        """Delete the oldest closed segments beyond the size or age limit."""
+        # A segment that cannot be deleted (on Windows: still mapped by a JournalReader) is
+        # kept and retried later; the index goes first, so an orphaned .idx is never left behind
+        self.retention_pending = False
+        segments = list_segments(self.directory)
+        if self.segment is not None:
+            segments = [first_seq for first_seq in segments if first_seq != self.segment_first_seq]
+        
+        stats = {}
+        for first_seq in segments:
+            try:
+                stats[first_seq] = os.stat(segment_path(self.directory, first_seq))
+            except FileNotFoundError:
+                pass
+        total = sum(stat.st_size for stat in stats.values())
+        cutoff = time.time() - self.retention_seconds
+        for first_seq, stat in stats.items():
+            if total <= self.retention_bytes and stat.st_mtime >= cutoff:
+                break
+            try:
+                for suffix in (INDEX_SUFFIX, SEGMENT_SUFFIX):
+                    try:
+                        os.remove(segment_path(self.directory, first_seq, suffix))
+                    except FileNotFoundError:
+                        pass
+            except OSError as e:
+                print(f"Journal: Could not delete segment {first_seq}, will retry: {e}")
+                self.retention_pending = True
+                continue
+            total -= stat.st_size
+    
+    def close(self):
+        """Write everything still queued and close the journal."""
+        try:
+            self.queue.put(None, timeout=5)
+            self.writer_thread.join(timeout=5)
+        except queue.Full:
+            pass
+        if self.writer_thread.is_alive() or not self.queue.empty():
+            print(f"Journal: ⚠️  Closed with about {self.queue.qsize()} message(s) not written")
+
+class JournalReader:
+    """Query and replay a journal through memory-mapped segments."""
+    
+    def __init__(self, directory):
+        self.directory = directory
+    
+    def segments(self):
+        """First seqs of the segments on disk, oldest first."""
+        return list_segments(self.directory)
+    
+    def read(self, start_ns=None, end_ns=None, start_seq=None, limit=None):
+        """Yield journaled messages in order, from a journal time and/or seq onwards."""
+        count = 0
+        for seq, journal_ns, body in self.records(start_ns, end_ns, start_seq):
+            yield self.decode(seq, body)
+            count += 1
+            if limit is not None and count >= limit:
+                return
+    
+    def records(self, start_ns=None, end_ns=None, start_seq=None):
+        """Yield raw (seq, journal time ns, body) records in order within the bounds."""
+        for first_seq, offset in self.start_points(start_ns, start_seq):
+            for seq, journal_ns, body in self.read_segment(first_seq, offset):
+                if start_seq is not None and seq < start_seq:
+                    continue
+                if start_ns is not None and journal_ns < start_ns:
+                    continue
+                if end_ns is not None and journal_ns > end_ns:
+                    return
+                yield seq, journal_ns, body
+    
+    def query(self, start_seq=None, limit=100, message_type=None, sender=None, start_ns=None, end_ns=None,
+              text=None, max_scan=None):
+        """One page of matching messages, oldest first, from the cursor seq on. Returns (messages, next_cursor)."""
+        # Same filters as MessageHistory.query, but the journal pages forwards in time;
+        # next_cursor is None once the end of the journal (or of the time range) is reached
+        needle = text.casefold() if text else None
+        found = []
+        scanned = 0
+        for seq, journal_ns, body in self.records(start_ns, end_ns, start_seq):
+            if len(found) >= limit or (max_scan is not None and scanned >= max_scan):
+                return found, seq
+            scanned += 1
+            message = self.decode(seq, body)
+            if message_type is not None and message.get('message_type') != message_type:
+                continue
+            if sender is not None and message.get('sender') != sender:
+                continue
+            if needle and not text_matches(message, needle):
+                continue
+            found.append(message)
+        return found, None
+    
+    def decode(self, seq, body):
+        """Decode a record body into a message dict tagged with its journal seq."""
+        message = decode_body(body)
+        message['journal_seq'] = seq
+        return ensure_datetime(message)
+    
+    def start_points(self, start_ns, start_seq):
+        """(segment, offset) pairs to scan, skipping whole segments and records using the indexes."""
+        segments = self.segments()
+        points = []
+        for position, first_seq in enumerate(segments):
+            entries = read_index(self.directory, first_seq)
+            following = segments[position + 1] if position + 1 < len(segments) else None
+            if start_seq is not None and following is not None and following <= start_seq:
+                continue
+            if start_ns is not None and position + 1 < len(segments):
+                next_entries = read_index(self.directory, following)
+                if next_entries and next_entries[0][1] <= start_ns:
+                    continue
+            
+            offset = 0
+            if not points and entries:
+                # Last indexed record at or before the start, then scan forward from it
+                if start_seq is not None:
+                    found = bisect.bisect_right([entry[0] for entry in entries], start_seq) - 1
+                    offset = max(offset, entries[found][2] if found >= 0 else 0)
+                if start_ns is not None:
+                    found = bisect.bisect_right([entry[1] for entry in entries], start_ns) - 1
+                    offset = max(offset, entries[found][2] if found >= 0 else 0)
+            points.append((first_seq, offset))
+        return points
+    
+    def read_segment(self, first_seq, offset=0):
+        """Yield (seq, journal time ns, body) of one segment from an offset, without reading it into memory."""
+        path = segment_path(self.directory, first_seq)
+        try:
+            f = open(path, 'rb')
+        except FileNotFoundError:
+            return  # Removed by retention while we were reading
+        
+        with f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                for _, seq, journal_ns, body in scan_records(view, offset):
+                    yield seq, journal_ns, body
+    
+    def time_range(self):
+        """(first, last) journal time ns in the journal, or None when it is empty."""
+        segments = self.segments()
+        if not segments:
+            return None
+        first_entries = read_index(self.directory, segments[0])
+        last = None
+        for _, journal_ns, _ in self.read_segment(segments[-1], self.last_indexed_offset(segments[-1])):
+            last = journal_ns
+        if not first_entries or last is None:
+            return None
+        return first_entries[0][1], last
+    
+    def last_indexed_offset(self, first_seq):
+        """Offset of the last indexed record of a segment."""
+        entries = read_index(self.directory, first_seq)
+        return entries[-1][2] if entries else 0
@@ -0,0 +1,114 @@
+import os
+import sys
+import subprocess
+import time
+
+# How roles of main.py (broker, registry subprocesses) are started
+LAUNCH_SPAWN = "spawn"  # Fresh interpreter (or frozen binary) per role
+LAUNCH_FORK = "fork"  # Forked from a fork server that has already imported ROLE_PRELOAD_MODULES
+
+def is_frozen():
+    """True when running from a PyInstaller build."""
+    return getattr(sys, 'frozen', False)
+
+def role_command(*args):
+    """Command line starting another role of this program (the frozen binary takes the role arguments directly)."""
+    if is_frozen():
+        return [sys.executable, *args]
+    return [sys.executable, 'main.py', *args]
+
+def fork_available():
+    """Fork server launches need os.fork (Linux/macOS)."""
+    import multiprocessing
+    return 'forkserver' in multiprocessing.get_all_start_methods()
+
+def role_popen_options(dev_mode, show_console=True):
+    """Popen keyword arguments of a spawned role: own console in dev mode on Windows, none otherwise."""
+    options = {'cwd': os.getcwd()}
+    if os.name == 'nt':
+        new_console = dev_mode and show_console
+        options['creationflags'] = subprocess.CREATE_NEW_CONSOLE if new_console else subprocess.CREATE_NO_WINDOW
+    else:
+        options['stdin'] = subprocess.DEVNULL  # Shares main.py's terminal, so it must not read from it
+    return options
+
+def pause_before_closing():
+    """After a crash, keep a role's own console window open until Enter; forked or windowless roles exit at once."""
+    if not (sys.stdin and sys.stdin.isatty()):
+        return
+    print("Press Enter to close this window...")
+    try:
+        input()
+    except (EOFError, OSError):
+        time.sleep(30)
+
+class RoleProcess:
+    """A started role: a Popen (spawn) or multiprocessing Process (fork) behind one interface."""
+    
+    def __init__(self, args, process, mode):
+        self.args = list(args)
+        self.process = process
+        self.mode = mode
+    
+    @property
+    def pid(self):
+        return self.process.pid
+    
+    def poll(self):
+        """Exit code, or None while running."""
+        if self.mode == LAUNCH_FORK:
+            return None if self.process.is_alive() else self.process.exitcode
+        return self.process.poll()
+    
+    def wait(self, timeout=None):
+        """Wait for the role to exit; returns its exit code, or None if it is still running."""
+        if self.mode == LAUNCH_FORK:
+            self.process.join(timeout)
+            return self.process.exitcode
+        try:
+            return self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            return None
+    
+    def terminate(self):
+        self.process.terminate()  # Both ignore a process that has already exited
+    
+    def kill(self):
+        self.process.kill()
+
+# In fork mode a fork server (multiprocessing 'forkserver') is started once, imports the
+# preload modules and main.py, and forks every role from that initialized state. A role
+# then skips interpreter startup, PyInstaller onefile extraction and its imports, which
+# makes broker and ControlPanel (re)starts much faster. The fork server itself has no
+# threads or ZeroMQ sockets, so forking it is safe; main.py, which has both, never forks.
+# Windows has no fork, so roles are always spawned there (with their dev-mode consoles).
+# Forked roles run entry(args), which must be a module-level function of main.py that
+# sets sys.argv to the role arguments and dispatches like a fresh process would.
+class RoleLauncher:
+    """Starts roles of main.py by forking a preloaded fork server or spawning a new process."""
+    
+    def __init__(self, entry, mode=LAUNCH_FORK, preload_modules=(), executable=None):
+        self.entry = entry
+        self.executable = executable  # Spawn this build (e.g. a frozen binary) instead of role_command()
+        self.mode = LAUNCH_FORK if mode == LAUNCH_FORK and fork_available() else LAUNCH_SPAWN
+        self.context = None
+        if self.mode == LAUNCH_FORK:
+            import multiprocessing
+            self.context = multiprocessing.get_context('forkserver')
+            self.context.set_forkserver_preload(['__main__', *preload_modules])
+    
+    def prepare(self):
+        """Start the fork server now, so its imports overlap other work (returns without waiting)."""
+        if self.mode == LAUNCH_FORK:
+            from multiprocessing import forkserver
+            forkserver.ensure_running()
+    
+    def start(self, args, dev_mode=False, show_console=True):
+        """Start the role given by main.py arguments (e.g. ['--broker']); returns a RoleProcess."""
+        if self.mode == LAUNCH_FORK:
+            process = self.context.Process(target=self.entry, args=(list(args),), name=' '.join(args))
+            process.start()
+        else:
+            cmd = [self.executable, *args] if self.executable else role_command(*args)
+            process = subprocess.Popen(cmd, **role_popen_options(dev_mode, show_console))
+        return RoleProcess(args, process, self.mode)
@@ -0,0 +1,204 @@
+import bisect
+import threading
+from utils.codec import (encode_body, decode_body, ensure_datetime, message_timestamp_ns, msgpack, CODEC_JSON,
+                         CODEC_MSGPACK)
+
+# Messages are kept encoded (msgpack when available) and only decoded when read,
+# so a large history costs a few hundred bytes per message instead of a dict tree.
+HISTORY_CODEC = CODEC_MSGPACK if msgpack is not None else CODEC_JSON
+
+# Queries copy matching slots out in chunks of this many, releasing the lock in between so
+# appends from the message loop never wait for a long scan
+QUERY_CHUNK = 1000
+
+def payload_values(value):
+    """Scalar values of a payload as strings, including those nested in dicts and lists (keys excluded)."""
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+        elif value is not None:
+            yield str(value)
+
+def text_matches(message, needle):
+    """True when a payload value of the message contains needle, which must already be casefolded."""
+    return any(needle in value.casefold() for value in payload_values(message.get('payload')))
+
+class SeqIndex:
+    """Seqs of one index key, oldest first, in a list with a moving start (a deque is O(n) to index in the middle)."""
+    
+    def __init__(self):
+        self.seqs = []
+        self.start = 0  # Position of the oldest seq still held; the ones before it were evicted
+    
+    def append(self, seq):
+        self.seqs.append(seq)
+    
+    def drop_oldest(self):
+        """Forget the oldest seq; the dropped prefix is compacted away once it is half the list."""
+        self.start += 1
+        if self.start * 2 >= len(self.seqs):
+            del self.seqs[:self.start]
+            self.start = 0
+    
+    def __len__(self):
+        return len(self.seqs) - self.start
+    
+    def newest(self):
+        """All seqs, newest first."""
+        for position in range(len(self.seqs) - 1, self.start - 1, -1):
+            yield self.seqs[position]
+    
+    def newest_before(self, before, count):
+        """Up to count seqs lower than before, newest first."""
+        end = bisect.bisect_left(self.seqs, before, self.start)
+        return self.seqs[max(end - count, self.start):end][::-1]
+
+class MessageHistory:
+    """Fixed-capacity ring buffer of messages with incremental indexes by message type and sender."""
+    
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.slots = [None] * capacity  # (seq, message_type, sender, timestamp_ns, body)
+        self.next_seq = 0  # Sequence number of the next message; seq % capacity is its slot
+        self.by_type = {}  # message_type -> SeqIndex
+        self.by_sender = {}  # sender -> SeqIndex
+        self.lock = threading.Lock()
+    
+    def append(self, message):
+        """Store a message, evicting the oldest one when full. Returns its sequence number."""
+        message_type = message.get('message_type')
+        sender = message.get('sender')
+        timestamp_ns = message_timestamp_ns(message)
+        body = encode_body(message, HISTORY_CODEC)
+        
+        with self.lock:
+            seq = self.next_seq
+            slot = seq % self.capacity
+            evicted = self.slots[slot]
+            if evicted is not None:
+                # The evicted message is the oldest overall, so it is first in both of its indexes
+                self._drop_from_index(self.by_type, evicted[1])
+                self._drop_from_index(self.by_sender, evicted[2])
+            
+            self.slots[slot] = (seq, message_type, sender, timestamp_ns, body)
+            self.by_type.setdefault(message_type, SeqIndex()).append(seq)
+            self.by_sender.setdefault(sender, SeqIndex()).append(seq)
+            self.next_seq += 1
+        return seq
+    
+    def _drop_from_index(self, index, key):
+        """Remove the oldest seq of a key (caller holds the lock)."""
+        seqs = index[key]
+        seqs.drop_oldest()
+        if not seqs:
+            del index[key]
+    
+    def latest(self, limit=200, message_type=None, sender=None):
+        """Newest messages (oldest first), optionally only of one type and/or from one sender."""
+        with self.lock:
+            entries = self._latest_entries(limit, message_type, sender)
+        return [self.decode(entry) for entry in entries]
+    
+    def _latest_entries(self, limit, message_type, sender):
+        """Collect up to limit matching slots, using the smaller index (caller holds the lock)."""
+        if message_type is None and sender is None:
+            first = max(self.next_seq - min(limit, self.capacity), 0)
+            return [self.slots[seq % self.capacity] for seq in range(first, self.next_seq)]
+        
+        candidates = []
+        if message_type is not None:
+            candidates.append(self.by_type.get(message_type, SeqIndex()))
+        if sender is not None:
+            candidates.append(self.by_sender.get(sender, SeqIndex()))
+        seqs = min(candidates, key=len)
+        
+        entries = []
+        for seq in seqs.newest():
+            entry = self.slots[seq % self.capacity]
+            if message_type is not None and entry[1] != message_type:
+                continue
+            if sender is not None and entry[2] != sender:
+                continue
+            entries.append(entry)
+            if len(entries) >= limit:
+                break
+        entries.reverse()
+        return entries
+    
+    def query(self, before=None, limit=100, message_type=None, sender=None, start_ns=None, end_ns=None,
+              text=None, max_scan=None):
+        """One page of matching messages, newest first, older than the cursor seq. Returns (messages, next_cursor)."""
+        # Messages are scanned newest to oldest, so the scan ends at the first one older than
+        # start_ns. text is a case-insensitive substring match on the payload's values.
+        # next_cursor is None once the history is exhausted, otherwise pass it as before.
+        needle = text.casefold() if text else None
+        with self.lock:
+            cursor = self.next_seq if before is None else min(before, self.next_seq)
+        
+        found = []
+        scanned = 0
+        while len(found) < limit and (max_scan is None or scanned < max_scan):
+            with self.lock:
+                chunk = self._entries_before(cursor, QUERY_CHUNK, message_type, sender)
+            if not chunk:
+                cursor = None
+                break
+            
+            for entry in chunk:
+                cursor = entry[0]
+                scanned += 1
+                if (message_type is not None and entry[1] != message_type) or (sender is not None and entry[2] != sender):
+                    continue
+                timestamp_ns = entry[3]
+                if start_ns is not None and timestamp_ns is not None and timestamp_ns < start_ns:
+                    return [self.decode(entry) for entry in found], None
+                if end_ns is not None and timestamp_ns is not None and timestamp_ns > end_ns:
+                    continue
+                if needle and not text_matches(decode_body(entry[4]), needle):
+                    continue
+                found.append(entry)
+                if len(found) >= limit or (max_scan is not None and scanned >= max_scan):
+                    break
+        
+        return [self.decode(entry) for entry in found], cursor
+    
+    def _entries_before(self, before, count, message_type, sender):
+        """Up to count slots with seq < before, newest first, from the smaller index (caller holds the lock)."""
+        oldest = max(self.next_seq - self.capacity, 0)
+        if message_type is None and sender is None:
+            first = max(before - count, oldest)
+            return [self.slots[seq % self.capacity] for seq in range(before - 1, first - 1, -1)]
+        
+        candidates = []
+        if message_type is not None:
+            candidates.append(self.by_type.get(message_type, SeqIndex()))
+        if sender is not None:
+            candidates.append(self.by_sender.get(sender, SeqIndex()))
+        seqs = min(candidates, key=len)
+        
+        return [self.slots[seq % self.capacity] for seq in seqs.newest_before(before, count)]
+    
+    def decode(self, entry):
+        """Decode a stored slot back into a message dict."""
+        message = decode_body(entry[4])
+        message['history_seq'] = entry[0]
+        return ensure_datetime(message)
+    
+    def message_types(self):
+        """Message types currently in the history, with their counts."""
+        with self.lock:
+            return {message_type: len(seqs) for message_type, seqs in self.by_type.items()}
+    
+    def senders(self):
+        """Senders currently in the history, with their counts."""
+        with self.lock:
+            return {sender: len(seqs) for sender, seqs in self.by_sender.items()}
+    
+    def __len__(self):
+        """Number of messages currently held."""
+        with self.lock:
+            return min(self.next_seq, self.capacity)
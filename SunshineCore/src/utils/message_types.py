@@ -4,6 +4,8 @@ MSG_REGISTER_ACK = "REGISTER_ACK"
 MSG_PING = "PING"
 MSG_PONG = "PONG"
 MSG_SHUTDOWN = "SHUTDOWN"
+MSG_READY = "READY"  # Broadcast once a process is connected to the bus and registered
+MSG_BUS_PROBE = "BUS_PROBE"  # Sent by a starting process to itself to confirm its bus connections
 MSG_LOG = "LOG"
 
 # Application Message Types
@@ -18,3 +20,18 @@ MSG_CUSTOM_RESPONSE = "CUSTOM_RESPONSE"
 
 # Add additional message types as needed
 MSG_SHUTDOWN_ACK = "SHUTDOWN_ACK"
+
+# Request/Reply Pairs (replies to other request types use "<TYPE>_RESPONSE")
+RESPONSE_TYPES = {
+    MSG_SUNBOX_COMMAND: MSG_SUNBOX_RESPONSE,
+    MSG_CUSTOM_COMMAND: MSG_CUSTOM_RESPONSE,
+}
+
+# Broker Message Types
+MSG_BROKER_SUBSCRIPTIONS = "BROKER_SUBSCRIPTIONS"
+
+# Startup Message Types
+MSG_PLUGIN_LAUNCH_REPORT = "PLUGIN_LAUNCH_REPORT"  # Per-plugin spawn and registration times, sent by main.py
+
+# Supervisor Message Types
+MSG_PROCESS_LIFECYCLE = "PROCESS_LIFECYCLE"  # started / exited / restarting / gave_up, sent by main.py's supervisor
@@ -0,0 +1,166 @@
+import bisect
+import threading
+
+# Counters and histograms are updated without locks: each metric is written by a single
+# thread (the message loop or the broker relay) and only read by others, which under the
+# GIL sees consistent ints. Histograms have fixed buckets, so an observation is one bisect
+# and two increments. Creating a labelled child is the only locked path.
+
+# Upper bounds in seconds, 100us to 10s
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+# Messages waiting per relay wake-up
+DEPTH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+class Counter:
+    """Monotonic counter."""
+    
+    def __init__(self):
+        self.value = 0
+    
+    def inc(self, amount=1):
+        """Add to the counter."""
+        self.value += amount
+    
+    def set_total(self, value):
+        """Mirror a counter kept elsewhere (e.g. the broker's own statistics)."""
+        self.value = value
+
+class Gauge:
+    """Value that can go up and down."""
+    
+    def __init__(self):
+        self.value = 0
+    
+    def set(self, value):
+        """Set the current value."""
+        self.value = value
+
+class Histogram:
+    """Fixed-bucket histogram; counts[i] holds observations <= buckets[i], the last slot the rest."""
+    
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+    
+    def observe(self, value):
+        """Record one observation."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+    
+    def set_counts(self, counts, total_sum):
+        """Mirror a histogram kept elsewhere, from its bucket counts."""
+        self.counts = list(counts)
+        self.sum = total_sum
+        self.count = sum(counts)
+    
+    def snapshot(self):
+        """Copy of the bucket counts."""
+        return list(self.counts)
+
+def quantile(buckets, counts, q):
+    """Upper bound of the bucket holding quantile q of some bucket counts (None when empty)."""
+    total = sum(counts)
+    if total == 0:
+        return None
+    rank = q * total
+    cumulative = 0
+    for position, count in enumerate(counts):
+        cumulative += count
+        if cumulative >= rank:
+            return buckets[min(position, len(buckets) - 1)]
+    return buckets[-1]
+
+def escape_label(value):
+    """Escape a label value for the Prometheus text format."""
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names, values, extra=None):
+    """Render {name="value",...} (empty string without labels)."""
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def format_number(value):
+    """Prometheus number formatting."""
+    if isinstance(value, float):
+        return repr(value)
+    return str(value)
+
+class MetricFamily:
+    """A named metric with one child per combination of label values."""
+    
+    def __init__(self, name, help_text, kind, label_names, factory):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.label_names = tuple(label_names)
+        self.factory = factory
+        self.children = {}  # label values -> Counter/Gauge/Histogram
+        self.lock = threading.Lock()
+    
+    def labels(self, *values):
+        """Child metric for these label values, created on first use."""
+        child = self.children.get(values)
+        if child is None:
+            with self.lock:
+                child = self.children.get(values)
+                if child is None:
+                    child = self.factory()
+                    self.children[values] = child
+        return child
+    
+    def items(self):
+        """(label values, child) pairs, safe to iterate while other threads add children."""
+        with self.lock:
+            return list(self.children.items())
+    
+    def render(self):
+        """Lines of the Prometheus text format for this family."""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in self.items():
+            if self.kind == 'histogram':
+                cumulative = 0
+                counts = child.snapshot()
+                for bound, count in zip(child.buckets + ('+Inf',), counts):
+                    cumulative += count
+                    labels = format_labels(self.label_names, values, f'le="{bound}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = format_labels(self.label_names, values)
+                lines.append(f"{self.name}_sum{labels} {format_number(child.sum)}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+            else:
+                lines.append(f"{self.name}{format_labels(self.label_names, values)} {format_number(child.value)}")
+        return lines
+
+class MetricsRegistry:
+    """Set of metric families exposed together on a /metrics route."""
+    
+    def __init__(self):
+        self.families = {}
+    
+    def register(self, family):
+        """Add a family, or return the one already registered under its name."""
+        return self.families.setdefault(family.name, family)
+    
+    def counter(self, name, help_text, labels=()):
+        """Counter family."""
+        return self.register(MetricFamily(name, help_text, 'counter', labels, Counter))
+    
+    def gauge(self, name, help_text, labels=()):
+        """Gauge family."""
+        return self.register(MetricFamily(name, help_text, 'gauge', labels, Gauge))
+    
+    def histogram(self, name, help_text, buckets, labels=()):
+        """Histogram family with fixed buckets."""
+        return self.register(MetricFamily(name, help_text, 'histogram', labels, lambda: Histogram(buckets)))
+    
+    def render(self):
+        """All metrics in the Prometheus text exposition format."""
+        lines = []
+        for family in list(self.families.values()):
+            lines.extend(family.render())
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,257 @@
+import os
+import subprocess
+import threading
+import time
+import uuid
+import zmq
+from utils.message_types import MSG_REGISTER, MSG_PLUGIN_LAUNCH_REPORT
+from utils.wire import encode_message, decode_frames, type_subscription, LEGACY_PREFIX
+from utils.endpoints import FRONTEND, BACKEND, connect_endpoints, shard_for_type
+from utils.codec import now_ns
+
+# Launch outcome of a plugin
+LAUNCH_REGISTERED = "registered"
+LAUNCH_NO_REGISTER = "no_register"  # Still running, but no REGISTER within the timeout
+LAUNCH_EXITED = "exited"  # Exited before it registered
+LAUNCH_FAILED = "failed"  # Could not be spawned
+
+REPORT_ECHO_TIMEOUT = 1  # Seconds to wait for our own report to come back before sending it again
+REPORT_ATTEMPTS = 5
+
+def plugin_command(plugin_file, dev_mode):
+    """Command line of a plugin Comet."""
+    cmd = [str(plugin_file)]
+    if dev_mode:
+        cmd.append('--dev')
+    return cmd
+
+def plugin_popen_options(cwd, dev_mode):
+    """Popen keyword arguments: own console in dev mode on Windows, none otherwise."""
+    if os.name == 'nt':
+        return {'cwd': cwd, 'creationflags': subprocess.CREATE_NEW_CONSOLE if dev_mode else subprocess.CREATE_NO_WINDOW}
+    return {'cwd': cwd}
+
+def spawn_plugin(plugin_file, cwd, dev_mode):
+    """Start a plugin Comet; returns its Popen."""
+    return subprocess.Popen(plugin_command(plugin_file, dev_mode), **plugin_popen_options(cwd, dev_mode))
+
+class PluginLaunch:
+    """Launch record of one plugin."""
+    
+    def __init__(self, plugin_file):
+        self.plugin_file = plugin_file
+        self.name = os.path.basename(str(plugin_file))
+        self.process = None
+        self.status = None
+        self.error = None
+        self.process_name = None  # Name it registered with
+        self.queued_at = time.monotonic()
+        self.spawn_started_at = None
+        self.spawned_at = None
+        self.registered_at = None
+        self.registered = threading.Event()
+    
+    def report(self):
+        """Report row (times in milliseconds, None where a step did not happen)."""
+        def elapsed_ms(start, end):
+            return round((end - start) * 1000, 1) if start is not None and end is not None else None
+        
+        return {
+            'plugin': self.name,
+            'pid': self.process.pid if self.process else None,
+            'process_name': self.process_name,
+            'status': self.status,
+            'error': self.error,
+            'returncode': self.process.poll() if self.process else None,
+            'queued_ms': elapsed_ms(self.queued_at, self.spawn_started_at),
+            'spawn_ms': elapsed_ms(self.spawn_started_at, self.spawned_at),
+            'register_ms': elapsed_ms(self.spawned_at, self.registered_at)
+        }
+
+# Plugins are spawned by up to `concurrency` threads at once. With admit_on_register a thread
+# keeps its slot until the plugin's REGISTER shows up on the bus, so at most `concurrency`
+# plugins are starting up and registering at the same time. REGISTER is matched by pid, or
+# by parent pid for launchers (e.g. PyInstaller onefile) that run the Comet in a child process.
+# The report is published as PLUGIN_LAUNCH_REPORT so the ControlPanel can show it.
+class PluginLauncher:
+    """Parallel plugin launch with registration tracking."""
+    
+    def __init__(self, plugin_files, cwd, dev_mode=False, concurrency=8, admit_on_register=True,
+                 register_timeout=15):
+        self.launches = [PluginLaunch(plugin_file) for plugin_file in plugin_files]
+        self.cwd = cwd
+        self.dev_mode = dev_mode
+        self.concurrency = max(1, concurrency)
+        self.admit_on_register = admit_on_register
+        self.register_timeout = register_timeout
+        self.launch_id = uuid.uuid4().hex[:12]
+        self.context = zmq.Context.instance()
+        self.watcher = None
+        self.publishers = []
+        self.stopping = threading.Event()
+        self.report_echoed = threading.Event()
+        self.lock = threading.Lock()
+        self.by_pid = {}  # pid -> PluginLaunch
+        self.registrations = {}  # pid / parent pid -> (process name, monotonic time), until matched
+    
+    def launch(self):
+        """Spawn every plugin, collect their registrations and publish the report; returns the report."""
+        started = time.monotonic()
+        self.open_sockets()
+        watcher_thread = threading.Thread(target=self.watch_registrations, daemon=True)
+        watcher_thread.start()
+        
+        slots = threading.Semaphore(self.concurrency)
+        threads = [threading.Thread(target=self.launch_one, args=(launch, slots), daemon=True)
+                   for launch in self.launches]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        spawned = [launch.spawned_at for launch in self.launches if launch.spawned_at]
+        spawn_seconds = max(spawned) - started if spawned else 0
+        
+        # Without admission control the registrations are still collected for the report
+        for launch in self.launches:
+            if launch.process and not launch.status:
+                self.await_registration(launch, launch.spawned_at + self.register_timeout)
+        
+        report = {
+            'launch_id': self.launch_id,
+            'timestamp_ns': now_ns(),
+            'concurrency': self.concurrency,
+            'admit_on_register': self.admit_on_register,
+            'spawn_seconds': round(spawn_seconds, 3),
+            'total_seconds': round(time.monotonic() - started, 3),
+            'plugins': [launch.report() for launch in self.launches]
+        }
+        self.publish(report)
+        self.stopping.set()
+        watcher_thread.join(1)
+        for publisher in self.publishers:
+            publisher.close()
+        return report
+    
+    def launch_one(self, launch, slots):
+        """Spawn one plugin in a launch slot; with admission control, keep the slot until it registers."""
+        with slots:
+            launch.spawn_started_at = time.monotonic()
+            try:
+                launch.process = spawn_plugin(launch.plugin_file, self.cwd, self.dev_mode)
+            except Exception as e:
+                launch.status = LAUNCH_FAILED
+                launch.error = str(e)
+                print(f"   ❌ Failed to launch {launch.name}: {e}")
+                return
+            launch.spawned_at = time.monotonic()
+            print(f"   ✅ Launched {launch.name} (PID: {launch.process.pid})")
+            
+            with self.lock:
+                self.by_pid[launch.process.pid] = launch
+                # A fast plugin may have registered before we got here
+                registration = self.registrations.pop(launch.process.pid, None)
+            if registration:
+                self.mark_registered(launch, *registration)
+            
+            if self.admit_on_register:
+                self.await_registration(launch, launch.spawned_at + self.register_timeout)
+    
+    def await_registration(self, launch, deadline):
+        """Wait until the plugin registers, exits or the deadline passes, and set its status."""
+        while not launch.registered.wait(0.05):
+            if launch.process.poll() is not None:
+                launch.status = LAUNCH_EXITED
+                print(f"   ⚠️  {launch.name} exited (code {launch.process.returncode}) before registering")
+                return
+            if time.monotonic() >= deadline:
+                launch.status = LAUNCH_NO_REGISTER
+                print(f"   ⚠️  {launch.name} did not register within {self.register_timeout}s")
+                return
+    
+    def mark_registered(self, launch, process_name, registered_at):
+        if launch.registered.is_set():
+            return
+        launch.process_name = process_name
+        launch.registered_at = registered_at
+        launch.status = LAUNCH_REGISTERED
+        launch.registered.set()
+    
+    def open_sockets(self):
+        """REGISTER watcher and report publisher, connected before the first plugin starts."""
+        self.watcher = self.context.socket(zmq.SUB)
+        self.watcher.setsockopt(zmq.LINGER, 0)
+        for endpoint in connect_endpoints(BACKEND):
+            self.watcher.connect(endpoint)
+        self.watcher.setsockopt(zmq.SUBSCRIBE, type_subscription(MSG_REGISTER))
+        self.watcher.setsockopt(zmq.SUBSCRIBE, type_subscription(MSG_PLUGIN_LAUNCH_REPORT))
+        self.watcher.setsockopt(zmq.SUBSCRIBE, LEGACY_PREFIX)  # Legacy wire format has no topic frame
+        
+        for endpoint in connect_endpoints(FRONTEND):
+            publisher = self.context.socket(zmq.PUB)
+            publisher.setsockopt(zmq.LINGER, 1000)
+            publisher.connect(endpoint)
+            self.publishers.append(publisher)
+    
+    def watch_registrations(self):
+        """Match REGISTER messages to launched plugins (watcher thread)."""
+        while not self.stopping.is_set():
+            try:
+                if not self.watcher.poll(100):
+                    continue
+                messages = decode_frames(self.watcher.recv_multipart())
+            except zmq.ZMQError:
+                break
+            except ValueError:
+                continue
+            
+            received_at = time.monotonic()
+            for message in messages:
+                payload = message.get('payload') or {}
+                if message.get('message_type') == MSG_PLUGIN_LAUNCH_REPORT:
+                    if payload.get('launch_id') == self.launch_id:
+                        self.report_echoed.set()
+                    continue
+                if message.get('message_type') != MSG_REGISTER:
+                    continue
+                
+                registration = (payload.get('process_name'), received_at)
+                with self.lock:
+                    launch = None
+                    for pid in (payload.get('process_id'), payload.get('parent_process_id')):
+                        launch = launch or self.by_pid.get(pid)
+                    if launch is None:
+                        for pid in (payload.get('process_id'), payload.get('parent_process_id')):
+                            if pid is not None:
+                                self.registrations.setdefault(pid, registration)
+                if launch:
+                    self.mark_registered(launch, *registration)
+        self.watcher.close()
+    
+    def publish(self, report):
+        """Broadcast the report until it is seen on the bus (the ControlPanel receives all traffic)."""
+        message = {
+            'timestamp_ns': now_ns(),
+            'message_type': MSG_PLUGIN_LAUNCH_REPORT,
+            'sender': 'SunshineMain',
+            'payload': report
+        }
+        frames = encode_message(message)
+        publisher = self.publishers[shard_for_type(MSG_PLUGIN_LAUNCH_REPORT, len(self.publishers))]
+        for _ in range(REPORT_ATTEMPTS):
+            publisher.send_multipart(frames)
+            if self.report_echoed.wait(REPORT_ECHO_TIMEOUT):
+                return True
+        print("   ⚠️  Plugin launch report was not confirmed on the bus")
+        return False
+
+def print_launch_report(report):
+    """Per-plugin launch table for the console."""
+    print(f"\n   Plugin launch: {len(report['plugins'])} plugin(s), concurrency {report['concurrency']}, "
+          f"spawned in {report['spawn_seconds']:.2f}s, done in {report['total_seconds']:.2f}s")
+    print(f"   {'Plugin':<28} {'PID':>7} {'Queued ms':>10} {'Spawn ms':>9} {'Register ms':>12}  Status")
+    for row in report['plugins']:
+        def cell(value, width):
+            return f"{value:>{width}}" if value is not None else f"{'-':>{width}}"
+        print(f"   {row['plugin'][:28]:<28} {cell(row['pid'], 7)} {cell(row['queued_ms'], 10)} "
+              f"{cell(row['spawn_ms'], 9)} {cell(row['register_ms'], 12)}  {row['status']}"
+              f"{': ' + row['error'] if row['error'] else ''}")
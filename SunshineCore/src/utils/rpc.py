@@ -0,0 +1,125 @@
+import heapq
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+from utils.message_types import RESPONSE_TYPES
+
+# Envelope fields used by request/reply:
+#   correlation_id - set on a request, unique per call
+#   reply_to       - process the reply must be addressed to
+#   in_reply_to    - set on a reply, the correlation_id it answers
+#   error          - set on a reply when the handler failed
+
+class RequestError(Exception):
+    """Raised through a request future when the remote handler reported an error."""
+    pass
+
+def response_type(message_type):
+    """Message type used for replies to a request type."""
+    return RESPONSE_TYPES.get(message_type, f"{message_type}_RESPONSE")
+
+def new_correlation_id():
+    """Unique id for an outgoing request."""
+    return uuid.uuid4().hex
+
+class RequestFuture(Future):
+    """Future for a reply; refuses to block the thread that delivers replies, which would deadlock."""
+    
+    def __init__(self, reply_thread=None):
+        super().__init__()
+        self.reply_thread = reply_thread
+    
+    def result(self, timeout=None):
+        self.check_thread()
+        return super().result(timeout)
+    
+    def exception(self, timeout=None):
+        self.check_thread()
+        return super().exception(timeout)
+    
+    def check_thread(self):
+        if not self.done() and threading.current_thread() is self.reply_thread:
+            raise RuntimeError("Waiting for a reply on the thread that receives replies would deadlock; "
+                               "use add_done_callback() there instead")
+
+class PendingRequests:
+    """Futures for requests in flight, resolved by replies or failed by a timeout reaper thread."""
+    
+    def __init__(self, owner):
+        self.owner = owner
+        self.reply_thread = None  # Thread that calls resolve(); its futures must not be waited on from it
+        self.lock = threading.Condition()
+        self.futures = {}  # correlation_id -> Future
+        self.deadlines = []  # heap of (deadline, correlation_id)
+        self.reaper_thread = None
+        self.running = True
+    
+    def create(self, timeout):
+        """Register a new request and return (correlation_id, future)."""
+        correlation_id = new_correlation_id()
+        future = RequestFuture(self.reply_thread)
+        future.set_running_or_notify_cancel()
+        
+        with self.lock:
+            self.futures[correlation_id] = future
+            heapq.heappush(self.deadlines, (time.monotonic() + timeout, correlation_id))
+            if self.reaper_thread is None:
+                self.reaper_thread = threading.Thread(target=self.reap_expired, daemon=True)
+                self.reaper_thread.start()
+            self.lock.notify()
+        return correlation_id, future
+    
+    def resolve(self, message):
+        """Complete the future a reply belongs to. Returns False if the reply is not ours (or too late)."""
+        with self.lock:
+            future = self.futures.pop(message.get('in_reply_to'), None)
+        if future is None:
+            return False
+        
+        if message.get('error'):
+            future.set_exception(RequestError(message['error']))
+        else:
+            future.set_result(message)
+        return True
+    
+    def discard(self, correlation_id):
+        """Forget a request whose send failed; returns its future."""
+        with self.lock:
+            return self.futures.pop(correlation_id, None)
+    
+    def reap_expired(self):
+        """Fail requests whose deadline has passed."""
+        with self.lock:
+            while self.running:
+                if not self.deadlines:
+                    self.lock.wait()
+                    continue
+                
+                deadline, correlation_id = self.deadlines[0]
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self.lock.wait(remaining)
+                    continue
+                
+                heapq.heappop(self.deadlines)
+                future = self.futures.pop(correlation_id, None)
+                if future is not None:
+                    future.set_exception(TimeoutError(f"{self.owner}: request {correlation_id} timed out"))
+    
+    def cancel_all(self):
+        """Fail every outstanding request (used on shutdown)."""
+        with self.lock:
+            self.running = False
+            futures = list(self.futures.values())
+            self.futures.clear()
+            self.deadlines.clear()
+            self.lock.notify()
+        
+        for future in futures:
+            future.set_exception(RequestError(f"{self.owner} is shutting down"))
+    
+    def __len__(self):
+        """Number of requests still waiting for a reply."""
+        with self.lock:
+            return len(self.futures)
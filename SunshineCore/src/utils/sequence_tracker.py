@@ -0,0 +1,103 @@
+from collections import deque
+
+# Senders stamp every message with 'session' (random per process start), 'seq' (0, 1, 2, ...
+# within the session) and 'mono_ns' (monotonic send time, comparable between processes on
+# the same host). A receiver that sees all of a sender's traffic can then tell:
+#   gap       - seq jumped ahead; the skipped seqs count as lost until they turn up
+#   late      - a seq counted as lost arrived after all (reordered, e.g. across broker shards)
+#   duplicate - a seq that was already received
+#   restart   - a new session, i.e. the sender restarted and numbering began again
+SEQ_OK = "ok"
+SEQ_GAP = "gap"
+SEQ_LATE = "late"
+SEQ_DUPLICATE = "duplicate"
+SEQ_RESTART = "restart"
+
+MAX_MISSING = 10000  # Missing seqs remembered per sender; older ones stay counted as lost
+
+class SenderSequence:
+    """Sequence state of one sender."""
+    
+    def __init__(self, session):
+        self.session = session
+        self.expected = None  # Next seq in order
+        self.received = 0
+        self.gaps = 0  # Seqs ever skipped; only grows (lost = gaps - reordered)
+        self.lost = 0  # Seqs currently missing; goes down when a late one arrives
+        self.reordered = 0
+        self.duplicates = 0
+        self.restarts = 0
+        self.missing = set()
+        self.missing_order = deque()  # Same seqs as missing, oldest first, to bound memory
+    
+    def stats(self):
+        """Counters as a dict."""
+        return {
+            'session': self.session,
+            'received': self.received,
+            'gaps': self.gaps,
+            'lost': self.lost,
+            'reordered': self.reordered,
+            'duplicates': self.duplicates,
+            'restarts': self.restarts
+        }
+
+class SequenceTracker:
+    """Per-sender gap, reorder and duplicate detection from message seq numbers."""
+    
+    def __init__(self, max_missing=MAX_MISSING):
+        self.max_missing = max_missing
+        self.senders = {}  # sender -> SenderSequence
+    
+    def observe(self, message):
+        """Check one received message; returns a SEQ_* result, or None if it carries no seq."""
+        seq = message.get('seq')
+        if seq is None:
+            return None
+        
+        sender = message.get('sender')
+        session = message.get('session')
+        state = self.senders.get(sender)
+        if state is None or state.session != session:
+            # First message seen from this sender (session): start counting from here
+            restarted = state is not None
+            if state is None:
+                state = SenderSequence(session)
+                self.senders[sender] = state
+            else:
+                state.session = session
+                state.missing.clear()
+                state.missing_order.clear()
+                state.restarts += 1
+            state.expected = seq + 1
+            state.received += 1
+            return SEQ_RESTART if restarted else SEQ_OK
+        
+        state.received += 1
+        if seq == state.expected:
+            state.expected += 1
+            return SEQ_OK
+        
+        if seq > state.expected:
+            state.gaps += seq - state.expected
+            state.lost += seq - state.expected
+            for missing in range(max(state.expected, seq - self.max_missing), seq):
+                state.missing.add(missing)
+                state.missing_order.append(missing)
+            while len(state.missing_order) > self.max_missing:
+                state.missing.discard(state.missing_order.popleft())
+            state.expected = seq + 1
+            return SEQ_GAP
+        
+        if seq in state.missing:
+            state.missing.discard(seq)
+            state.lost -= 1
+            state.reordered += 1
+            return SEQ_LATE
+        
+        state.duplicates += 1
+        return SEQ_DUPLICATE
+    
+    def stats(self):
+        """Counters per sender."""
+        return {sender: state.stats() for sender, state in list(self.senders.items())}
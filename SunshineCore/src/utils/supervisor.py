@@ -0,0 +1,262 @@
+import queue
+import threading
+import time
+import zmq
+from utils.message_types import MSG_PROCESS_LIFECYCLE, MSG_SHUTDOWN
+from utils.wire import encode_message, decode_frames, type_subscription, LEGACY_PREFIX
+from utils.endpoints import FRONTEND, BACKEND, connect_endpoints, shard_for_type
+from utils.codec import now_ns
+from config.settings import (SUPERVISOR_RESTART, SUPERVISOR_MAX_RESTARTS, SUPERVISOR_RESTART_BACKOFF,
+                             SUPERVISOR_BACKOFF_MAX, SUPERVISOR_STABLE_SECONDS, SUPERVISOR_SHUTDOWN_TIMEOUT)
+
+# Restart policies
+RESTART_ALWAYS = "always"
+RESTART_ON_FAILURE = "on-failure"  # Only after a non-zero exit; a SHUTDOWN exits with 0
+RESTART_NEVER = "never"
+
+# PROCESS_LIFECYCLE events
+LIFECYCLE_STARTED = "started"
+LIFECYCLE_EXITED = "exited"
+LIFECYCLE_RESTARTING = "restarting"
+LIFECYCLE_GAVE_UP = "gave_up"  # Out of restarts, or its policy does not restart it after a failure
+
+def restart_policy(config=None, critical=False):
+    """Restart policy of a SUBPROCESS_REGISTRY entry; keys it leaves out come from the settings."""
+    config = config or {}
+    return {
+        'restart': config.get('restart', SUPERVISOR_RESTART),
+        'max_restarts': config.get('max_restarts', SUPERVISOR_MAX_RESTARTS),
+        'backoff': config.get('restart_backoff', SUPERVISOR_RESTART_BACKOFF),
+        'critical': config.get('critical', critical)
+    }
+
+class SupervisedProcess:
+    """A child process and the state of its restart policy."""
+    
+    def __init__(self, name, start, policy):
+        self.name = name
+        self.start = start  # Starts the process again; returns a handle with pid, wait(), poll(), terminate(), kill()
+        self.policy = policy
+        self.handle = None
+        self.started_at = None
+        self.restarts = 0  # Consecutive restarts, reset once it has run SUPERVISOR_STABLE_SECONDS
+        self.restart_at = None  # Monotonic time of a scheduled restart
+    
+    def running(self):
+        return self.handle is not None
+    
+    def backoff(self):
+        """Delay before the next restart: doubles with each consecutive restart."""
+        return min(self.policy['backoff'] * 2 ** self.restarts, SUPERVISOR_BACKOFF_MAX)
+
+# main.py hands every process it started to the supervisor and then runs it until the system
+# stops. One thread per child blocks in wait(), so an exit is seen the moment it happens
+# (for Popen and forked roles alike, on every platform) and handled on the supervisor
+# thread, which alone touches the sockets. Each exit, scheduled restart and restart is
+# published as PROCESS_LIFECYCLE. A SHUTDOWN to '*' on the bus stops all restarts and ends
+# the supervisor once everything has exited; so does Ctrl+C, or a critical process that
+# cannot be restarted (those two terminate the remaining processes).
+class Supervisor:
+    """Keeps main.py's children running according to their restart policies."""
+    
+    def __init__(self):
+        self.processes = []
+        self.exits = queue.Queue()  # (SupervisedProcess, handle, returncode) from the wait threads
+        self.context = zmq.Context.instance()
+        self.publishers = []
+        self.listener = None
+        self.stopping_since = None  # Monotonic time the system started to stop
+    
+    def add(self, name, start, handle=None, policy=None):
+        """Supervise a process that is already running (handle), or start it now."""
+        process = SupervisedProcess(name, start, policy or restart_policy())
+        self.processes.append(process)
+        self.attach(process, handle or start())
+        return process
+    
+    def attach(self, process, handle):
+        process.handle = handle
+        process.started_at = time.monotonic()
+        threading.Thread(target=self.wait_for_exit, args=(process, handle), daemon=True).start()
+    
+    def wait_for_exit(self, process, handle):
+        """Wait thread: report the exit of one handle."""
+        self.exits.put((process, handle, handle.wait()))
+    
+    def run(self):
+        """Supervise until every process has exited for good (SHUTDOWN, Ctrl+C or a critical failure)."""
+        self.open_sockets()
+        print(f"🛡️  Supervising {len(self.processes)} process(es) (Ctrl+C stops the system)")
+        try:
+            while any(process.running() or process.restart_at for process in self.processes):
+                try:
+                    exited = self.exits.get(timeout=self.next_wakeup())
+                except queue.Empty:
+                    exited = None
+                # Drain the bus first: an exit caused by a SHUTDOWN must not be restarted
+                self.check_bus()
+                if exited:
+                    self.handle_exit(*exited)
+                self.restart_due()
+                self.enforce_shutdown_timeout()
+        except KeyboardInterrupt:
+            print("\n🛑 Ctrl+C received, stopping all processes...")
+            self.stop()
+        finally:
+            self.close_sockets()
+        print("🛡️  All supervised processes have exited")
+    
+    def next_wakeup(self):
+        """Seconds until the next scheduled restart, at most 0.1 so the bus is checked regularly."""
+        pending = [process.restart_at for process in self.processes if process.restart_at]
+        if not pending:
+            return 0.1
+        return min(max(min(pending) - time.monotonic(), 0), 0.1)
+    
+    def handle_exit(self, process, handle, returncode):
+        if handle is not process.handle:
+            return
+        process.handle = None
+        uptime = time.monotonic() - process.started_at
+        print(f"💀 {process.name} (PID {handle.pid}) exited with code {returncode} after {uptime:.1f}s")
+        self.publish(LIFECYCLE_EXITED, process, pid=handle.pid, returncode=returncode,
+                     uptime_seconds=round(uptime, 3))
+        if not self.stopping_since:
+            self.schedule_restart(process, returncode, uptime)
+    
+    def schedule_restart(self, process, returncode, uptime=0):
+        """Apply the restart policy after an exit (returncode None: the process could not be started)."""
+        policy = process.policy
+        if policy['restart'] == RESTART_NEVER or (policy['restart'] == RESTART_ON_FAILURE and returncode == 0):
+            if returncode != 0:
+                self.give_up(process, f"exited with code {returncode} and its policy is '{policy['restart']}'")
+            return
+        if uptime >= SUPERVISOR_STABLE_SECONDS:
+            process.restarts = 0
+        if process.restarts >= policy['max_restarts']:
+            self.give_up(process, f"still failing after {process.restarts} restart(s)")
+            return
+        
+        delay = process.backoff()
+        process.restart_at = time.monotonic() + delay
+        print(f"🔁 Restarting {process.name} in {delay:.2f}s (restart {process.restarts + 1}/{policy['max_restarts']})")
+        self.publish(LIFECYCLE_RESTARTING, process, delay_seconds=delay)
+    
+    def give_up(self, process, reason):
+        print(f"⚠️  Not restarting {process.name}: {reason}")
+        self.publish(LIFECYCLE_GAVE_UP, process, reason=reason)
+        if process.policy['critical']:
+            print(f"❌ {process.name} is critical, stopping the system")
+            self.stop()
+    
+    def restart_due(self):
+        now = time.monotonic()
+        for process in self.processes:
+            if not process.restart_at or process.restart_at > now:
+                continue
+            process.restart_at = None
+            process.restarts += 1
+            try:
+                handle = process.start()
+            except Exception as e:
+                print(f"❌ Failed to restart {process.name}: {e}")
+                self.schedule_restart(process, None)
+                continue
+            self.attach(process, handle)
+            print(f"✅ {process.name} restarted with PID {handle.pid}")
+            self.publish(LIFECYCLE_STARTED, process, pid=handle.pid)
+    
+    def stop(self):
+        """Cancel pending restarts and terminate every process, killing those that do not exit in time."""
+        self.begin_stopping()
+        for process in self.processes:
+            if process.running():
+                process.handle.terminate()
+        self.collect_exits(SUPERVISOR_SHUTDOWN_TIMEOUT)
+        for process in self.processes:
+            if process.running():
+                print(f"   Killing {process.name} (PID {process.handle.pid})")
+                process.handle.kill()
+        self.collect_exits(SUPERVISOR_SHUTDOWN_TIMEOUT)
+    
+    def collect_exits(self, timeout):
+        """Handle exits until nothing is running or the timeout passes (only the wait threads reap children)."""
+        deadline = time.monotonic() + timeout
+        while any(process.running() for process in self.processes):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                self.handle_exit(*self.exits.get(timeout=remaining))
+            except queue.Empty:
+                return
+    
+    def begin_stopping(self):
+        if not self.stopping_since:
+            self.stopping_since = time.monotonic()
+        for process in self.processes:
+            process.restart_at = None
+    
+    def enforce_shutdown_timeout(self):
+        """After a SHUTDOWN, terminate the processes that did not exit on their own."""
+        if self.stopping_since and time.monotonic() - self.stopping_since > SUPERVISOR_SHUTDOWN_TIMEOUT:
+            running = [process for process in self.processes if process.running()]
+            if running:
+                print(f"⚠️  {', '.join(process.name for process in running)} still running "
+                      f"{SUPERVISOR_SHUTDOWN_TIMEOUT}s after SHUTDOWN, terminating")
+                self.stop()
+    
+    def open_sockets(self):
+        """SHUTDOWN listener and lifecycle publisher on every broker shard."""
+        self.listener = self.context.socket(zmq.SUB)
+        self.listener.setsockopt(zmq.LINGER, 0)
+        for endpoint in connect_endpoints(BACKEND):
+            self.listener.connect(endpoint)
+        self.listener.setsockopt(zmq.SUBSCRIBE, type_subscription(MSG_SHUTDOWN))
+        self.listener.setsockopt(zmq.SUBSCRIBE, LEGACY_PREFIX)  # Legacy wire format has no topic frame
+        
+        for endpoint in connect_endpoints(FRONTEND):
+            publisher = self.context.socket(zmq.PUB)
+            publisher.setsockopt(zmq.LINGER, 1000)
+            publisher.connect(endpoint)
+            self.publishers.append(publisher)
+    
+    def close_sockets(self):
+        for sock in [self.listener, *self.publishers]:
+            if sock:
+                sock.close()
+        self.listener = None
+        self.publishers = []
+    
+    def check_bus(self):
+        """Stop restarting once a SHUTDOWN to everyone is on the bus."""
+        while self.listener.poll(0):
+            try:
+                messages = decode_frames(self.listener.recv_multipart())
+            except ValueError:
+                continue
+            for message in messages:
+                payload = message.get('payload') or {}
+                if message.get('message_type') == MSG_SHUTDOWN and payload.get('target', '*') == '*':
+                    if not self.stopping_since:
+                        print("🛑 System SHUTDOWN received, waiting for processes to exit")
+                    self.begin_stopping()
+    
+    def publish(self, event, process, **details):
+        """Send a PROCESS_LIFECYCLE event (best effort: lost while the broker itself is down)."""
+        if not self.publishers:
+            return
+        message = {
+            'timestamp_ns': now_ns(),
+            'message_type': MSG_PROCESS_LIFECYCLE,
+            'sender': 'SunshineMain',
+            'payload': {
+                'event': event,
+                'process_name': process.name,
+                'restarts': process.restarts,
+                'critical': process.policy['critical'],
+                **details
+            }
+        }
+        publisher = self.publishers[shard_for_type(MSG_PROCESS_LIFECYCLE, len(self.publishers))]
+        publisher.send_multipart(encode_message(message))
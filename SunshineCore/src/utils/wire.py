@@ -0,0 +1,68 @@
+from utils.codec import encode_body, decode_body, CODEC_JSON
+
+# Multipart wire format for SolarFlares on the bus:
+#   frame 0 (topic): [b"@" + target + b"\x00"] + message_type + b"\x00" + sender
+#   frame 1 (body):  JSON document or binary (msgpack) body, see utils/codec.py
+#   frames 2..n:     further bodies with the same topic when the sender batches (utils/batching.py)
+# Subscribers filter on the topic frame with plain zmq.SUBSCRIBE prefixes, so
+# unwanted traffic is dropped inside libzmq before it is ever decoded.
+# Single-frame JSON messages (the original format) are still accepted.
+
+TOPIC_SEPARATOR = b"\x00"
+TARGET_PREFIX = b"@"
+LEGACY_PREFIX = b"{"
+
+WIRE_FORMAT_MULTIPART = "multipart"
+WIRE_FORMAT_LEGACY = "legacy"
+
+def build_topic(message_type, sender='', target=None):
+    """Build the topic frame for a message."""
+    topic = message_type.encode('utf-8') + TOPIC_SEPARATOR + sender.encode('utf-8')
+    if target:
+        topic = TARGET_PREFIX + target.encode('utf-8') + TOPIC_SEPARATOR + topic
+    return topic
+
+def parse_topic(topic):
+    """Split a topic frame into (message_type, sender, target)."""
+    target = None
+    if topic.startswith(TARGET_PREFIX):
+        raw_target, _, topic = topic[1:].partition(TOPIC_SEPARATOR)
+        target = raw_target.decode('utf-8')
+    message_type, _, sender = topic.partition(TOPIC_SEPARATOR)
+    return message_type.decode('utf-8'), sender.decode('utf-8'), target
+
+def type_subscription(message_type):
+    """Subscription prefix matching broadcasts of a message type."""
+    return message_type.encode('utf-8') + TOPIC_SEPARATOR
+
+def target_subscription(process_name):
+    """Subscription prefix matching every message addressed to a process."""
+    return TARGET_PREFIX + process_name.encode('utf-8') + TOPIC_SEPARATOR
+
+def encode_message(message, wire_format=WIRE_FORMAT_MULTIPART, codec=CODEC_JSON):
+    """Encode a message dict into a list of frames ready for send_multipart."""
+    if wire_format == WIRE_FORMAT_LEGACY:
+        # Old receivers only understand single-frame JSON
+        return [encode_body(message, CODEC_JSON)]
+    body = encode_body(message, codec)
+    topic = build_topic(message['message_type'], message.get('sender', ''), message.get('target'))
+    return [topic, body]
+
+def decode_frames(frames):
+    """Decode received frames (multipart, batched or legacy single-frame) into a list of message dicts."""
+    if is_legacy(frames):
+        return [decode_body(frames[0])]
+    return [decode_body(body) for body in frames[1:]]
+
+def is_legacy(frames):
+    """True if the frames are an old-style single-frame JSON message."""
+    return len(frames) == 1
+
+def describe_subscription(prefix):
+    """Human readable form of a subscription prefix (for subscription tables and the UI)."""
+    if prefix == b"":
+        return "*"
+    if prefix == LEGACY_PREFIX:
+        return "(legacy)"
+    text = prefix.decode('utf-8', errors='replace')
+    return text.rstrip('\x00').replace('\x00', ' ')
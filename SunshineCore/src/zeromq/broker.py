@@ -8,88 +8,398 @@ import json
 # Add parent directory to path for imports
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
-from config.settings import ZEROMQ_PORT
+from config.settings import (ZEROMQ_WIRE_FORMAT, MESSAGE_CODEC, BROKER_MODE, BROKER_SOCKET_MODE,
+                             BROKER_CAPTURE_ENABLED, BROKER_SUBSCRIPTIONS_INTERVAL, ZEROMQ_IO_THREADS, BROKER_SHARDS,
+                             BROKER_RELAY_DRAIN_MAX)
 from utils.logger import crash_logger
-from utils.message_types import MSG_SHUTDOWN
+from utils.message_types import MSG_SHUTDOWN, MSG_BROKER_SUBSCRIPTIONS
+from utils.wire import decode_frames, encode_message, type_subscription, describe_subscription, LEGACY_PREFIX
+from utils.codec import now_ns
+from utils.metrics import Histogram, DEPTH_BUCKETS
+from utils.broker_control import (CMD_PAUSE, CMD_RESUME, CMD_TERMINATE, CMD_STATISTICS, CMD_METRICS, CMD_READY,
+                                  STATISTICS_FIELDS, pack_statistics, parse_statistics)
+from utils.endpoints import (FRONTEND, BACKEND, CONTROL, CAPTURE, PROXY_CONTROL, bind_endpoint, inproc_endpoint,
+                             connect_endpoint, resolve_transport, context_for, owns_context, describe_endpoints,
+                             TRANSPORT_INPROC)
+
+# XPUB subscription frames start with 1 (subscribe) or 0 (unsubscribe)
+SUBSCRIBE_EVENT = 1
+UNSUBSCRIBE_EVENT = 0
 
 class MessageBroker:
-    def __init__(self):
-        self.context = zmq.Context()
+    def __init__(self, mode=BROKER_MODE, capture_enabled=BROKER_CAPTURE_ENABLED, socket_mode=BROKER_SOCKET_MODE,
+                 transport=None, shard=0, shards=BROKER_SHARDS, context=None):
+        self.transport = resolve_transport(transport)
+        self.shard = shard
+        self.shards = shards
+        # Shards hosted as threads share one context, which their host terminates
+        self.owns_context = context is None and owns_context(self.transport)
+        self.context = context or context_for(self.transport, ZEROMQ_IO_THREADS)
         self.frontend = None
         self.backend = None
+        self.control = None
+        self.proxy_control = None
+        self.capture = None
         self.monitor = None
         self.running = True
-        self.broker_name = "ZeroMQBroker"
+        self.failed = False  # Set when start() ended in a crash; the process then exits with 1
+        self.paused = False
+        self.resume_event = threading.Event()
+        self.resume_event.set()
+        self.mode = mode
+        self.socket_mode = socket_mode
+        self.capture_enabled = capture_enabled
+        self.subscriptions = {}  # Subscription prefix -> number of subscribers (XPUB mode)
+        self.subscriptions_lock = threading.Lock()
+        self.broker_name = "ZeroMQBroker" if shards == 1 else f"ZeroMQBroker[{shard}]"
+        self.stats = {field: 0 for field in STATISTICS_FIELDS}
+        # Messages found waiting each time the relay loop wakes up (relay mode only; the
+        # native proxy's queues cannot be observed)
+        self.relay_depth = Histogram(DEPTH_BUCKETS)
         
+        # In-process endpoints, bound whatever the transport; used by the broker's own helper
+        # threads and by components hosted in the broker's process
+        self.frontend_inproc = inproc_endpoint(FRONTEND, shard)
+        self.backend_inproc = inproc_endpoint(BACKEND, shard)
+        self.control_inproc = inproc_endpoint(CONTROL, shard)
+        self.capture_inproc = inproc_endpoint(CAPTURE, shard)
+        # Private control socket of the native proxy, driven only by the broker's control thread
+        self.proxy_control_inproc = inproc_endpoint(PROXY_CONTROL, shard)
+    
     def setup_sockets(self):
         """Setup all ZeroMQ sockets."""
+        if self.socket_mode == 'xpub':
+            # XSUB/XPUB: subscriber interest travels upstream, so publishers
+            # only send topics somebody is actually listening to
+            self.frontend = self.context.socket(zmq.XSUB)
+            self.backend = self.context.socket(zmq.XPUB)
+            # Pass every subscribe/unsubscribe through so the subscription table has real counts
+            self.backend.setsockopt(zmq.XPUB_VERBOSE, 1)
+            self.backend.setsockopt(zmq.XPUB_VERBOSER, 1)
+        else:
+            self.frontend = self.context.socket(zmq.SUB)
+            self.frontend.setsockopt(zmq.SUBSCRIBE, b"")
+            self.backend = self.context.socket(zmq.PUB)
+        
         # Frontend socket for publishers (subprocesses send messages here)
-        self.frontend = self.context.socket(zmq.SUB)
-        self.frontend.bind(f"tcp://*:{ZEROMQ_PORT}")
-        self.frontend.setsockopt(zmq.SUBSCRIBE, b"")
+        self.bind_with_inproc(self.frontend, FRONTEND)
         
         # Backend socket for subscribers (subprocesses receive messages here)
-        self.backend = self.context.socket(zmq.PUB)
-        self.backend.bind(f"tcp://*:{ZEROMQ_PORT + 1}")
+        self.bind_with_inproc(self.backend, BACKEND)
         
-        # Monitor socket to receive messages for shutdown detection
-        self.monitor = self.context.socket(zmq.SUB)
-        self.monitor.connect(f"tcp://localhost:{ZEROMQ_PORT + 1}")
-        self.monitor.setsockopt(zmq.SUBSCRIBE, b"")
-        self.monitor.setsockopt(zmq.RCVTIMEO, 100)  # 100ms timeout
+        # Control socket for PAUSE/RESUME/TERMINATE/STATISTICS commands
+        self.control = self.context.socket(zmq.REP)
+        self.bind_with_inproc(self.control, CONTROL)
+        
+        if self.mode == 'proxy':
+            self.proxy_control = self.context.socket(zmq.REP)
+            self.proxy_control.bind(self.proxy_control_inproc)
         
-        print(f"✅ ZeroMQ Broker ready on ports {ZEROMQ_PORT}/{ZEROMQ_PORT + 1}")
+        # Capture socket carrying a copy of all traffic; in XPUB mode it also
+        # feeds the subscription tracker, which only subscribes to subscription frames
+        if self.capture_enabled or self.socket_mode == 'xpub':
+            self.capture = self.context.socket(zmq.PUB)
+            self.capture.setsockopt(zmq.LINGER, 0)  # Best effort, never block shutdown
+            self.capture.bind(self.capture_inproc)
+            if self.capture_enabled and self.transport != TRANSPORT_INPROC:
+                self.capture.bind(bind_endpoint(CAPTURE, self.transport, self.shard))
         
+        # Monitor socket to receive messages for shutdown detection. SHUTDOWN travels on
+        # whichever shard its type hashes to, so every shard watches all of them.
+        self.monitor = self.context.socket(zmq.SUB)
+        self.monitor.connect(self.backend_inproc)
+        for shard in range(self.shards):
+            if shard != self.shard:
+                self.monitor.connect(connect_endpoint(BACKEND, self.transport, shard))
+        self.monitor.setsockopt(zmq.SUBSCRIBE, type_subscription(MSG_SHUTDOWN))
+        self.monitor.setsockopt(zmq.SUBSCRIBE, LEGACY_PREFIX)
+        
+        print(f"✅ {self.broker_name} ready on {describe_endpoints(self.transport, self.shard)} "
+              f"(mode: {self.mode}/{self.socket_mode}, control: {bind_endpoint(CONTROL, self.transport, self.shard)}"
+              f"{f', capture: {bind_endpoint(CAPTURE, self.transport, self.shard)}' if self.capture_enabled else ''})")
+    
+    def bind_with_inproc(self, sock, name):
+        """Bind a broker socket on the configured transport and on its in-process endpoint."""
+        sock.bind(bind_endpoint(name, self.transport, self.shard))
+        if self.transport != TRANSPORT_INPROC:
+            sock.bind(inproc_endpoint(name, self.shard))
+    
     def monitor_for_shutdown(self):
         """Monitor messages for shutdown commands."""
         print(f"{self.broker_name}: Monitoring for shutdown commands...")
         
         while self.running:
             try:
-                # Try to receive a message
-                raw_message = self.monitor.recv(zmq.NOBLOCK)
-                message = json.loads(raw_message.decode('utf-8'))
+                # Block until a message arrives; the timeout only bounds how long shutdown takes to notice
+                if not self.monitor.poll(250):
+                    continue
+                frames = self.monitor.recv_multipart()
                 
                 # Check if it's a shutdown message
-                if message.get('message_type') == MSG_SHUTDOWN:
-                    target = message.get('payload', {}).get('target')
-                    sender = message.get('sender')
-                    
-                    if target == '*':
-                        print(f"\n{self.broker_name}: 🛑 Received shutdown command for ALL from {sender}")
-                        print(f"{self.broker_name}: 🛑 Initiating broker shutdown...")
-                        self.running = False
-                        break
-                        
-            except zmq.Again:
-                # No message available, continue
-                pass
+                shutdown = self.find_shutdown_all(decode_frames(frames))
+                if shutdown:
+                    print(f"\n{self.broker_name}: 🛑 Received shutdown command for ALL from {shutdown.get('sender')}")
+                    print(f"{self.broker_name}: 🛑 Initiating broker shutdown...")
+                    self.stop_relay()
+                    break
+            
+            except zmq.ContextTerminated:
+                break
             except Exception as e:
                 if self.running:  # Only log if we're not shutting down
                     print(f"{self.broker_name}: Error monitoring messages: {e}")
+    
+    def find_shutdown_all(self, messages):
+        """The first of the messages that is a SHUTDOWN addressed to everyone, or None."""
+        for message in messages:
+            if message.get('message_type') != MSG_SHUTDOWN:
+                continue
+            if (message.get('payload') or {}).get('target') == '*':
+                return message
+        return None
+    
+    def track_subscriptions(self):
+        """Maintain the subscription table from XPUB subscription frames and publish it on change."""
+        tracker = self.context.socket(zmq.SUB)
+        tracker.connect(self.capture_inproc)
+        # Data messages start with a message type, so libzmq passes us only subscription frames
+        tracker.setsockopt(zmq.SUBSCRIBE, bytes([SUBSCRIBE_EVENT]))
+        tracker.setsockopt(zmq.SUBSCRIBE, bytes([UNSUBSCRIBE_EVENT]))
+        
+        publisher = self.context.socket(zmq.PUB)
+        publisher.setsockopt(zmq.LINGER, 0)
+        publisher.connect(self.frontend_inproc)
+        
+        changed = False
+        last_published = 0
+        
+        while self.running:
+            try:
+                if tracker.poll(BROKER_SUBSCRIPTIONS_INTERVAL * 1000):
+                    self.record_subscription(tracker.recv())
+                    changed = True
+                
+                if changed and time.time() - last_published >= BROKER_SUBSCRIPTIONS_INTERVAL:
+                    message = {
+                        'timestamp_ns': now_ns(),
+                        'message_type': MSG_BROKER_SUBSCRIPTIONS,
+                        'sender': self.broker_name,
+                        'payload': {'subscriptions': self.get_subscription_table()}
+                    }
+                    publisher.send_multipart(encode_message(message, ZEROMQ_WIRE_FORMAT, MESSAGE_CODEC))
+                    changed = False
+                    last_published = time.time()
+            
+            except zmq.ContextTerminated:
+                break
+            except Exception as e:
+                if self.running:
+                    print(f"{self.broker_name}: Subscription tracking error: {e}")
+        
+        tracker.close()
+        publisher.close()
+    
+    def record_subscription(self, event):
+        """Apply one XPUB subscribe/unsubscribe frame to the subscription table."""
+        if not event or event[0] not in (SUBSCRIBE_EVENT, UNSUBSCRIBE_EVENT):
+            return
+        
+        prefix = event[1:]
+        with self.subscriptions_lock:
+            count = self.subscriptions.get(prefix, 0)
+            count += 1 if event[0] == SUBSCRIBE_EVENT else -1
+            if count > 0:
+                self.subscriptions[prefix] = count
+            else:
+                self.subscriptions.pop(prefix, None)
+    
+    def get_subscription_table(self):
+        """Current subscriptions as {readable prefix: subscriber count}."""
+        with self.subscriptions_lock:
+            return {describe_subscription(prefix): count for prefix, count in sorted(self.subscriptions.items())}
+    
+    def metrics_snapshot(self, stats):
+        """Reply to the METRICS control command."""
+        snapshot = {
+            'broker': self.broker_name,
+            'shard': self.shard,
+            'mode': self.mode,
+            'paused': self.paused,
+            'stats': stats
+        }
+        if self.mode == 'relay':
+            snapshot['relay_depth'] = {
+                'buckets': list(self.relay_depth.buckets),
+                'counts': self.relay_depth.snapshot(),
+                'sum': self.relay_depth.sum
+            }
+        return json.dumps(snapshot).encode('utf-8')
+    
+    def stop_relay(self):
+        """Stop the relay from another thread via the control socket."""
+        # The relay loop (or native proxy) owns the control socket, so talk to it like any client
+        control_client = self.context.socket(zmq.REQ)
+        control_client.setsockopt(zmq.LINGER, 0)
+        control_client.setsockopt(zmq.RCVTIMEO, 1000)
+        try:
+            control_client.connect(self.control_inproc)
+            control_client.send(CMD_TERMINATE)
+            control_client.recv()
+        except zmq.ZMQError:
+            pass
+        finally:
+            control_client.close()
+    
+    def proxy_messages(self):
+        """Relay messages with the native steerable proxy (no per-message Python work)."""
+        print(f"{self.broker_name}: Native proxy active. Press Ctrl+C to stop.")
+        
+        control_thread = threading.Thread(target=self.proxy_control_loop, daemon=True)
+        control_thread.start()
+        
+        try:
+            while self.running:
+                # Paused: the proxy is stopped and messages queue up in the frontend
+                self.resume_event.wait()
+                if not self.running:
+                    break
+                
+                # Blocks until the control thread sends TERMINATE (pause or shutdown)
+                zmq.proxy_steerable(self.frontend, self.backend, self.capture, self.proxy_control)
+        except KeyboardInterrupt:
+            print(f"\n{self.broker_name}: Received interrupt signal...")
+        except zmq.ContextTerminated:
+            pass
+        
+        self.running = False
+    
+    def proxy_control_loop(self):
+        """Serve the public control socket on behalf of the native proxy.
+        
+        libzmq's own PAUSE/RESUME are unreliable, so pausing stops the proxy
+        and resuming starts it again on the same sockets.
+        """
+        proxy_client = self.context.socket(zmq.REQ)
+        proxy_client.setsockopt(zmq.LINGER, 0)
+        proxy_client.connect(self.proxy_control_inproc)
+        
+        def query_proxy(command):
+            proxy_client.send(command)
+            return proxy_client.recv_multipart()
+        
+        def collect_statistics():
+            # Counters restart with every proxy run, so fold them into the running totals
+            current = parse_statistics(query_proxy(CMD_STATISTICS))
+            return {field: self.stats[field] + current[field] for field in STATISTICS_FIELDS}
+        
+        while self.running:
+            try:
+                # Short poll so the loop notices shutdown from other paths (e.g. Ctrl+C)
+                if not self.control.poll(250):
+                    continue
+                command = self.control.recv()
+                
+                if command == CMD_STATISTICS:
+                    stats = self.stats if self.paused else collect_statistics()
+                    self.control.send_multipart(pack_statistics(stats))
+                    continue
+                
+                if command == CMD_METRICS:
+                    stats = self.stats if self.paused else collect_statistics()
+                    self.control.send(self.metrics_snapshot(stats))
+                    continue
+                
+                if command == CMD_READY:
+                    self.control.send(CMD_READY)
+                    continue
+                
+                if command == CMD_PAUSE and not self.paused:
+                    self.stats = collect_statistics()
+                    self.paused = True
+                    self.resume_event.clear()
+                    query_proxy(CMD_TERMINATE)
+                    print(f"{self.broker_name}: ⏸️  Relay paused")
+                elif command == CMD_RESUME and self.paused:
+                    self.paused = False
+                    self.resume_event.set()
+                    print(f"{self.broker_name}: ▶️  Relay resumed")
+                elif command == CMD_TERMINATE:
+                    self.running = False
+                    if not self.paused:
+                        query_proxy(CMD_TERMINATE)
+                    self.resume_event.set()
+                elif command not in (CMD_PAUSE, CMD_RESUME):
+                    print(f"{self.broker_name}: Unknown control command: {command!r}")
+                self.control.send(b"")
             
-            time.sleep(0.1)  # Small delay to prevent CPU spinning
+            except zmq.ContextTerminated:
+                break
+            except Exception as e:
+                if self.running:
+                    print(f"{self.broker_name}: Control error: {e}")
+        
+        proxy_client.close()
     
     def relay_messages(self):
-        """Main message relay loop."""
+        """Main message relay loop (Python fallback for the native proxy)."""
         print(f"{self.broker_name}: Message relay active. Press Ctrl+C to stop.")
         
         # Use a poller instead of proxy for more control
         poller = zmq.Poller()
         poller.register(self.frontend, zmq.POLLIN)
+        poller.register(self.control, zmq.POLLIN)
+        if self.socket_mode == 'xpub':
+            poller.register(self.backend, zmq.POLLIN)
+        
+        # While paused only the control socket is watched
+        paused_poller = zmq.Poller()
+        paused_poller.register(self.control, zmq.POLLIN)
         
         while self.running:
             try:
                 # Poll with timeout so we can check running flag
-                socks = dict(poller.poll(100))  # 100ms timeout
+                active_poller = paused_poller if self.paused else poller
+                socks = dict(active_poller.poll(100))  # 100ms timeout
+                
+                if self.control in socks:
+                    self.handle_control_command(self.control.recv())
                 
                 if self.frontend in socks:
-                    # Receive message from frontend
-                    message = self.frontend.recv()
+                    # Relay everything already queued, which also measures the queue depth
+                    drained = 0
+                    while drained < BROKER_RELAY_DRAIN_MAX:
+                        try:
+                            frames = self.frontend.recv_multipart(zmq.NOBLOCK)
+                        except zmq.Again:
+                            break
+                        drained += 1
+                        size = sum(len(frame) for frame in frames)
+                        self.stats['frontend_messages_in'] += len(frames)
+                        self.stats['frontend_bytes_in'] += size
+                        
+                        # Relay to backend
+                        self.backend.send_multipart(frames)
+                        self.stats['backend_messages_out'] += len(frames)
+                        self.stats['backend_bytes_out'] += size
+                        
+                        if self.capture:
+                            self.capture.send_multipart(frames)
+                    self.relay_depth.observe(drained)
+                
+                if self.backend in socks:
+                    # Subscription frames travel upstream to the publishers
+                    frames = self.backend.recv_multipart()
+                    size = sum(len(frame) for frame in frames)
+                    self.stats['backend_messages_in'] += len(frames)
+                    self.stats['backend_bytes_in'] += size
                     
-                    # Relay to backend
-                    self.backend.send(message)
+                    self.frontend.send_multipart(frames)
+                    self.stats['frontend_messages_out'] += len(frames)
+                    self.stats['frontend_bytes_out'] += size
                     
+                    if self.capture:
+                        self.capture.send_multipart(frames)
+            
             except KeyboardInterrupt:
                 print(f"\n{self.broker_name}: Received interrupt signal...")
                 self.running = False
@@ -97,29 +407,63 @@ class MessageBroker:
                 if self.running:
                     print(f"{self.broker_name}: Relay error: {e}")
     
+    def handle_control_command(self, command):
+        """Answer a control command the same way zmq_proxy_steerable does."""
+        if command == CMD_STATISTICS:
+            self.control.send_multipart(pack_statistics(self.stats))
+            return
+        
+        if command == CMD_METRICS:
+            self.control.send(self.metrics_snapshot(self.stats))
+            return
+        
+        if command == CMD_READY:
+            self.control.send(CMD_READY)
+            return
+        
+        if command == CMD_PAUSE:
+            self.paused = True
+        elif command == CMD_RESUME:
+            self.paused = False
+        elif command == CMD_TERMINATE:
+            self.running = False
+        else:
+            print(f"{self.broker_name}: Unknown control command: {command!r}")
+        self.control.send(b"")
+    
     def start(self):
         """Start the broker with monitoring."""
         try:
-            print("ZeroMQ Broker starting...")
+            print(f"ZeroMQ Broker starting... ({self.broker_name})")
             
-            # Setup sockets
+            # Setup sockets (bind is synchronous; READY on the control socket tells clients we relay)
             self.setup_sockets()
             
-            # Give sockets time to bind
-            time.sleep(0.5)
-            
             # Start monitor thread
             monitor_thread = threading.Thread(target=self.monitor_for_shutdown, daemon=True)
             monitor_thread.start()
             
-            # Run message relay in main thread
-            self.relay_messages()
+            # Subscribers connect to every shard, so one shard's table covers the whole bus
+            if self.socket_mode == 'xpub' and self.shard == 0:
+                tracker_thread = threading.Thread(target=self.track_subscriptions, daemon=True)
+                tracker_thread.start()
             
+            # Run message relay in main thread
+            if self.mode == 'proxy':
+                self.proxy_messages()
+            else:
+                self.relay_messages()
+        
         except Exception as e:
             crash_logger("zeromq_broker", e)
             print(f"Broker error: {e}")
+            self.failed = True
         finally:
             self.shutdown()
+        
+        # A crash must exit non-zero, or main.py's supervisor takes it for a requested stop
+        if self.failed:
+            sys.exit(1)
     
     def shutdown(self):
         """Clean shutdown of the broker."""
@@ -134,20 +478,76 @@ class MessageBroker:
             self.frontend.close()
         if self.backend:
             self.backend.close()
+        if self.control:
+            self.control.close()
+        if self.proxy_control:
+            self.proxy_control.close()
+        if self.capture:
+            self.capture.close()
         if self.monitor:
             self.monitor.close()
         
-        # Terminate context
-        if self.context:
+        # Terminate context (a shared context belongs to the hosting process)
+        if self.context and self.owns_context:
             self.context.term()
         
         print(f"{self.broker_name}: Shutdown complete ✅")
 
+def run_shards(shards, transport=None, **broker_options):
+    """Host every shard in this process, one thread each, on a shared context."""
+    context = context_for(transport, ZEROMQ_IO_THREADS)
+    brokers = [MessageBroker(transport=transport, shard=shard, shards=shards, context=context, **broker_options)
+               for shard in range(shards)]
+    threads = [threading.Thread(target=broker.start, daemon=True) for broker in brokers]
+    for thread in threads:
+        thread.start()
+    
+    try:
+        # Short joins keep the main thread responsive to Ctrl+C
+        while any(thread.is_alive() for thread in threads):
+            for thread in threads:
+                thread.join(0.5)
+    except KeyboardInterrupt:
+        print("\nZeroMQ Broker: Received interrupt signal, stopping all shards...")
+        for broker in brokers:
+            broker.stop_relay()
+        for thread in threads:
+            thread.join(5)
+    
+    if owns_context(transport):
+        context.term()
+    if any(broker.failed for broker in brokers):
+        sys.exit(1)
+
 def main():
     """Main entry point."""
     try:
-        broker = MessageBroker()
-        broker.start()
+        mode = BROKER_MODE
+        if '--mode' in sys.argv:
+            mode = sys.argv[sys.argv.index('--mode') + 1]
+        
+        socket_mode = BROKER_SOCKET_MODE
+        if '--socket-mode' in sys.argv:
+            socket_mode = sys.argv[sys.argv.index('--socket-mode') + 1]
+        
+        transport = None
+        if '--transport' in sys.argv:
+            transport = sys.argv[sys.argv.index('--transport') + 1]
+        
+        broker_options = {
+            'mode': mode,
+            'capture_enabled': BROKER_CAPTURE_ENABLED or '--capture' in sys.argv,
+            'socket_mode': socket_mode,
+        }
+        
+        if '--shard' in sys.argv:
+            # One shard per process (BROKER_SHARD_MODE = 'process'; main.py starts each)
+            shard = int(sys.argv[sys.argv.index('--shard') + 1])
+            MessageBroker(transport=transport, shard=shard, **broker_options).start()
+        elif BROKER_SHARDS > 1:
+            run_shards(BROKER_SHARDS, transport, **broker_options)
+        else:
+            MessageBroker(transport=transport, **broker_options).start()
     except Exception as e:
         crash_logger("zeromq_broker_startup", e)
         print(f"Failed to start ZeroMQ Broker: {e}")
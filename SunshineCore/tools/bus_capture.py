@@ -0,0 +1,282 @@
+import sys
+import os
+import gzip
+import time
+import struct
+import signal
+import argparse
+import itertools
+import uuid
+from collections import Counter
+
+# Add src directory to path for imports
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import zmq
+from utils.endpoints import FRONTEND, BACKEND, CAPTURE, connect_endpoints, shard_for_type
+from utils.wire import (encode_message, decode_frames, is_legacy, parse_topic, build_topic, type_subscription,
+                        WIRE_FORMAT_LEGACY)
+from utils.codec import encode_body, body_codec, now_ns
+
+# Capture file layout (gzip-compressed when the name ends in .gz):
+#   header - MAGIC, then the wall-clock start of the capture in epoch ns
+#   record - offset from the start in ns and the frame count, then per frame its length and bytes
+# Frames are stored exactly as they crossed the bus (topic + one or more bodies, or a legacy
+# single JSON frame), so a capture keeps each sender's codec and batching.
+MAGIC = b"SUNCAP1\n"
+FILE_HEADER = struct.Struct('<Q')
+RECORD_HEADER = struct.Struct('<QH')
+FRAME_LENGTH = struct.Struct('<I')
+
+# Sources to record from:
+#   backend - subscribe to the broker like a comet; works with every broker, but in XPUB mode
+#             the capture's subscription makes publishers send all their traffic
+#   capture - the broker's capture socket (start the broker with --capture); also carries the
+#             subscription frames, which are skipped
+SOURCES = ('backend', 'capture')
+
+def open_capture(path, mode):
+    """Open a capture file for 'rb' or 'wb', gzip-compressed when the name ends in .gz."""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode)
+    return open(path, mode)
+
+def write_record(f, offset_ns, frames):
+    f.write(RECORD_HEADER.pack(offset_ns, len(frames)))
+    for frame in frames:
+        f.write(FRAME_LENGTH.pack(len(frame)))
+        f.write(frame)
+
+def read_exact(f, size):
+    data = f.read(size)
+    return data if len(data) == size else None
+
+def read_capture(path):
+    """Return (start epoch ns, generator of (offset ns, frames)); a truncated tail ends the records."""
+    f = open_capture(path, 'rb')
+    if read_exact(f, len(MAGIC)) != MAGIC:
+        f.close()
+        raise ValueError(f"{path} is not a Sunshine capture file")
+    start_ns, = FILE_HEADER.unpack(read_exact(f, FILE_HEADER.size))
+    
+    def records():
+        with f:
+            while True:
+                header = read_exact(f, RECORD_HEADER.size)
+                if header is None:
+                    return
+                offset_ns, count = RECORD_HEADER.unpack(header)
+                frames = []
+                for _ in range(count):
+                    length = read_exact(f, FRAME_LENGTH.size)
+                    frame = read_exact(f, FRAME_LENGTH.unpack(length)[0]) if length else None
+                    if frame is None:
+                        return
+                    frames.append(frame)
+                yield offset_ns, frames
+    
+    return start_ns, records()
+
+def is_subscription(frames):
+    """True for XPUB subscribe/unsubscribe frames (b'\\x01' / b'\\x00' + prefix)."""
+    return len(frames) == 1 and frames[0][:1] in (b"\x00", b"\x01")
+
+def frames_type(frames):
+    """Message type of captured frames (legacy frames have to be decoded)."""
+    if is_legacy(frames):
+        try:
+            return decode_frames(frames)[0].get('message_type', '')
+        except ValueError:
+            return ''
+    return parse_topic(frames[0])[0]
+
+def record(args):
+    """Write bus traffic to a capture file until the duration/count is reached or Ctrl+C."""
+    context = zmq.Context()
+    sock = context.socket(zmq.SUB)
+    sock.setsockopt(zmq.RCVHWM, 0)  # Never drop traffic on our side
+    sock.setsockopt(zmq.LINGER, 0)
+    for endpoint in connect_endpoints(BACKEND if args.source == 'backend' else CAPTURE):
+        sock.connect(endpoint)
+    if args.source == 'backend' and args.types:
+        for message_type in args.types:
+            sock.setsockopt(zmq.SUBSCRIBE, type_subscription(message_type))
+    else:
+        sock.setsockopt(zmq.SUBSCRIBE, b"")
+    types = set(args.types or [])
+    
+    stopping = []
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+    
+    start_ns = now_ns()
+    start = time.monotonic_ns()
+    deadline = start + int(args.duration * 1e9) if args.duration else None
+    written = 0
+    print(f"🎙️  Recording from the broker {args.source} to {args.output} (Ctrl+C to stop)")
+    with open_capture(args.output, 'wb') as f:
+        f.write(MAGIC + FILE_HEADER.pack(start_ns))
+        while not stopping and (args.count is None or written < args.count):
+            if deadline and time.monotonic_ns() >= deadline:
+                break
+            if not sock.poll(100):
+                continue
+            frames = sock.recv_multipart()
+            if is_subscription(frames) or (types and frames_type(frames) not in types):
+                continue
+            write_record(f, time.monotonic_ns() - start, frames)
+            written += 1
+    
+    sock.close()
+    context.term()
+    print(f"✅ Recorded {written} multipart messages in {(time.monotonic_ns() - start) / 1e9:.1f}s")
+
+class Restamper:
+    """Rewrites replayed messages: senders, fresh sequence stamps and (optionally) timestamps."""
+    
+    def __init__(self, sender=None, renames=None, keep_timestamps=False):
+        self.sender = sender
+        self.renames = renames or {}
+        self.keep_timestamps = keep_timestamps
+        self.session = uuid.uuid4().hex[:12]
+        self.sequences = {}  # sender -> itertools.count()
+    
+    def rewrite(self, frames):
+        """Re-encode captured frames, each body with the codec it was captured in."""
+        messages = decode_frames(frames)
+        for message in messages:
+            sender = self.sender or self.renames.get(message.get('sender'), message.get('sender'))
+            message['sender'] = sender
+            # A replay is a new session for every sender, so sequence tracking sees no false gaps
+            message['session'] = self.session
+            message['seq'] = next(self.sequences.setdefault(sender, itertools.count()))
+            message['mono_ns'] = time.monotonic_ns()
+            if not self.keep_timestamps:
+                message['timestamp_ns'] = now_ns()
+                message.pop('datetime', None)
+        
+        if is_legacy(frames):
+            return encode_message(messages[0], WIRE_FORMAT_LEGACY)
+        _, _, target = parse_topic(frames[0])
+        topic = build_topic(messages[0]['message_type'], messages[0].get('sender', ''), target)
+        return [topic] + [encode_body(message, body_codec(body)) for message, body in zip(messages, frames[1:])]
+
+def replay(args):
+    """Publish a capture into the broker frontend at the original pace scaled by --speed."""
+    restamper = None if args.raw else Restamper(args.sender, dict(args.rename or []), args.keep_timestamps)
+    types = set(args.types or [])
+    exclude = set(args.exclude_types or [])
+    
+    context = zmq.Context()
+    publishers = []
+    for endpoint in connect_endpoints(FRONTEND):
+        publisher = context.socket(zmq.PUB)
+        publisher.setsockopt(zmq.SNDHWM, 0)
+        publisher.setsockopt(zmq.LINGER, 2000)
+        publisher.connect(endpoint)
+        publishers.append(publisher)
+    time.sleep(1)  # Subscriptions must reach our PUB sockets first or the start of the replay is lost
+    
+    stopping = []
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+    
+    speed = f"{args.speed:g}x" if args.speed else "max speed"
+    print(f"▶️  Replaying {args.capture} at {speed}")
+    sent = 0
+    start = time.monotonic_ns()
+    for _ in range(args.repeat):
+        _, records = read_capture(args.capture)
+        first_offset = None
+        loop_start = time.monotonic_ns()
+        for offset_ns, frames in records:
+            if stopping:
+                break
+            message_type = frames_type(frames)
+            if (types and message_type not in types) or message_type in exclude:
+                continue
+            
+            if args.speed:
+                if first_offset is None:
+                    first_offset = offset_ns
+                delay = loop_start + (offset_ns - first_offset) / args.speed - time.monotonic_ns()
+                if delay > 0:
+                    time.sleep(delay / 1e9)
+            
+            if restamper:
+                frames = restamper.rewrite(frames)
+            publisher = publishers[0]
+            if len(publishers) > 1 and not is_legacy(frames):
+                publisher = publishers[shard_for_type(message_type, len(publishers))]
+            publisher.send_multipart(frames)
+            sent += 1
+        if stopping:
+            break
+    
+    elapsed = (time.monotonic_ns() - start) / 1e9
+    for publisher in publishers:
+        publisher.close()
+    context.term()
+    print(f"✅ Replayed {sent} multipart messages in {elapsed:.1f}s ({sent / max(elapsed, 1e-9):,.0f}/s)")
+
+def info(args):
+    """Summarize a capture file: duration and message counts by type and sender."""
+    start_ns, records = read_capture(args.capture)
+    by_type = Counter()
+    by_sender = Counter()
+    last_offset = 0
+    total_bytes = 0
+    for offset_ns, frames in records:
+        last_offset = offset_ns
+        total_bytes += sum(len(frame) for frame in frames)
+        messages = decode_frames(frames)
+        for message in messages:
+            by_type[message.get('message_type', '')] += 1
+            by_sender[message.get('sender', '')] += 1
+    
+    print(f"{args.capture}: started {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(start_ns / 1e9))}, "
+          f"{last_offset / 1e9:.1f}s, {sum(by_type.values())} messages, {total_bytes:,} bytes on the wire")
+    for title, counts in (("Type", by_type), ("Sender", by_sender)):
+        print(f"\n{title:<32} {'Messages':>10}")
+        for name, count in counts.most_common():
+            print(f"{name:<32} {count:>10}")
+
+def rename_pair(value):
+    old, separator, new = value.partition('=')
+    if not separator or not old or not new:
+        raise argparse.ArgumentTypeError("expected OLD=NEW")
+    return old, new
+
+def main():
+    parser = argparse.ArgumentParser(description="Record Sunshine bus traffic and replay it into a broker")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    record_parser = commands.add_parser('record', help="Write bus traffic to a capture file")
+    record_parser.add_argument('output', help="Capture file (.gz for compression)")
+    record_parser.add_argument('--source', choices=SOURCES, default='backend')
+    record_parser.add_argument('--types', nargs='+', help="Only record these message types")
+    record_parser.add_argument('--duration', type=float, help="Stop after this many seconds")
+    record_parser.add_argument('--count', type=int, help="Stop after this many multipart messages")
+    
+    replay_parser = commands.add_parser('replay', help="Publish a capture file into the broker")
+    replay_parser.add_argument('capture')
+    replay_parser.add_argument('--speed', type=float, default=1, help="Time scale, e.g. 1, 10 or 0 for max speed")
+    replay_parser.add_argument('--types', nargs='+', help="Only replay these message types")
+    replay_parser.add_argument('--exclude-types', nargs='+', help="Skip these message types")
+    replay_parser.add_argument('--sender', help="Send everything as this sender")
+    replay_parser.add_argument('--rename', type=rename_pair, action='append', metavar='OLD=NEW',
+                               help="Rewrite one sender (repeatable)")
+    replay_parser.add_argument('--keep-timestamps', action='store_true',
+                               help="Keep the captured timestamp_ns instead of the replay time")
+    replay_parser.add_argument('--raw', action='store_true',
+                               help="Send the captured frames unchanged (no rewriting or restamping)")
+    replay_parser.add_argument('--repeat', type=int, default=1, help="Play the capture this many times")
+    
+    info_parser = commands.add_parser('info', help="Summarize a capture file")
+    info_parser.add_argument('capture')
+    
+    args = parser.parse_args()
+    if args.command == 'replay' and args.raw and (args.sender or args.rename):
+        parser.error("--raw cannot rewrite senders")
+    {'record': record, 'replay': replay, 'info': info}[args.command](args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import sys
+import os
+import re
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+# What each role of main.py imports before it does any work. 'main' is the module itself,
+# which every role (and every re-exec of the production binary) pays for.
+ROLES = {
+    'main': ['main'],
+    'broker': ['main', 'zeromq.broker'],
+    'subprocess': ['main', 'subprocesses.registry', 'subprocesses.base_subprocess'],
+    'control_panel': ['main', 'subprocesses.registry', 'subprocesses.control_panel.main'],
+    'system': ['main', 'auth.startup', 'subprocesses.registry', 'utils.plugin_launcher', 'utils.broker_control'],
+}
+
+# Only the web-facing roles may load the web stack
+WEB_MODULES = ('flask', 'flask_socketio', 'werkzeug', 'jinja2', 'socketio', 'engineio')
+FORBIDDEN = {
+    'main': WEB_MODULES,
+    'broker': WEB_MODULES,
+    'subprocess': WEB_MODULES,
+}
+
+# Median cumulative import time per role in milliseconds; generous, so a failure means a
+# heavy import crept in rather than a slow machine
+BUDGET_MS = {
+    'main': 30,
+    'broker': 150,
+    'subprocess': 150,
+}
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)')
+
+# The child prints its peak RSS (KB; ru_maxrss is bytes on macOS, unavailable on Windows)
+RSS_PROBE = ("import sys, resource; rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss; "
+             "print(rss // 1024 if sys.platform == 'darwin' else rss)")
+
+def parse_importtime(stderr):
+    """Per-module (self us, cumulative us, depth) from -X importtime output."""
+    modules = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            own, cumulative, indent, name = match.groups()
+            modules[name] = (int(own), int(cumulative), len(indent) // 2)
+    return modules
+
+def startup_modules(python=sys.executable):
+    """Modules the bare interpreter imports (site, .pth hooks); not charged to any role."""
+    result = subprocess.run([python, '-X', 'importtime', '-c', 'pass'], capture_output=True, text=True)
+    return set(parse_importtime(result.stderr))
+
+def measure_role(modules, startup, python=sys.executable):
+    """One cold interpreter importing a role's modules: import ms, wall ms, RSS KB, imported modules."""
+    code = '; '.join(f"import {module}" for module in modules)
+    if os.name != 'nt':
+        code += '; ' + RSS_PROBE
+    started = time.perf_counter()
+    result = subprocess.run([python, '-X', 'importtime', '-c', code], cwd=SRC_DIR, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {', '.join(modules)} failed:\n{result.stderr[-2000:]}")
+    
+    imported = parse_importtime(result.stderr)
+    import_ms = sum(cumulative for name, (_, cumulative, depth) in imported.items()
+                    if depth == 0 and name not in startup) / 1000
+    rss_kb = int(result.stdout.strip().splitlines()[-1]) if os.name != 'nt' else None
+    return import_ms, wall_ms, rss_kb, imported
+
+def check_role(role, runs, startup):
+    """Measure a role several times; returns its result row including budget violations."""
+    samples = [measure_role(ROLES[role], startup) for _ in range(runs)]
+    imported = samples[-1][3]
+    import_ms = statistics.median(sample[0] for sample in samples)
+    violations = []
+    
+    loaded = sorted({name.split('.')[0] for name in imported} & set(FORBIDDEN.get(role, ())))
+    if loaded:
+        violations.append(f"imports {', '.join(loaded)}")
+    if role in BUDGET_MS and import_ms > BUDGET_MS[role]:
+        violations.append(f"import time {import_ms:.0f} ms > budget {BUDGET_MS[role]} ms")
+    
+    heaviest = sorted(((cumulative, name) for name, (_, cumulative, depth) in imported.items()
+                       if depth <= 1 and name not in startup), reverse=True)[:5]
+    return {
+        'role': role,
+        'import_ms': round(import_ms, 1),
+        'wall_ms': round(statistics.median(sample[1] for sample in samples), 1),
+        'rss_kb': samples[-1][2],
+        'modules': len(imported),
+        'heaviest': [(name, round(cumulative / 1000, 1)) for cumulative, name in heaviest],
+        'violations': violations
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the import-time budget of each main.py role")
+    parser.add_argument('roles', nargs='*', help=f"Roles to check: {', '.join(ROLES)} (default: all)")
+    parser.add_argument('--runs', type=int, default=5, help="Cold interpreter runs per role (median is reported)")
+    parser.add_argument('--json', help="Also write the results to this file")
+    parser.add_argument('--verbose', action='store_true', help="Show the heaviest imports of each role")
+    args = parser.parse_args()
+    unknown = [role for role in args.roles if role not in ROLES]
+    if unknown:
+        parser.error(f"unknown role(s): {', '.join(unknown)}")
+    
+    startup = startup_modules()
+    results = [check_role(role, args.runs, startup) for role in args.roles or ROLES]
+    
+    print(f"{'Role':<15} {'Import ms':>10} {'Process ms':>11} {'RSS MB':>8} {'Modules':>8}  Budget")
+    for row in results:
+        rss = f"{row['rss_kb'] / 1024:.1f}" if row['rss_kb'] else '-'
+        status = '❌ ' + '; '.join(row['violations']) if row['violations'] else '✅'
+        print(f"{row['role']:<15} {row['import_ms']:>10.1f} {row['wall_ms']:>11.1f} {rss:>8} {row['modules']:>8}  {status}")
+        if args.verbose:
+            for name, cumulative_ms in row['heaviest']:
+                print(f"{'':<15}   {cumulative_ms:>8.1f} ms  {name}")
+    
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+    
+    if any(row['violations'] for row in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
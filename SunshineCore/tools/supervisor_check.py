@@ -0,0 +1,80 @@
+import sys
+import os
+import argparse
+import subprocess
+
+SRC_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+sys.path.append(SRC_DIR)
+
+from utils.supervisor import Supervisor, restart_policy, LIFECYCLE_EXITED, LIFECYCLE_RESTARTING, LIFECYCLE_GAVE_UP
+
+# Runs real BaseSubProcess roles under the real Supervisor and checks that the restart policy
+# tells failures from requested stops: a role whose main loop crashes must exit non-zero and be
+# restarted until it runs out of restarts, while a role that receives SHUTDOWN must exit 0 and
+# stay stopped under the default 'on-failure' policy. The roles skip registration (there is no
+# ControlPanel) and their sockets connect to the configured endpoints, where nothing needs to run.
+ROLE_SCRIPT = """
+import sys
+from subprocesses.base_subprocess import BaseSubProcess
+from utils.message_types import MSG_SHUTDOWN
+
+class CheckRole(BaseSubProcess):
+    def main_loop(self):
+        if sys.argv[1] == 'crash':
+            raise RuntimeError("main loop crashed on purpose")
+        self.handle_message({'message_type': MSG_SHUTDOWN, 'sender': 'SupervisorCheck', 'payload': {'target': '*'}})
+
+role = CheckRole(f"SupervisorCheck-{sys.argv[1]}")
+role.setup_zmq()
+role.run_main_loop()
+"""
+
+SCENARIOS = {
+    # scenario: (expected exit codes, expected restarts, gives up)
+    'crash': ([1, 1, 1], 2, True),
+    'shutdown': ([0], 0, False),
+}
+
+class RecordingSupervisor(Supervisor):
+    """Supervisor that also keeps the lifecycle events it publishes."""
+    
+    def __init__(self):
+        super().__init__()
+        self.events = []
+    
+    def publish(self, event, process, **details):
+        self.events.append((process.name, event, details))
+        super().publish(event, process, **details)
+
+def start_role(scenario, verbose):
+    output = None if verbose else subprocess.DEVNULL
+    return lambda: subprocess.Popen([sys.executable, '-c', ROLE_SCRIPT, scenario], cwd=SRC_DIR,
+                                    stdout=output, stderr=output)
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that crashed roles are restarted and SHUTDOWN'd ones are not")
+    parser.add_argument('--verbose', action='store_true', help="Show the roles' console output")
+    args = parser.parse_args()
+    
+    supervisor = RecordingSupervisor()
+    policy = {'restart': 'on-failure', 'max_restarts': 2, 'restart_backoff': 0.05}
+    for scenario in SCENARIOS:
+        supervisor.add(scenario, start_role(scenario, args.verbose), policy=restart_policy(policy))
+    supervisor.run()
+    
+    failures = 0
+    print(f"\n{'Role':<10} {'Exit codes':<16} {'Restarts':>8}  {'Gave up':<8} Result")
+    for scenario, (codes, restarts, gives_up) in SCENARIOS.items():
+        events = [(event, details) for name, event, details in supervisor.events if name == scenario]
+        exit_codes = [details['returncode'] for event, details in events if event == LIFECYCLE_EXITED]
+        restarted = len([event for event, _ in events if event == LIFECYCLE_RESTARTING])
+        gave_up = any(event == LIFECYCLE_GAVE_UP for event, _ in events)
+        ok = exit_codes == codes and restarted == restarts and gave_up == gives_up
+        failures += not ok
+        print(f"{scenario:<10} {str(exit_codes):<16} {restarted:>8}  {str(gave_up):<8} "
+              f"{'✅' if ok else f'❌ expected {codes}, {restarts} restart(s), gave up {gives_up}'}")
+    
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -112,9 +112,34 @@ echo "✅ Created comet/src/corona/crash_handler.py"
 
 # Create SolarFlare
 cat > CometExample/comet/src/corona/SolarFlare.py << 'EOF'
+import json
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Any
+from typing import Any, Optional
+
+try:
+    import msgpack
+except ImportError:  # Optional; only needed for the binary codec
+    msgpack = None
+
+# Wire format: [topic, body] where topic is
+#   [b"@" + target + b"\x00"] + type + b"\x00" + sender
+# so ZeroMQ can filter subscriptions by prefix. A batch carries several bodies
+# after one topic: [topic, body1, body2, ...]. Single-frame JSON is still accepted.
+TOPIC_SEPARATOR = b"\x00"
+TARGET_PREFIX = b"@"
+LEGACY_PREFIX = b"{"
+
+# Body codecs. Binary bodies start with 0xC1 (never emitted by msgpack),
+# JSON bodies with '{', so every message carries its own format.
+CODEC_JSON = "json"
+CODEC_MSGPACK = "msgpack"
+BINARY_MARKER = b"\xc1"
+
+# Optional fields carried next to the payload when set
+ENVELOPE_FIELDS = ('target', 'correlation_id', 'reply_to', 'in_reply_to', 'error')
+# Stamped by the Satellite on every sent flare so receivers can detect loss, reordering and latency
+SEQUENCE_FIELDS = ('session', 'seq', 'mono_ns')
 
 @dataclass
 class SolarFlare:
@@ -123,64 +148,221 @@ class SolarFlare:
     name: str  # Sender's name
     type: str  # Message type
     payload: Any  # Flexible payload
+    target: Optional[str] = None  # Receiving Comet, or None for a broadcast
+    correlation_id: Optional[str] = None  # Set on requests (see corona/rpc.py)
+    reply_to: Optional[str] = None  # Who a request's reply goes to
+    in_reply_to: Optional[str] = None  # Set on replies: the request's correlation_id
+    error: Optional[str] = None  # Set on replies when the request failed
+    session: Optional[str] = None  # Sender's random id for this run
+    seq: Optional[int] = None  # Sender's sequence number within the session (0, 1, 2, ...)
+    mono_ns: Optional[int] = None  # Sender's time.monotonic_ns() when sent
     
     def to_dict(self):
         """Convert to dictionary for JSON serialization."""
-        return {
+        data = {
             'datetime': self.timestamp.isoformat(),
             'message_type': self.type,
             'sender': self.name,
             'payload': self.payload
         }
+        return self._add_envelope(data)
+    
+    def to_binary_dict(self):
+        """Convert to dictionary for the binary codec (integer epoch-nanosecond timestamp)."""
+        data = {
+            'timestamp_ns': int(self.timestamp.timestamp() * 1e9),
+            'message_type': self.type,
+            'sender': self.name,
+            'payload': self.payload
+        }
+        return self._add_envelope(data)
+    
+    def _add_envelope(self, data):
+        """Add the optional addressing and request/reply fields that are set."""
+        for key in ENVELOPE_FIELDS:
+            value = getattr(self, key)
+            if value:
+                data[key] = value
+        for key in SEQUENCE_FIELDS:
+            value = getattr(self, key)
+            if value is not None:
+                data[key] = value
+        return data
     
     @classmethod
     def from_dict(cls, data):
         """Create SolarFlare from dictionary."""
+        if data.get('timestamp_ns') is not None:
+            timestamp = datetime.fromtimestamp(data['timestamp_ns'] / 1e9)
+        else:
+            timestamp = datetime.fromisoformat(data['datetime'])
         return cls(
-            timestamp=datetime.fromisoformat(data['datetime']),
+            timestamp=timestamp,
             name=data['sender'],
             type=data['message_type'],
-            payload=data.get('payload', {})
+            payload=data.get('payload', {}),
+            **{key: data.get(key) for key in ENVELOPE_FIELDS + SEQUENCE_FIELDS}
         )
+    
+    def topic(self):
+        """Topic frame used by subscribers to filter messages inside ZeroMQ."""
+        topic = self.type.encode('utf-8') + TOPIC_SEPARATOR + self.name.encode('utf-8')
+        if self.target:
+            topic = TARGET_PREFIX + self.target.encode('utf-8') + TOPIC_SEPARATOR + topic
+        return topic
+    
+    def to_frames(self, codec=CODEC_JSON):
+        """Encode as [topic, body] for send_multipart."""
+        if codec == CODEC_MSGPACK and msgpack is not None:
+            body = BINARY_MARKER + msgpack.packb(self.to_binary_dict(), use_bin_type=True)
+        else:
+            body = json.dumps(self.to_dict()).encode('utf-8')
+        return [self.topic(), body]
+    
+    @classmethod
+    def from_body(cls, body):
+        """Decode a single body frame (JSON or binary)."""
+        if body[:1] == BINARY_MARKER:
+            if msgpack is None:
+                raise ValueError("Received a binary SolarFlare but msgpack is not installed")
+            return cls.from_dict(msgpack.unpackb(body[1:], raw=False))
+        return cls.from_dict(json.loads(body))
+    
+    @classmethod
+    def from_frames(cls, frames):
+        """Decode multipart frames (single or batched), or a legacy single JSON frame, into a list of flares."""
+        if len(frames) == 1:
+            return [cls.from_body(frames[0])]
+        return [cls.from_body(body) for body in frames[1:]]
+    
+    @staticmethod
+    def type_subscription(message_type):
+        """Subscription prefix matching broadcasts of a message type."""
+        return message_type.encode('utf-8') + TOPIC_SEPARATOR
+    
+    @staticmethod
+    def target_subscription(comet_name):
+        """Subscription prefix matching messages addressed to a Comet."""
+        return TARGET_PREFIX + comet_name.encode('utf-8') + TOPIC_SEPARATOR
 EOF
 echo "✅ Created comet/src/corona/SolarFlare.py"
 
 # Create Satellite
 cat > CometExample/comet/src/corona/Satellite.py << 'EOF'
+import os
+import zlib
 import zmq
-import json
 import threading
 import time
-from queue import Queue
-from .SolarFlare import SolarFlare
+import itertools
+import uuid
+from datetime import datetime
+from queue import Queue, Empty
+from .SolarFlare import SolarFlare, LEGACY_PREFIX, CODEC_JSON
+
+# Broker endpoints; Sunshine sets these for every Comet it launches (tcp:// or ipc://).
+# A sharded broker gives a comma-separated list with one endpoint per shard.
+PUBLISH_ENDPOINTS = os.environ.get("SUNSHINE_ZMQ_FRONTEND", "tcp://localhost:5555").split(",")
+SUBSCRIBE_ENDPOINTS = os.environ.get("SUNSHINE_ZMQ_BACKEND", "tcp://localhost:5556").split(",")
+
+# System messages are never held back in a batch
+IMMEDIATE_TYPES = {"REGISTER", "REGISTER_ACK", "PING", "PONG", "SHUTDOWN", "SHUTDOWN_ACK"}
+
+# Sent by the Satellite to itself through every shard until it comes back, like SunshineCore's subprocesses
+MSG_BUS_PROBE = "BUS_PROBE"
+BUS_READY_TIMEOUT = 10  # Seconds connect() waits for the probes before carrying on regardless
+BUS_PROBE_INTERVAL_MS = 20  # Probes are resent this often until they come back
+
+# Marks "no flare carried over" in the send loop (None is the shutdown sentinel)
+_NOTHING = object()
 
 class Satellite:
     """ZeroMQ connection handler for Comet communication."""
     
-    def __init__(self, comet_name: str, in_queue: Queue, out_queue: Queue, subscribe_filters: list):
+    def __init__(self, comet_name: str, in_queue: Queue, out_queue: Queue, subscribe_filters: list,
+                 codec: str = CODEC_JSON, batching: bool = False, batch_max_messages: int = 64,
+                 batch_max_delay_us: int = 1000):
         self.comet_name = comet_name
         self.in_queue = in_queue
         self.out_queue = out_queue
         self.subscribe_filters = subscribe_filters
+        self.codec = codec
+        self.batching = batching
+        self.batch_max_messages = batch_max_messages
+        self.batch_max_delay = batch_max_delay_us / 1e6
         self.context = zmq.Context()
-        self.publisher = None
+        self.publishers = []  # One per broker shard
         self.subscriber = None
+        self.wake_sender = None
+        self.wake_receiver = None
         self.running = True
+        # Sequence stamp of every sent flare; only the send loop touches these
+        self.session = uuid.uuid4().hex[:12]
+        self.sequence = itertools.count()
         
     def connect(self):
         """Establish ZeroMQ connections."""
-        # Publisher socket
-        self.publisher = self.context.socket(zmq.PUB)
-        self.publisher.connect("tcp://localhost:5555")
+        # Publisher sockets, one per broker shard; each flare type always uses the same shard
+        for endpoint in PUBLISH_ENDPOINTS:
+            publisher = self.context.socket(zmq.PUB)
+            publisher.connect(endpoint)
+            self.publishers.append(publisher)
         
         # Subscriber socket
         self.subscriber = self.context.socket(zmq.SUB)
-        self.subscriber.connect("tcp://localhost:5556")
-        self.subscriber.setsockopt(zmq.SUBSCRIBE, b"")
-        self.subscriber.setsockopt(zmq.RCVTIMEO, 100)
+        # Subscribing on every shard delivers all traffic whichever shard carried it
+        for endpoint in SUBSCRIBE_ENDPOINTS:
+            self.subscriber.connect(endpoint)
+        if "*" in self.subscribe_filters:
+            self.subscriber.setsockopt(zmq.SUBSCRIBE, b"")
+        else:
+            # Filter by topic prefix so ZeroMQ drops unwanted messages for us
+            for message_type in self.subscribe_filters:
+                self.subscriber.setsockopt(zmq.SUBSCRIBE, SolarFlare.type_subscription(message_type))
+            self.subscriber.setsockopt(zmq.SUBSCRIBE, SolarFlare.target_subscription(self.comet_name))
+            # Legacy single-frame senders have no topic; filtered in _receive_loop
+            self.subscriber.setsockopt(zmq.SUBSCRIBE, LEGACY_PREFIX)
         
-        # Give sockets time to connect
-        time.sleep(0.5)
+        # Wake-up pair so the receiver can block in poll() and still exit on shutdown
+        wake_endpoint = f"inproc://satellite-wake-{id(self)}"
+        self.wake_receiver = self.context.socket(zmq.PAIR)
+        self.wake_receiver.bind(wake_endpoint)
+        self.wake_sender = self.context.socket(zmq.PAIR)
+        self.wake_sender.connect(wake_endpoint)
+        
+        if not self.wait_for_bus():
+            print(f"⚠️  {self.comet_name}: Bus probe not answered within {BUS_READY_TIMEOUT}s, continuing anyway")
+    
+    # A PUB socket silently drops what it sends before its connection (and the broker's view of
+    # our subscriptions) is in place, so instead of sleeping we send a BUS_PROBE addressed to
+    # ourselves through every shard until each one comes back on our subscriber.
+    def wait_for_bus(self, timeout=BUS_READY_TIMEOUT):
+        """Block until our publishers and subscriber work through every broker shard; True if they do."""
+        acked = set()
+        deadline = time.monotonic() + timeout
+        while len(acked) < len(self.publishers) and time.monotonic() < deadline:
+            for shard, publisher in enumerate(self.publishers):
+                if shard in acked:
+                    continue
+                probe = SolarFlare(timestamp=datetime.now(), name=self.comet_name, type=MSG_BUS_PROBE,
+                                   payload={'shard': shard}, target=self.comet_name)
+                publisher.send_multipart(probe.to_frames(self.codec))
+            
+            # The receive loop is not running yet: take the probes here and keep anything else
+            if self.subscriber.poll(BUS_PROBE_INTERVAL_MS):
+                while self.subscriber.poll(0):
+                    for flare in SolarFlare.from_frames(self.subscriber.recv_multipart()):
+                        if flare.type == MSG_BUS_PROBE and flare.name == self.comet_name:
+                            acked.add(flare.payload.get('shard'))
+                        elif self._accepts(flare):
+                            self.in_queue.put(flare)
+        return len(acked) == len(self.publishers)
+    
+    def _accepts(self, flare):
+        """True for flares this Comet subscribed to or that are addressed to it (our late bus probes excluded)."""
+        if flare.type == MSG_BUS_PROBE:
+            return False
+        return "*" in self.subscribe_filters or flare.type in self.subscribe_filters or flare.target == self.comet_name
     
     def start(self):
         """Start receiver and sender threads."""
@@ -191,49 +373,243 @@ class Satellite:
     
     def _receive_loop(self):
         """Receive messages and filter them into the in_queue."""
+        poller = zmq.Poller()
+        poller.register(self.subscriber, zmq.POLLIN)
+        poller.register(self.wake_receiver, zmq.POLLIN)
+        
         while self.running:
             try:
-                raw_message = self.subscriber.recv(zmq.NOBLOCK)
-                data = json.loads(raw_message.decode('utf-8'))
-                flare = SolarFlare.from_dict(data)
+                # Block until a message arrives or shutdown wakes us
+                socks = dict(poller.poll())
+                if self.wake_receiver in socks:
+                    self.wake_receiver.recv()
+                    continue
                 
-                # Filter messages based on subscribe list
-                if "*" in self.subscribe_filters or flare.type in self.subscribe_filters:
-                    self.in_queue.put(flare)
+                frames = self.subscriber.recv_multipart()
+                for flare in SolarFlare.from_frames(frames):
+                    # Filter messages based on subscribe list
+                    if self._accepts(flare):
+                        self.in_queue.put(flare)
                     
-            except zmq.Again:
-                time.sleep(0.01)
+            except zmq.ContextTerminated:
+                break
             except Exception as e:
                 if self.running:
                     print(f"Satellite receive error: {e}")
     
     def _send_loop(self):
         """Send messages from out_queue."""
-        while self.running:
+        carried = _NOTHING
+        while True:
             try:
-                if not self.out_queue.empty():
-                    flare = self.out_queue.get()
-                    message = json.dumps(flare.to_dict())
-                    self.publisher.send_string(message)
-                else:
-                    time.sleep(0.01)
+                # Block until there is something to send; None is the shutdown sentinel
+                flare = self.out_queue.get() if carried is _NOTHING else carried
+                carried = _NOTHING
+                if flare is None:
+                    break
+                
+                frames = self._stamp(flare).to_frames(self.codec)
+                if self.batching and flare.type not in IMMEDIATE_TYPES:
+                    carried = self._fill_batch(frames)
+                self._publisher_for(flare.type).send_multipart(frames)
             except Exception as e:
                 if self.running:
                     print(f"Satellite send error: {e}")
     
+    def _stamp(self, flare):
+        """Give a flare about to be sent its session, next seq and monotonic send time."""
+        flare.session = self.session
+        flare.seq = next(self.sequence)
+        flare.mono_ns = time.monotonic_ns()
+        return flare
+    
+    def _publisher_for(self, message_type):
+        """Publisher of the broker shard that carries a flare type (same crc32 rule as SunshineCore)."""
+        if len(self.publishers) == 1:
+            return self.publishers[0]
+        return self.publishers[zlib.crc32(message_type.encode('utf-8')) % len(self.publishers)]
+    
+    def _fill_batch(self, frames):
+        """Append queued flares with the same topic to frames; return the first flare that does not fit."""
+        deadline = time.monotonic() + self.batch_max_delay
+        while len(frames) - 1 < self.batch_max_messages:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                flare = self.out_queue.get(timeout=remaining)
+            except Empty:
+                break
+            
+            # A different topic or a system message ends the batch (keeps ordering)
+            if flare is None or flare.type in IMMEDIATE_TYPES:
+                return flare
+            if flare.topic() != frames[0]:
+                return flare
+            frames.append(self._stamp(flare).to_frames(self.codec)[1])
+        return _NOTHING
+    
     def shutdown(self):
         """Clean shutdown."""
         self.running = False
+        
+        # Wake both loops; the sender drains anything queued before the sentinel
+        self.out_queue.put(None)
+        try:
+            if self.wake_sender:
+                self.wake_sender.send(b"", zmq.NOBLOCK)
+        except zmq.ZMQError:
+            pass
+        
         time.sleep(0.5)
-        if self.publisher:
-            self.publisher.close()
+        for publisher in self.publishers:
+            publisher.close()
         if self.subscriber:
             self.subscriber.close()
+        if self.wake_sender:
+            self.wake_sender.close()
+        if self.wake_receiver:
+            self.wake_receiver.close()
         if self.context:
             self.context.term()
 EOF
 echo "✅ Created comet/src/corona/Satellite.py"
 
+# Create request/reply support
+cat > CometExample/comet/src/corona/rpc.py << 'EOF'
+import heapq
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+# SolarFlare fields used by request/reply:
+#   correlation_id - set on a request, unique per call
+#   reply_to       - process the reply must be addressed to
+#   in_reply_to    - set on a reply, the correlation_id it answers
+#   error          - set on a reply when the handler failed
+
+class RequestError(Exception):
+    """Raised through a request future when the remote handler reported an error."""
+    pass
+
+# Request types whose replies do not follow the "<TYPE>_RESPONSE" convention
+RESPONSE_TYPES = {
+    "SUNBOX_COMMAND": "SUNBOX_RESPONSE",
+    "CUSTOM_COMMAND": "CUSTOM_RESPONSE",
+}
+
+def response_type(message_type):
+    """Message type used for replies to a request type."""
+    return RESPONSE_TYPES.get(message_type, f"{message_type}_RESPONSE")
+
+def new_correlation_id():
+    """Unique id for an outgoing request."""
+    return uuid.uuid4().hex
+
+class RequestFuture(Future):
+    """Future for a reply; refuses to block the thread that delivers replies, which would deadlock."""
+    
+    def __init__(self, reply_thread=None):
+        super().__init__()
+        self.reply_thread = reply_thread
+    
+    def result(self, timeout=None):
+        self.check_thread()
+        return super().result(timeout)
+    
+    def exception(self, timeout=None):
+        self.check_thread()
+        return super().exception(timeout)
+    
+    def check_thread(self):
+        if not self.done() and threading.current_thread() is self.reply_thread:
+            raise RuntimeError("Waiting for a reply on the thread that receives replies would deadlock; "
+                               "use add_done_callback() there instead")
+
+class PendingRequests:
+    """Futures for requests in flight, resolved by replies or failed by a timeout reaper thread."""
+    
+    def __init__(self, owner):
+        self.owner = owner
+        self.reply_thread = None  # Thread that calls resolve(); its futures must not be waited on from it
+        self.lock = threading.Condition()
+        self.futures = {}  # correlation_id -> Future
+        self.deadlines = []  # heap of (deadline, correlation_id)
+        self.reaper_thread = None
+        self.running = True
+    
+    def create(self, timeout):
+        """Register a new request and return (correlation_id, future)."""
+        correlation_id = new_correlation_id()
+        future = RequestFuture(self.reply_thread)
+        future.set_running_or_notify_cancel()
+        
+        with self.lock:
+            self.futures[correlation_id] = future
+            heapq.heappush(self.deadlines, (time.monotonic() + timeout, correlation_id))
+            if self.reaper_thread is None:
+                self.reaper_thread = threading.Thread(target=self.reap_expired, daemon=True)
+                self.reaper_thread.start()
+            self.lock.notify()
+        return correlation_id, future
+    
+    def resolve(self, flare):
+        """Complete the future a reply belongs to. Returns False if the reply is not ours (or too late)."""
+        with self.lock:
+            future = self.futures.pop(flare.in_reply_to, None)
+        if future is None:
+            return False
+        
+        if flare.error:
+            future.set_exception(RequestError(flare.error))
+        else:
+            future.set_result(flare)
+        return True
+    
+    def discard(self, correlation_id):
+        """Forget a request whose send failed; returns its future."""
+        with self.lock:
+            return self.futures.pop(correlation_id, None)
+    
+    def reap_expired(self):
+        """Fail requests whose deadline has passed."""
+        with self.lock:
+            while self.running:
+                if not self.deadlines:
+                    self.lock.wait()
+                    continue
+                
+                deadline, correlation_id = self.deadlines[0]
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self.lock.wait(remaining)
+                    continue
+                
+                heapq.heappop(self.deadlines)
+                future = self.futures.pop(correlation_id, None)
+                if future is not None:
+                    future.set_exception(TimeoutError(f"{self.owner}: request {correlation_id} timed out"))
+    
+    def cancel_all(self):
+        """Fail every outstanding request (used on shutdown)."""
+        with self.lock:
+            self.running = False
+            futures = list(self.futures.values())
+            self.futures.clear()
+            self.deadlines.clear()
+            self.lock.notify()
+        
+        for future in futures:
+            future.set_exception(RequestError(f"{self.owner} is shutting down"))
+    
+    def __len__(self):
+        """Number of requests still waiting for a reply."""
+        with self.lock:
+            return len(self.futures)
+EOF
+echo "✅ Created comet/src/corona/rpc.py"
+
 # Create CometCore
 cat > CometExample/comet/src/corona/CometCore.py << 'EOF'
 import sys
@@ -242,8 +618,10 @@ import time
 import threading
 from queue import Queue
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 from .SolarFlare import SolarFlare
 from .Satellite import Satellite
+from .rpc import PendingRequests, response_type
 from .crash_handler import setup_crash_handler, log_crash
 
 class CometCore:
@@ -257,8 +635,12 @@ class CometCore:
     MSG_SHUTDOWN = "SHUTDOWN"
     MSG_SHUTDOWN_ACK = "SHUTDOWN_ACK"
     
+    # Request handlers run on this many worker threads, never on the system message thread
+    REQUEST_HANDLER_THREADS = 4
+    
     def __init__(self, name: str, subscribe_to: list, in_queue: Queue, out_queue: Queue,
-                 on_startup=None, on_shutdown=None, main_loop=None):
+                 on_startup=None, on_shutdown=None, main_loop=None, codec: str = "json",
+                 batching: bool = False):
         self.name = name
         self.pid = os.getpid()
         self.in_queue = in_queue
@@ -269,9 +651,13 @@ class CometCore:
         self.on_shutdown = on_shutdown
         self.main_loop = main_loop
         self.registered = False
+        self.registered_event = threading.Event()  # Set when REGISTER_ACK arrives
         self.running = True
         self.shutdown_event = threading.Event()  # For main loop to check
         self.last_ping_time = time.time()
+        self.pending_requests = PendingRequests(name)
+        self.request_handlers = {}  # message type -> handler(flare) returning the reply payload
+        self.request_executor = None  # Worker threads running request handlers, started with the first request
         self.dev_mode = "--dev" in sys.argv
         
         # Setup crash handler
@@ -287,12 +673,16 @@ class CometCore:
             except:
                 pass
         
-        # All system messages we need to see
+        # System broadcasts we need to see (REGISTER_ACK and single-Comet SHUTDOWN
+        # are directed to us and arrive on our own @name topic)
         system_messages = [
-            self.MSG_REGISTER_ACK,
             self.MSG_PING,
             self.MSG_SHUTDOWN
         ]
+        self.system_types = {
+            self.MSG_REGISTER, self.MSG_REGISTER_ACK, self.MSG_PING,
+            self.MSG_PONG, self.MSG_SHUTDOWN, self.MSG_SHUTDOWN_ACK
+        }
         
         # Combine user filters with system messages
         all_filters = list(set(subscribe_to + system_messages))
@@ -302,7 +692,9 @@ class CometCore:
             self.name,
             self.system_queue,
             self.out_queue,
-            all_filters if "*" not in subscribe_to else ["*"]
+            all_filters if "*" not in subscribe_to else ["*"],
+            codec,
+            batching
         )
     
     def start(self):
@@ -316,6 +708,7 @@ class CometCore:
             
             # Start system message handler
             system_thread = threading.Thread(target=self._handle_system_messages, daemon=True)
+            self.pending_requests.reply_thread = system_thread
             system_thread.start()
             
             # Call startup hook
@@ -341,8 +734,7 @@ class CometCore:
                 self.main_loop(lambda: not self.shutdown_event.is_set())
             else:
                 # Default main loop
-                while not self.shutdown_event.is_set():
-                    time.sleep(1)
+                self.shutdown_event.wait()
             
             # If we get here, main loop has exited cleanly
             if not self.shutdown_event.is_set():
@@ -369,16 +761,13 @@ class CometCore:
                 timestamp=datetime.now(),
                 name=self.name,
                 type=self.MSG_REGISTER,
-                payload={'process_name': self.name, 'process_id': self.pid}
+                payload={'process_name': self.name, 'process_id': self.pid, 'parent_process_id': os.getppid()}
             )
             self.out_queue.put(reg_flare)
             
-            # Wait for ACK
-            start_time = time.time()
-            while time.time() - start_time < 2:
-                if self.registered:
-                    return True
-                time.sleep(0.1)
+            # Wait for ACK (returns as soon as it arrives)
+            if self.registered_event.wait(timeout=2):
+                return True
             
             print(f"{self.name}: Registration attempt {attempt + 1}/{max_attempts}")
         
@@ -388,17 +777,29 @@ class CometCore:
         """Handle system messages separately from user messages."""
         while not self.shutdown_event.is_set():
             try:
-                if not self.system_queue.empty():
-                    flare = self.system_queue.get()
+                # Block until the Satellite delivers a message; None is the shutdown sentinel
+                flare = self.system_queue.get()
+                if flare is not None:
+                    # Replies to our requests complete their futures instead of reaching the user
+                    if flare.in_reply_to and self.pending_requests.resolve(flare):
+                        continue
                     
-                    # Route to user queue if it's a subscribed message
-                    if flare.type in self.subscribe_to or "*" in self.subscribe_to:
+                    # Requests with a registered handler are answered directly to the caller
+                    if (flare.correlation_id and flare.type in self.request_handlers
+                            and flare.target in (None, self.name)):
+                        self._handle_request(flare)
+                        continue
+                    
+                    # Route to user queue if it's a subscribed message or addressed to us
+                    if (flare.type in self.subscribe_to or "*" in self.subscribe_to
+                            or (flare.target == self.name and flare.type not in self.system_types)):
                         self.in_queue.put(flare)
                     
                     # Handle system messages
                     if flare.type == self.MSG_REGISTER_ACK:
                         if flare.payload.get('process_name') == self.name:
                             self.registered = True
+                            self.registered_event.set()
                     
                     elif flare.type == self.MSG_PING:
                         if flare.name == 'ControlPanel':
@@ -411,7 +812,8 @@ class CometCore:
                                     'process_name': self.name,
                                     'process_id': self.pid,
                                     'timestamp': time.time()
-                                }
+                                },
+                                target=flare.name
                             )
                             self.out_queue.put(pong)
                     
@@ -428,20 +830,64 @@ class CometCore:
                                     'process_id': self.pid,
                                     'shutdown_target': target,
                                     'timestamp': time.time()
-                                }
+                                },
+                                target=flare.name
                             )
                             self.out_queue.put(ack)
                             print(f"{self.name}: Shutdown ACK sent")
                             time.sleep(0.5)
                             self._shutdown()
                 
-                time.sleep(0.01)
-                
             except Exception as e:
                 error_msg = f"{self.name} system message error: {e}"
                 print(error_msg)
                 log_crash(self.name, error_msg, e)
     
+    def register_request_handler(self, message_type: str, handler):
+        """Answer requests of a type with handler(flare) on a worker thread; its return value is the reply payload."""
+        self.request_handlers[message_type] = handler
+    
+    def request(self, target: str, message_type: str, payload, timeout: float = 5):
+        """Send a request to one Comet and return a Future for its reply flare (TimeoutError after timeout seconds)."""
+        correlation_id, future = self.pending_requests.create(timeout)
+        self.out_queue.put(SolarFlare(
+            timestamp=datetime.now(),
+            name=self.name,
+            type=message_type,
+            payload=payload,
+            target=target,
+            correlation_id=correlation_id,
+            reply_to=self.name
+        ))
+        return future
+    
+    def reply(self, request: SolarFlare, payload, error: str = None):
+        """Send the reply to a request flare, addressed only to the Comet that asked."""
+        self.out_queue.put(SolarFlare(
+            timestamp=datetime.now(),
+            name=self.name,
+            type=response_type(request.type),
+            payload=payload,
+            target=request.reply_to or request.name,
+            in_reply_to=request.correlation_id,
+            error=error
+        ))
+    
+    def _handle_request(self, flare):
+        """Hand a request to a worker thread, so slow handlers and nested requests never stall system messages."""
+        if self.request_executor is None:
+            self.request_executor = ThreadPoolExecutor(max_workers=self.REQUEST_HANDLER_THREADS,
+                                                       thread_name_prefix=f"{self.name}-request")
+        self.request_executor.submit(self._run_request_handler, flare)
+    
+    def _run_request_handler(self, flare):
+        """Run the handler for a request and reply with its result (or the error)."""
+        try:
+            self.reply(flare, self.request_handlers[flare.type](flare))
+        except Exception as e:
+            print(f"{self.name}: Request handler for {flare.type} failed: {e}")
+            self.reply(flare, {}, error=str(e) or type(e).__name__)
+    
     def _monitor_health(self):
         """Monitor connection health."""
         while not self.shutdown_event.is_set():
@@ -453,7 +899,7 @@ class CometCore:
                     log_crash(self.name, error_msg)
                     self._shutdown()
                     break
-            time.sleep(1)
+            self.shutdown_event.wait(1)
     
     def _shutdown(self):
         """Shutdown the Comet."""
@@ -464,6 +910,10 @@ class CometCore:
         print(f"🛑 {self.name} shutting down...")
         self.running = False
         self.shutdown_event.set()  # Signal main loop to stop
+        self.system_queue.put(None)  # Wake the system message handler
+        self.pending_requests.cancel_all()
+        if self.request_executor:
+            self.request_executor.shutdown(wait=False, cancel_futures=True)
         
         # Give main loop a moment to finish
         time.sleep(0.1)
@@ -485,9 +935,10 @@ cat > CometExample/comet/src/corona/__init__.py << 'EOF'
 from .SolarFlare import SolarFlare
 from .Satellite import Satellite
 from .CometCore import CometCore
+from .rpc import RequestError
 from .crash_handler import setup_crash_handler, log_crash
 
-__all__ = ['SolarFlare', 'Satellite', 'CometCore', 'setup_crash_handler', 'log_crash']
+__all__ = ['SolarFlare', 'Satellite', 'CometCore', 'RequestError', 'setup_crash_handler', 'log_crash']
 EOF
 echo "✅ Created comet/src/corona/__init__.py"
 
@@ -872,6 +1323,27 @@ System messages (handled automatically by Corona):
 - `PING` / `PONG` - Health checks
 - `SHUTDOWN` / `SHUTDOWN_ACK` - Shutdown commands
 
+## Message Encoding
+
+SolarFlares are JSON by default. Pass `codec="msgpack"` to `CometCore` (and add `msgpack` to the Pipfile) to send compact binary flares with integer nanosecond timestamps. Receivers detect the format of every message, so JSON and binary Comets can share the bus.
+
+High-rate Comets can pass `batching=True` to `CometCore`. The Satellite then sends consecutive flares of the same type together in one multipart message, with up to 64 flares or 1 ms of delay per batch. System messages such as `PONG` and `SHUTDOWN_ACK` are never delayed. Receivers unpack batches automatically.
+
+## Requests and Replies
+
+To get an answer from one Comet, call `comet.request(target, type, payload, timeout)`. It returns a `concurrent.futures.Future` immediately, so many requests can be in flight at once. The reply goes only to the caller, and `future.result()` returns the reply flare. The future raises `TimeoutError` if no reply arrives in time, and `RequestError` if the other side's handler failed.
+
+```python
+# Answer requests (the return value is the reply payload)
+comet.register_request_handler("CUSTOM_COMMAND", lambda flare: {"status": "ok"})
+
+# Ask another Comet
+futures = [comet.request("OtherComet", "CUSTOM_COMMAND", {"n": n}) for n in range(100)]
+replies = [future.result() for future in futures]  # CUSTOM_RESPONSE flares
+```
+
+Replies use the matching response type (`CUSTOM_COMMAND` → `CUSTOM_RESPONSE`, `SUNBOX_COMMAND` → `SUNBOX_RESPONSE`, anything else → `<TYPE>_RESPONSE`).
+
 ## Example Usage
 
 ```python